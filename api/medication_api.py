@@ -0,0 +1,180 @@
+import asyncio
+import os
+
+import aiohttp
+import pathway as pw
+
+from rxnorm.rxnorm_cache import normalize_name
+from rxnorm.rxnorm_data import CONCURRENCY, check_interactions_async, open_session, resolve_rxcui_async
+
+# Upper bound on one drug or pair lookup, RxNav requests and fallbacks included
+lookup_timeout = float(os.environ.get("MEDICATION_LOOKUP_TIMEOUT", 30))
+
+# RxNav lookups run concurrently on the pipeline's event loop; a batch holds back the
+# rest of the run (RAG queries included) for at most `lookup_timeout`
+rxnorm_executor = pw.udfs.async_executor(capacity=CONCURRENCY)
+
+
+def serve_conflicts(webserver):
+    """
+    Keep the medication interactions of every patient up to date and answer
+    lookups on the `/conflicts` route of `webserver` with the patient's current
+    conflicts map.
+    """
+    query, response_writer = pw.io.http.rest_connector(
+        webserver=webserver,
+        route="/conflicts",
+        schema=ConflictQuerySchema,
+        methods=("GET", "POST"),
+        autocommit_duration_ms=50,
+        # Pathway's as-of-now join mishandles queries that are deleted once answered
+        delete_completed_queries=False,
+    )
+
+    conflicts = patient_conflicts(read_medications())
+
+    # Answer each lookup with the conflicts as they are when it arrives
+    responses = query.asof_now_join_left(
+        conflicts, pw.left.patient_id == pw.right.patient_id, id=pw.left.id
+    ).select(
+        result=conflict_response(pw.left.patient_id, pw.right.conflicts),
+    )
+    response_writer(responses)
+
+
+def read_medications():
+    # One JSONL file per patient, one {"patient_id", "drug"} line per current medication.
+    # Rewriting a patient's file adds or retracts only the lines that changed.
+    data_dir = os.environ.get("MEDICATIONS_DATA_DIR", "./medications")
+    os.makedirs(data_dir, exist_ok=True)
+    return pw.io.jsonlines.read(
+        os.path.join(data_dir, "*.jsonl"),
+        schema=MedicationInputSchema,
+        mode="streaming",
+        name="medications",
+    )
+
+
+def patient_conflicts(medications):
+    """
+    One row per patient with a `conflicts` JSON object: `conflicts` maps
+    "drug A + drug B" to the reported interaction, and `unchecked` lists the
+    pairs whose drugs or interactions could not be looked up (RxNav unreachable,
+    or offline without a cached answer).
+
+    Pairs come from an incremental self-join, so a new medication is only checked
+    against the patient's existing ones and a removed medication retracts exactly
+    its own pairs. The RxNav lookups are cached, and Pathway keeps each pair's
+    result, so retractions never hit the API.
+    """
+    medications = medications.select(
+        pw.this.patient_id,
+        drug=normalize_drug(pw.this.drug),
+    )
+    medications = medications.groupby(pw.this.patient_id, pw.this.drug).reduce(
+        pw.this.patient_id,
+        pw.this.drug,
+    )
+    medications = medications.select(*pw.this, _pw_match=resolve_drug(pw.this.drug))
+    medications = medications.select(
+        pw.this.patient_id,
+        pw.this.drug,
+        rxcui=pw.declare_type(str | None, pw.this._pw_match[0]),
+        # Misspelled names matched to the closest known drug say so in the conflicts map
+        label=drug_label(pw.this.drug, pw.declare_type(bool, pw.this._pw_match[1])),
+        failed=pw.declare_type(bool, pw.this._pw_match[2]),
+    ).filter(
+        # Unknown drugs are left out; drugs that could not be looked up make their pairs unchecked
+        pw.this.rxcui.is_not_none() | pw.this.failed
+    )
+
+    left = medications.copy()
+    pairs = left.join(
+        medications,
+        left.patient_id == medications.patient_id,
+    ).filter(
+        pw.left.drug < pw.right.drug
+    ).select(
+        patient_id=pw.left.patient_id,
+        drugs=pw.left.label + " + " + pw.right.label,
+        reason=pair_interactions(pw.left.rxcui, pw.right.rxcui),
+    ).filter(
+        # None: the pair could not be checked
+        pw.this.reason.is_none() | (pw.this.reason != "")
+    )
+
+    return pairs.groupby(pw.this.patient_id).reduce(
+        pw.this.patient_id,
+        conflicts=conflicts_map(pw.reducers.tuple(pw.this.drugs), pw.reducers.tuple(pw.this.reason)),
+    )
+
+
+@pw.udf
+def normalize_drug(drug: str) -> str:
+    return normalize_name(drug)
+
+
+@pw.udf(executor=rxnorm_executor)
+async def resolve_drug(drug: str) -> tuple:
+    # (rxcui, approximate, failed). A UDF that raises stops the whole run, RAG
+    # included, so lookup failures are reported in the result instead.
+    try:
+        async with open_session() as session:
+            rxcui, approximate = await asyncio.wait_for(resolve_rxcui_async(session, drug), lookup_timeout)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        print(f"Could not resolve {drug!r}: {e!r}")
+        return None, False, True
+    return rxcui, approximate, False
+
+
+@pw.udf(deterministic=True)
+def drug_label(drug: str, approximate: bool) -> str:
+    return f"{drug} (approximate match)" if approximate else drug
+
+
+@pw.udf(executor=rxnorm_executor)
+async def pair_interactions(rxcui_a: str | None, rxcui_b: str | None) -> str | None:
+    # None if either drug or the pair could not be looked up
+    if rxcui_a is None or rxcui_b is None:
+        return None
+    try:
+        async with open_session() as session:
+            interactions = await asyncio.wait_for(check_interactions_async(session, [rxcui_a, rxcui_b]), lookup_timeout)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        print(f"Could not check interactions of {rxcui_a} and {rxcui_b}: {e!r}")
+        return None
+    # Several interaction sources may describe the same pair; report each once
+    reasons = []
+    for interaction in interactions:
+        reason = f"{interaction['severity']}: {interaction['description']}" if interaction["severity"] else interaction["description"]
+        if reason and reason not in reasons:
+            reasons.append(reason)
+    return " ".join(reasons)
+
+
+@pw.udf
+def conflicts_map(drugs: tuple, reasons: tuple) -> pw.Json:
+    pairs = sorted(zip(drugs, reasons))
+    return pw.Json({
+        "conflicts": {pair: reason for pair, reason in pairs if reason is not None},
+        "unchecked": [pair for pair, reason in pairs if reason is None],
+    })
+
+
+@pw.udf
+def conflict_response(patient_id: str, conflicts: pw.Json | None) -> pw.Json:
+    found = conflicts.value if conflicts is not None else {}
+    return pw.Json({
+        "patient_id": patient_id,
+        "conflicts": found.get("conflicts", {}),
+        "unchecked": found.get("unchecked", []),
+    })
+
+
+class MedicationInputSchema(pw.Schema):
+    patient_id: str
+    drug: str
+
+
+class ConflictQuerySchema(pw.Schema):
+    patient_id: str
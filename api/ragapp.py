@@ -1,49 +1,158 @@
+import os
 import pathway as pw
 
-from common.embedder import embeddings, index_embeddings
-from common.prompt import prompt
+from api.medication_api import serve_conflicts
+from api.stats_api import serve_stats
+from api.stream_api import stream_connector
+from common.chunker import chunk_articles
+from common.context_packing import context_passages
+from common.embedder import embeddings, index_embeddings, query_batch_max_wait_ms, query_embeddings, warm_up_embedder
+from common.hybrid_search import LexicalIndex, hybrid_search
+from common.persistence import persistence_config
+from common.prompt import prompt, retrieval_response
+from common.response_cache import open_response_cache
+from pubmed.pubmed_data import DELTA_TABLE_DIR, ensure_delta_table
 
 
 def run(host, port):
+    # Load the embedding model and check its dimension before accepting queries
+    warm_up_embedder()
+    # Open (or create) the LLM response cache; RESPONSE_CACHE_PATH="" turns it off
+    open_response_cache()
+
+    webserver = pw.io.http.PathwayWebserver(host=host, port=port)
+
     # Given a user question as a query from your API
     query, response_writer = pw.io.http.rest_connector(
-        host=host,
-        port=port,
+        webserver=webserver,
         schema=QueryInputSchema,
-        autocommit_duration_ms=50,
+        # Queries arriving within one commit window are embedded as one batch
+        autocommit_duration_ms=query_batch_max_wait_ms,
+        # Answered queries are deleted, and everything computed for them with them; the
+        # indexes answer as of arrival (common/as_of_now.py), so deletions are safe
+        delete_completed_queries=True,
     )
 
-    # Real-time data coming from external data sources such as jsonlines file
-    medical_data = pw.io.jsonlines.read(
-        "./pubmed/pubmed_full_articles.jsonl",
-        schema=DataInputSchema,
-        mode="streaming"
+    # The same queries answered as server-sent events on /stream: documents first, then
+    # tokens. They join the REST queries, so both routes share one pipeline and one copy
+    # of the indexes, and only need the retrieved chunks and the prompt
+    stream_query, stream_writer = stream_connector(
+        webserver, schema=QueryInputSchema, autocommit_duration_ms=query_batch_max_wait_ms
     )
+    stream_query = stream_query.with_columns(documents_only=True)
+    query.promise_universes_are_disjoint(stream_query)
+    queries = pw.Table.concat(query, stream_query)
+
+    # Real-time data written by the ingestion service (data_ingest.py)
+    medical_data = read_articles()
+
+    # The ingester appends inserts, updates and deletions; keep the current version of each article
+    medical_data = current_articles(medical_data)
 
-    # Compute embeddings for each document using the OpenAI Embeddings API
-    embedded_data = embeddings(context=medical_data, data_to_embed=medical_data.doc)
+    # Split articles into token-bounded chunks carrying pmid, publication_date and mesh_headings
+    documents = chunk_articles(medical_data)
+
+    # Compute embeddings for each document chunk
+    embedded_data = embeddings(context=documents, data_to_embed=documents.doc)
 
     # Construct an index on the generated embeddings in real-time
     index = index_embeddings(embedded_data)
 
-    # Generate embeddings for the query from the OpenAI Embeddings API
-    embedded_query = embeddings(context=query, data_to_embed=pw.this.query)
+    # BM25 index over the same chunks, for exact drug names, gene symbols and trial IDs
+    lexical_index = LexicalIndex(documents.doc, documents, metadata=documents.metadata)
+
+    # Fuse BM25 and vector results with RRF; queries are embedded (one forward pass per
+    # commit of concurrent requests) unless BM25 alone is decisive
+    retrieved = hybrid_search(
+        queries,
+        queries.query,
+        vector_index=index,
+        lexical_index=lexical_index,
+        embed=query_embeddings,
+        # More passages than fit; the prompt packs the most relevant into its token budget
+        k=context_passages,
+        from_year=queries.from_year,
+        to_year=queries.to_year,
+        index_candidates=queries.candidates,
+    )
 
-        # Build prompt using indexed data
-    print("embedde query",embedded_query)
-    responses = prompt(index, embedded_query, pw.this.query)
+    # Build prompt using the retrieved data, feed it to ChatGPT and obtain the generated answer
+    responses = prompt(retrieved.filter(~pw.this.documents_only), pw.this.query)
     print(responses)
 
-    # Feed the prompt to ChatGPT and obtain the generated answer.
-    response_writer(responses)
+    # documents_only queries (all of /stream's) get the retrieved chunks and the prompt instead
+    listed = retrieval_response(retrieved.filter(pw.this.documents_only), pw.this.query)
+    stream_writer(listed.intersect(stream_query))
+    listed = listed.difference(stream_query)
+
+    # Answers are still sent as JSON strings; wrapping them lets both kinds share one column type
+    responses = responses.select(pw.this.query_id, result=pw.apply_with_type(pw.Json, pw.Json, pw.this.result))
+    responses.promise_universes_are_disjoint(listed)
+    response_writer(pw.Table.concat(responses, listed))
 
-    # Run the pipeline
-    pw.run()
+    # Medication interactions per patient, served on /conflicts
+    serve_conflicts(webserver)
+
+    # LLM call latencies and cache hit rates, served on /stats
+    serve_stats(webserver)
+
+    # Run the pipeline, resuming from the last snapshot when PERSISTENCE_DIR is set
+    pw.run(persistence_config=persistence_config())
+
+
+def read_articles():
+    data_dir = os.environ.get("PUBMED_DATA_DIR", "./pubmed/data")
+    if os.environ.get("PUBMED_DATA_FORMAT", "jsonl") == "parquet":
+        # Columnar corpus: Parquet files behind a Delta Lake log, read natively with typed list columns.
+        # Pathway's Delta Lake reader is licensed; without a key it would only fail once running
+        if not os.environ.get("PATHWAY_LICENSE_KEY"):
+            raise ValueError(
+                "PUBMED_DATA_FORMAT=parquet reads the corpus with pw.io.deltalake.read, which needs "
+                "a PATHWAY_LICENSE_KEY from Pathway; set one, or use "
+                "PUBMED_DATA_FORMAT=jsonl for both the ingester and the app"
+            )
+        table_uri = os.path.join(data_dir, DELTA_TABLE_DIR)
+        ensure_delta_table(table_uri)
+        return pw.io.deltalake.read(table_uri, schema=DataInputSchema, mode="streaming", name="pubmed_articles")
+    return pw.io.jsonlines.read(
+        os.path.join(data_dir, "*.jsonl"),
+        schema=DataInputSchema,
+        mode="streaming",
+        # Stable name so persisted read offsets are found again after a restart
+        name="pubmed_articles",
+    )
+
+
+def current_articles(changes):
+    # Latest change per PMID wins; PMIDs whose latest change is a deletion drop out of the index
+    latest = changes.groupby(pw.this.pmid).reduce(
+        pw.this.pmid,
+        latest_id=pw.reducers.argmax(pw.this.version),
+    )
+    return changes.ix(latest.latest_id).filter(pw.this.op != "delete")
 
 
 class DataInputSchema(pw.Schema):
-    doc: str
+    pmid: str
+    title: str
+    abstract: str
+    journal: str
+    publication_date: str
+    doi: str
+    authors: list[str]
+    mesh_headings: list[str]
+    # Change-log fields written by the ingester when it runs with a PubMedStore
+    op: str = pw.column_definition(default_value="insert")
+    version: int = pw.column_definition(default_value=0)
 
 
 class QueryInputSchema(pw.Schema):
     query: str
+    # Optional publication-year range; only the index partitions it overlaps are searched
+    from_year: int | None = pw.column_definition(default_value=None)
+    to_year: int | None = pw.column_definition(default_value=None)
+    # Vector index neighbours fetched before exact re-ranking (HNSW/exact) or PQ re-scoring;
+    # more trades latency for recall. None keeps the index's default
+    candidates: int | None = pw.column_definition(default_value=None)
+    # Respond with the retrieved documents and the prompt, without calling the LLM
+    documents_only: bool = pw.column_definition(default_value=False)
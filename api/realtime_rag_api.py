@@ -1,13 +1,7 @@
-import os
 import pathway as pw
-from pathway.stdlib.ml.index import KNNIndex
-from pathway.xpacks.llm import embedders
 from datetime import datetime
-from common.llm_helper import openai_chat_completion
-
-# Load environment variables
-embedding_dimension = int(os.environ.get("EMBEDDING_DIMENSION", 1536))
-embedder = embedders.SentenceTransformerEmbedder(model="intfloat/e5-large-v2")
+from common.embedder import embeddings, index_embeddings, query_embeddings, warm_up_embedder
+from common.openaiapi_helper import openai_chat_completion
 
 # ✅ Define schemas
 class MedicalDataSchema(pw.Schema):
@@ -45,7 +39,7 @@ def prompt(index, embedded_query, user_query):
     response = generated_prompt.select(
         query_id=pw.this.id,
         result=openai_chat_completion(pw.this.prompt)
-    )
+    ).await_futures()
 
     return response
 
@@ -55,12 +49,15 @@ def run(host, port):
     print("Server will start...")
     print("Initializing Pathway real-time RAG API...")
 
+    # Load the shared embedding model and check its dimension before accepting queries
+    warm_up_embedder()
+
     query, response_writer = pw.io.http.rest_connector(
         host=host,
         port=port,
         schema=QueryInputSchema,
         autocommit_duration_ms=50,
-        delete_completed_queries=True,  
+        delete_completed_queries=True,
     )
 
     if query.query is not None:
@@ -74,13 +71,13 @@ def run(host, port):
         )
 
         print("Computing embeddings for documents...")
-        embedded_data = medical_data + medical_data.select(vector=embedder(pw.this.doc))
+        embedded_data = embeddings(context=medical_data, data_to_embed=pw.this.doc)
 
         print("Indexing embeddings...")
-        index = KNNIndex(embedded_data.vector, embedded_data, n_dimensions=embedding_dimension)
+        index = index_embeddings(embedded_data)
 
         print("Processing incoming queries...")
-        embedded_query = query.select(vector=embedder(pw.this.query))  # Ensure query is correctly passed
+        embedded_query = query_embeddings(context=query, data_to_embed=pw.this.query)
 
         print("Generating AI response...")
         responses = prompt(index, embedded_query, query.query)  # Pass query.query here as a string
@@ -0,0 +1,28 @@
+import pathway as pw
+from aiohttp import web
+
+from api.webserver import add_route
+from common.embedder import document_embedder
+from common.openaiapi_helper import llm_client
+from common.response_cache import open_response_cache
+
+
+def serve_stats(webserver, route="/stats"):
+    """
+    Serve the process's cache and LLM client statistics as JSON on the `route` of
+    `webserver`: per-endpoint call counts and latency percentiles of the LLM API,
+    and the hit rates of the response and embedding caches.
+    """
+
+    async def handle(request):
+        embedding_cache = getattr(document_embedder, "cache", None)
+        response_cache = open_response_cache()
+        stats = {
+            "llm": llm_client.stats(),
+            "response_cache": response_cache.stats() if response_cache is not None else None,
+            "embedding_cache": embedding_cache.stats() if embedding_cache is not None else None,
+        }
+        return web.json_response(stats, dumps=pw.Json.dumps)
+
+    # Not a query over the pipeline, so a plain aiohttp handler rather than a rest_connector
+    add_route(webserver, "GET", route, handle)
@@ -0,0 +1,165 @@
+import asyncio
+import json
+import os
+import typing
+from uuid import uuid4
+
+import aiohttp
+import pathway as pw
+from aiohttp import web
+
+from api.webserver import add_route
+from common.openaiapi_helper import openai_chat_completion_stream
+from common.response_cache import open_response_cache
+
+# Upper bound on one streamed answer's retrieval
+STREAM_TIMEOUT = int(os.environ.get("STREAM_TIMEOUT", 300))
+
+
+def stream_connector(webserver, schema, route="/stream", autocommit_duration_ms=1500):
+    """
+    Answer queries on the `route` of `webserver` as server-sent events, so the
+    first useful output arrives long before the whole answer:
+
+    - `documents`: the retrieved chunks, as soon as retrieval is done;
+    - `token`: each piece of the answer as the LLM generates it (a cached
+      answer comes as a single token);
+    - `done`: the whole answer, and whether it was cached;
+    - `error`: instead of the rest, if generation fails.
+
+    Like `pw.io.http.rest_connector`, returns the table of queries (request
+    bodies with the `schema` columns) and a writer for their responses. The
+    writer takes `query_id` and `result` columns, `result` being the JSON of
+    `common.prompt.retrieval_response`; the answer is then streamed from the
+    LLM here. Answered queries are deleted, with everything computed for them.
+    """
+    subject = _StreamQuerySubject()
+    requests = pw.io.python.read(
+        subject,
+        schema=schema | _StreamRequestSchema,
+        autocommit_duration_ms=autocommit_duration_ms,
+    )
+
+    async def handle(request):
+        try:
+            payload = await request.json()
+        except json.JSONDecodeError:
+            raise web.HTTPBadRequest(reason="The body must be a JSON object")
+        problem = _invalid(payload, schema)
+        if problem:
+            raise web.HTTPBadRequest(reason=problem)
+
+        row = {name: payload[name] for name in schema.column_names() if payload.get(name) is not None}
+        row["request_id"] = uuid4().hex
+        try:
+            retrieved = (await asyncio.wait_for(subject.ask(row), STREAM_TIMEOUT)).value
+        except asyncio.TimeoutError:
+            raise web.HTTPGatewayTimeout(reason="Retrieval timed out")
+        finally:
+            subject.done(row)
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        await _send(response, "documents", retrieved["documents"])
+
+        answer = retrieved["answer"]
+        cached = answer is not None
+        if cached:
+            await _send(response, "token", {"text": answer})
+        else:
+            pieces = []
+            try:
+                async for piece in openai_chat_completion_stream(retrieved["prompt"]):
+                    pieces.append(piece)
+                    await _send(response, "token", {"text": piece})
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                await _send(response, "error", {"message": f"Answer generation failed: {e}"})
+                await response.write_eof()
+                return response
+            answer = "".join(pieces)
+            response_cache = open_response_cache()
+            if response_cache is not None:
+                # Under the query's embedding too, as `/` does, for the semantic tier
+                await asyncio.to_thread(
+                    response_cache.put, payload["query"], retrieved["documents_key"], answer, retrieved["vector"]
+                )
+
+        await _send(response, "done", {"answer": answer, "cached": cached})
+        await response.write_eof()
+        return response
+
+    # rest_connector routes only send complete responses
+    add_route(webserver, "POST", route, handle)
+
+    def response_writer(responses):
+        answered = responses.join(requests, responses.query_id == requests.id).select(
+            requests.request_id,
+            responses.result,
+        )
+        pw.io.subscribe(answered, subject.on_change)
+
+    return requests.without(pw.this.request_id), response_writer
+
+
+class _StreamRequestSchema(pw.Schema):
+    request_id: str = pw.column_definition(primary_key=True)
+
+
+class _StreamQuerySubject(pw.io.python.ConnectorSubject):
+    # Requests go straight into the pipeline and their results come back from a
+    # subscription, resolving the future the request handler waits on
+
+    def __init__(self):
+        # Upsert, so answered queries can be deleted by their request_id
+        super().__init__(datasource_name="stream-connector", session_type="upsert")
+        self._pending = {}
+
+    def run(self):
+        # Rows are sent by the request handlers; the webserver runs with the REST connector
+        pass
+
+    def _is_finite(self):
+        return False
+
+    def ask(self, row):
+        future = asyncio.get_running_loop().create_future()
+        self._pending[row["request_id"]] = future
+        self.next(**row)
+        return future
+
+    def done(self, row):
+        self._pending.pop(row["request_id"], None)
+        self.delete(**row)
+
+    def on_change(self, key, row, time, is_addition):
+        # Called from the engine's thread
+        future = self._pending.get(row["request_id"]) if is_addition else None
+        if future is not None:
+            future.get_loop().call_soon_threadsafe(_resolve, future, row["result"])
+
+
+def _resolve(future, result):
+    if not future.done():
+        future.set_result(result)
+
+
+def _invalid(payload, schema):
+    # What `/` would reject for this body, if anything
+    if not isinstance(payload, dict):
+        return "The body must be a JSON object"
+    defaults = schema.default_values()
+    for field, typehint in schema.typehints().items():
+        value = payload.get(field)
+        if value is None:
+            if field not in defaults:
+                return f"`{field}` is required"
+            continue
+        expected = next((t for t in typing.get_args(typehint) if t is not type(None)), typehint)
+        # bool is an int too, but not a valid year or count
+        if not isinstance(value, expected) or (expected is int and isinstance(value, bool)):
+            return f"`{field}` must be of type {expected.__name__}"
+    return None
+
+
+async def _send(response, event, data):
+    await response.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8"))
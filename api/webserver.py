@@ -0,0 +1,10 @@
+def add_route(webserver, method, route, handler):
+    """
+    Serve the aiohttp `handler` on `route` of `webserver`, next to its
+    rest_connector routes, for responses a rest_connector cannot send:
+    streamed ones, or ones not computed by the pipeline.
+    """
+    # PathwayWebserver has no public way to add a plain handler. This is the private
+    # method its rest_connector routes go through (checked against pathway==0.33.0);
+    # check it when upgrading Pathway, and keep it the only call site.
+    webserver._add_endpoint_to_app(method, route, handler)
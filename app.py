@@ -1,19 +1,20 @@
 import importlib
 import os
+import sys
 from dotenv import load_dotenv
 import subprocess
 
 load_dotenv()
 
 if __name__ == "__main__":
+    # PubMed ingestion runs as a background service writing into the directory the
+    # pipeline watches, so the API starts immediately and picks up articles as they land.
+    ingest_process = None
     try:
-        cmd = ["python", "pubmed/pubmed_data.py"]
-        subprocess.run(cmd, check=True)
-        print("Successfully generated pubmed.jsonl.")
-    except subprocess.CalledProcessError:
-        print("Script execution failed.")
+        ingest_process = subprocess.Popen([sys.executable, "data_ingest.py"])
+        print("Started PubMed ingestion service.")
     except FileNotFoundError:
-        print("Python interpreter or the script was not found.")
+        print("Python interpreter or the ingestion script was not found.")
 
     host = os.environ.get("HOST", "localhost")
     port = int(os.environ.get("PORT", 8000))
@@ -21,4 +22,8 @@ if __name__ == "__main__":
     print("now realtime rag ")
     app_api = importlib.import_module("api.ragapp")
     print("realtime rag_api will run")
-    app_api.run(host=host, port=port)
+    try:
+        app_api.run(host=host, port=port)
+    finally:
+        if ingest_process is not None:
+            ingest_process.terminate()
@@ -0,0 +1,107 @@
+import argparse
+import glob
+import json
+import os
+import random
+import time
+
+import numpy as np
+
+from common.onnx_embedder import load_onnx_int8_model, onnx_quantization
+
+
+def load_sample(corpus, sample_size, seed=0):
+    """
+    Random sample of articles with an abstract from PubMed JSONL files.
+    """
+    articles = []
+    for path in sorted(glob.glob(corpus)):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                article = json.loads(line)
+                if article.get("abstract") and article.get("op", "insert") != "delete":
+                    articles.append(article)
+    if not articles:
+        raise SystemExit(f"No articles found in {corpus}")
+    random.Random(seed).shuffle(articles)
+    return articles[:sample_size]
+
+
+def encode_corpus(model, docs, batch_size):
+    started = time.perf_counter()
+    vectors = model.encode(docs, batch_size=batch_size, normalize_embeddings=True)
+    return vectors, len(docs) / (time.perf_counter() - started)
+
+
+def query_latencies(model, queries):
+    model.encode(queries[:1])  # warm-up
+    latencies, vectors = [], []
+    for query in queries:
+        started = time.perf_counter()
+        vectors.append(model.encode([query], normalize_embeddings=True)[0])
+        latencies.append((time.perf_counter() - started) * 1000)
+    return np.array(vectors), latencies
+
+
+def top_k(query_vectors, doc_vectors, k):
+    scores = query_vectors @ doc_vectors.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def run(model_name, corpus, sample_size, num_queries, k, batch_size):
+    from sentence_transformers import SentenceTransformer
+
+    articles = load_sample(corpus, sample_size)
+    docs = [f"passage: {a['title']}\n{a['abstract']}" for a in articles]
+    queries = [f"query: {a['title']}" for a in articles[:num_queries]]
+
+    models = {
+        "fp32": SentenceTransformer(model_name),
+        "onnx-int8": load_onnx_int8_model(model_name),
+    }
+
+    results, vectors = {}, {}
+    for name, model in models.items():
+        doc_vectors, docs_per_second = encode_corpus(model, docs, batch_size)
+        query_vectors, latencies = query_latencies(model, queries)
+        vectors[name] = (doc_vectors, query_vectors)
+        results[name] = {
+            "dimension": int(doc_vectors.shape[1]),
+            "docs_per_second": round(docs_per_second, 2),
+            "query_p50_ms": round(float(np.percentile(latencies, 50)), 2),
+            "query_p99_ms": round(float(np.percentile(latencies, 99)), 2),
+        }
+
+    reference_docs, reference_queries = vectors["fp32"]
+    quantized_docs, quantized_queries = vectors["onnx-int8"]
+    reference_top = top_k(reference_queries, reference_docs, k)
+    quantized_top = top_k(quantized_queries, quantized_docs, k)
+    overlap = [len(set(a) & set(b)) / k for a, b in zip(reference_top, quantized_top)]
+    results["agreement"] = {
+        f"top{k}_overlap": round(float(np.mean(overlap)), 4),
+        "top1_match": round(float(np.mean(reference_top[:, 0] == quantized_top[:, 0])), 4),
+        "mean_doc_cosine": round(float(np.mean(np.sum(reference_docs * quantized_docs, axis=1))), 6),
+    }
+    results["speedup"] = {
+        "docs_per_second": round(results["onnx-int8"]["docs_per_second"] / results["fp32"]["docs_per_second"], 2),
+        "query_p50": round(results["fp32"]["query_p50_ms"] / results["onnx-int8"]["query_p50_ms"], 2),
+    }
+    results["config"] = {
+        "model": model_name, "quantization": onnx_quantization, "docs": len(docs),
+        "queries": len(queries), "k": k, "batch_size": batch_size,
+    }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the fp32 and int8 ONNX embedders on a PubMed sample.")
+    parser.add_argument("--model", default="intfloat/e5-large-v2")
+    parser.add_argument("--corpus", default=os.path.join(os.environ.get("PUBMED_DATA_DIR", "./pubmed/data"), "*.jsonl"),
+                        help="Glob of PubMed JSONL files")
+    parser.add_argument("--sample_size", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch_size", type=int, default=32)
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.model, args.corpus, args.sample_size, args.queries, args.k, args.batch_size), indent=2))
@@ -0,0 +1,273 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+import numpy as np
+
+from benchmarks.embedder_benchmark import load_sample
+from benchmarks.mock_services import HashingEmbedder, start_mock_llm
+
+TERMS = (
+    "aspirin statin metformin insulin warfarin heparin amoxicillin vancomycin cisplatin tamoxifen "
+    "hypertension diabetes stroke sepsis asthma anemia migraine obesity dementia arthritis lymphoma "
+    "melanoma pneumonia influenza hepatitis cirrhosis nephropathy fracture depression epilepsy "
+    "randomized cohort placebo mortality hemorrhage remission biomarker dose outcome trial"
+).split()
+
+
+def synthetic_corpus(size, seed=0):
+    """
+    PubMed-like articles built from a small medical vocabulary. Each article
+    carries a unique `ref<pmid>` word, so the benchmark can tell when the last
+    article has been indexed.
+    """
+    rng = random.Random(seed)
+    articles = []
+    for i in range(size):
+        terms = rng.sample(TERMS, 8)
+        sentences = [
+            f"{' '.join(rng.choices(terms, k=rng.randint(6, 14))).capitalize()}." for _ in range(rng.randint(4, 9))
+        ]
+        articles.append({
+            "pmid": str(i),
+            "title": f"{terms[0].capitalize()} and {terms[1]} in {terms[2]}",
+            "abstract": " ".join(sentences) + f" Reference ref{i}.",
+            "journal": "Synthetic",
+            "publication_date": f"{2000 + rng.randint(0, 25)}-{rng.randint(1, 12):02d}-01",
+            "doi": "",
+            "authors": [],
+            "mesh_headings": terms[:3],
+        })
+    return articles
+
+
+def synthetic_queries(count, seed=1):
+    rng = random.Random(seed)
+    return [f"{' '.join(rng.sample(TERMS, rng.randint(2, 5)))}" for _ in range(count)]
+
+
+def load_queries(path, count):
+    # Recorded workload: JSONL of request bodies for `/`, replayed in order and repeated as needed
+    with open(path, "r", encoding="utf-8") as f:
+        bodies = [json.loads(line) for line in f if line.strip()]
+    return [bodies[i % len(bodies)] for i in range(count)]
+
+
+def write_corpus(articles, data_dir):
+    os.makedirs(data_dir, exist_ok=True)
+    with open(os.path.join(data_dir, "corpus.jsonl"), "w", encoding="utf-8") as f:
+        for article in articles:
+            f.write(json.dumps(article) + "\n")
+
+
+def serve(args):
+    """
+    Run `api.ragapp` with the hashing embedder standing in for the embedding model
+    and the word tokenizer for its tokenizer, so nothing is downloaded (the chat
+    model is the mock server at OPENAI_API_BASE).
+    """
+    from api import ragapp
+    from common import chunker, embedder, model_registry
+
+    chunker.register_tokenizer(chunker.WordTokenizer())
+    model_registry.register_model(
+        embedder.embedding_model,
+        embedder.embedder_backend,
+        HashingEmbedder(embedder.embedding_dimension, args.embed_batch_ms, args.embed_text_ms),
+    )
+    ragapp.run(host="127.0.0.1", port=args.port)
+
+
+async def wait_until_indexed(session, url, last_pmid, timeout):
+    # The pipeline is ready once the last article's unique word is retrieved
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        try:
+            async with session.post(url, json={"query": f"ref{last_pmid}", "documents_only": True}) as response:
+                if response.status == 200:
+                    documents = (await response.json())["documents"]
+                    if any(document.get("pmid") == last_pmid for document in documents):
+                        return time.perf_counter() - started
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            pass
+        await asyncio.sleep(1)
+    raise TimeoutError(f"Corpus not indexed after {timeout}s")
+
+
+async def replay(session, url, bodies, rate):
+    """
+    Send `bodies` at `rate` requests per second on a fixed schedule (open loop:
+    a slow response does not delay the next request). Returns the latencies of
+    successful responses in ms, the number of failures and the elapsed time.
+    """
+    latencies, failures = [], 0
+
+    async def send(i, body):
+        nonlocal failures
+        await asyncio.sleep(max(0.0, started + i / rate - time.perf_counter()))
+        sent = time.perf_counter()
+        try:
+            async with session.post(url, json=body) as response:
+                await response.read()
+                if response.status != 200:
+                    failures += 1
+                    return
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            failures += 1
+            return
+        latencies.append((time.perf_counter() - sent) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[send(i, body) for i, body in enumerate(bodies)])
+    return latencies, failures, time.perf_counter() - started
+
+
+def latency_summary(latencies):
+    if not latencies:
+        return None
+    return {
+        "p50": round(float(np.percentile(latencies, 50)), 1),
+        "p90": round(float(np.percentile(latencies, 90)), 1),
+        "p99": round(float(np.percentile(latencies, 99)), 1),
+        "mean": round(float(np.mean(latencies)), 1),
+        "max": round(float(np.max(latencies)), 1),
+    }
+
+
+async def measure(port, last_pmid, bodies, args):
+    url = f"http://127.0.0.1:{port}/"
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=args.request_timeout)) as session:
+        indexing_s = await wait_until_indexed(session, url, last_pmid, args.startup_timeout)
+        # A few unmeasured queries, so one-off initialization is not in the percentiles
+        await replay(session, url, [{"query": "warm-up"}] * args.warmup, args.rate)
+        latencies, failures, elapsed = await replay(session, url, bodies, args.rate)
+        async with session.get(f"http://127.0.0.1:{port}/stats") as response:
+            stats = await response.json()
+    return {
+        "indexing_s": round(indexing_s, 1),
+        "sent": len(bodies),
+        "completed": len(latencies),
+        "failed": failures,
+        "throughput_qps": round(len(latencies) / elapsed, 2),
+        "latency_ms": latency_summary(latencies),
+        "llm": stats.get("llm"),
+    }
+
+
+def run_once(articles, bodies, autocommit_ms, llm_url, args, port):
+    """
+    Start the pipeline in a subprocess on `articles`, replay `bodies` against it
+    and stop it.
+    """
+    with tempfile.TemporaryDirectory(prefix="load_benchmark_") as workdir:
+        write_corpus(articles, os.path.join(workdir, "data"))
+        env = {
+            **os.environ,
+            "PUBMED_DATA_DIR": os.path.join(workdir, "data"),
+            "PUBMED_DATA_FORMAT": "jsonl",
+            "MEDICATIONS_DATA_DIR": os.path.join(workdir, "medications"),
+            "QUERY_BATCH_MAX_WAIT_MS": str(autocommit_ms),
+            "OPENAI_API_BASE": llm_url,
+            "OPENAI_API_TOKEN": "mock",
+            "EMBEDDING_DIMENSION": str(args.dimension),
+            # Every run starts cold: no caches or snapshots carried over
+            "EMBEDDING_CACHE_DIR": "",
+            "RESPONSE_CACHE_PATH": os.path.join(workdir, "response_cache.sqlite") if args.response_cache else "",
+            "PERSISTENCE_DIR": "",
+        }
+        command = [
+            sys.executable, "-m", "benchmarks.load_benchmark", "--serve", "--port", str(port),
+            "--embed_batch_ms", str(args.embed_batch_ms), "--embed_text_ms", str(args.embed_text_ms),
+        ]
+        with open(os.path.join(workdir, "pipeline.log"), "w") as log:
+            pipeline = subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT)
+            try:
+                result = asyncio.run(measure(port, articles[-1]["pmid"], bodies, args))
+            except Exception:
+                with open(os.path.join(workdir, "pipeline.log")) as f:
+                    print(f.read()[-4000:], file=sys.stderr)
+                raise
+            finally:
+                pipeline.terminate()
+                pipeline.wait()
+    return {"corpus_size": len(articles), "autocommit_ms": autocommit_ms, "rate_qps": args.rate, **result}
+
+
+def run(args):
+    llm_url = start_mock_llm(
+        args.llm_port, latency_ms=args.llm_latency_ms, token_latency_ms=args.llm_token_ms, answer_tokens=args.answer_tokens
+    )
+    results = []
+    for corpus_size in args.corpus_sizes:
+        if args.corpus:
+            articles = load_sample(args.corpus, corpus_size)
+        else:
+            articles = synthetic_corpus(corpus_size)
+        if args.queries_file:
+            bodies = load_queries(args.queries_file, args.queries)
+        else:
+            bodies = [{"query": query} for query in synthetic_queries(args.queries)]
+        for autocommit_ms in args.autocommit_ms:
+            result = run_once(articles, bodies, autocommit_ms, llm_url, args, args.port)
+            print(json.dumps(result), file=sys.stderr)
+            results.append(result)
+    return {
+        "config": {
+            "corpus": args.corpus or "synthetic",
+            "queries": args.queries,
+            "rate_qps": args.rate,
+            "llm_latency_ms": args.llm_latency_ms,
+            "embed_batch_ms": args.embed_batch_ms,
+            "embed_text_ms": args.embed_text_ms,
+            "dimension": args.dimension,
+            "response_cache": args.response_cache,
+            "knn_index_mode": os.environ.get("KNN_INDEX_MODE", "lsh"),
+            "vector_storage": os.environ.get("VECTOR_STORAGE", "float32"),
+        },
+        "runs": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Latency and throughput of the RAG API (api/ragapp.py) with a mock LLM and embedder, "
+                    "across corpus sizes and query commit windows."
+    )
+    parser.add_argument("--corpus", default=None, help="Glob of recorded PubMed JSONL files (default: synthetic)")
+    parser.add_argument("--corpus_sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--queries_file", default=None, help="JSONL of recorded request bodies (default: synthetic)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=10, help="Requests per second")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--autocommit_ms", type=int, nargs="+", default=[10, 50, 200],
+                        help="Query commit windows (QUERY_BATCH_MAX_WAIT_MS) to compare")
+    parser.add_argument("--llm_latency_ms", type=float, default=500)
+    parser.add_argument("--llm_token_ms", type=float, default=10)
+    parser.add_argument("--answer_tokens", type=int, default=50)
+    parser.add_argument("--embed_batch_ms", type=float, default=5, help="Stand-in embedder latency per batch")
+    parser.add_argument("--embed_text_ms", type=float, default=1, help="Stand-in embedder latency per text")
+    parser.add_argument("--dimension", type=int, default=1024)
+    parser.add_argument("--response_cache", action="store_true", help="Keep the LLM response cache on")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--llm_port", type=int, default=18081)
+    parser.add_argument("--startup_timeout", type=float, default=600)
+    parser.add_argument("--request_timeout", type=float, default=120)
+    parser.add_argument("--output", default=None, help="Also write the JSON results to this file")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+    else:
+        results = run(args)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=2)
+        print(json.dumps(results, indent=2))
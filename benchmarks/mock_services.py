@@ -0,0 +1,97 @@
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+
+import numpy as np
+from aiohttp import web
+
+WORD = re.compile(r"\w+")
+
+
+class HashingEmbedder:
+    """
+    Deterministic stand-in for the SentenceTransformer: a normalized bag of hashed
+    words, so texts sharing words are close. Every `encode` call sleeps
+    `batch_latency_ms` plus `text_latency_ms` per text, to mimic model inference.
+    """
+
+    def __init__(self, dimension, batch_latency_ms=0.0, text_latency_ms=0.0):
+        self.dimension = dimension
+        self.batch_latency_ms = batch_latency_ms
+        self.text_latency_ms = text_latency_ms
+
+    def encode(self, texts, **kwargs):
+        time.sleep((self.batch_latency_ms + self.text_latency_ms * len(texts)) / 1000)
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in WORD.findall(text.lower()):
+                vectors[row, int.from_bytes(hashlib.md5(word.encode("utf-8")).digest()[:4], "little") % self.dimension] += 1
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+
+def _answer(prompt, tokens):
+    # Same prompt, same answer
+    seed = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    return [f"{seed[i % 56:i % 56 + 8]} " for i in range(tokens)]
+
+
+def mock_llm_app(latency_ms=500.0, token_latency_ms=10.0, answer_tokens=50, dimension=1536):
+    """
+    OpenAI-compatible chat completions (plain and streamed) and embeddings. A
+    plain completion takes `latency_ms`. A streamed one sends its first token
+    after `latency_ms` and each further token `token_latency_ms` later.
+    """
+
+    async def chat(request):
+        body = await request.json()
+        pieces = _answer(body["messages"][-1]["content"], answer_tokens)
+        await asyncio.sleep(latency_ms / 1000)
+        if not body.get("stream"):
+            return web.json_response({"choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(pieces)}}]})
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for i, piece in enumerate(pieces):
+            if i:
+                await asyncio.sleep(token_latency_ms / 1000)
+            chunk = {"choices": [{"index": 0, "delta": {"content": piece}}]}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    async def embeddings(request):
+        body = await request.json()
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        await asyncio.sleep(latency_ms / 1000)
+        vectors = HashingEmbedder(dimension).encode(texts)
+        return web.json_response({"data": [{"index": i, "embedding": v.tolist()} for i, v in enumerate(vectors)]})
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", chat)
+    app.router.add_post("/v1/embeddings", embeddings)
+    return app
+
+
+def start_mock_llm(port, host="127.0.0.1", **kwargs):
+    """
+    Serve `mock_llm_app(**kwargs)` on a background thread; returns its base URL.
+    """
+    app = mock_llm_app(**kwargs)
+    ready = threading.Event()
+
+    def serve():
+        loop = asyncio.new_event_loop()
+        runner = web.AppRunner(app)
+        loop.run_until_complete(runner.setup())
+        loop.run_until_complete(web.TCPSite(runner, host, port).start())
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=serve, name="mock-llm", daemon=True).start()
+    ready.wait()
+    return f"http://{host}:{port}/v1"
@@ -0,0 +1,93 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from benchmarks.embedder_benchmark import load_sample
+from common.compressed_index import CompressedVectorStore, pq_rescore, pq_subvectors
+
+
+def embed_sample(model_name, corpus, sample_size, num_queries, batch_size):
+    from sentence_transformers import SentenceTransformer
+
+    articles = load_sample(corpus, sample_size)
+    model = SentenceTransformer(model_name)
+    docs = model.encode([f"passage: {a['title']}\n{a['abstract']}" for a in articles], batch_size=batch_size)
+    queries = model.encode([f"query: {a['title']}" for a in articles[:num_queries]], batch_size=batch_size)
+    return np.asarray(docs, dtype=np.float32), np.asarray(queries, dtype=np.float32)
+
+
+def synthetic_sample(size, num_queries, dimension, clusters=256, seed=0):
+    """
+    Clustered random vectors, for runs without a model or corpus.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dimension))
+    docs = centers[rng.integers(clusters, size=size)] + 0.5 * rng.normal(size=(size, dimension))
+    queries = docs[:num_queries] + 0.3 * rng.normal(size=(num_queries, dimension))
+    return docs.astype(np.float32), queries.astype(np.float32)
+
+
+def exact_top_k(docs, queries, k):
+    docs = docs / np.linalg.norm(docs, axis=1, keepdims=True)
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    return np.argsort(-(queries @ docs.T), axis=1)[:, :k]
+
+
+def measure(store, docs, queries, reference, k, shortlist=None):
+    # With a publication year per vector, as the pipeline's chunks have
+    store.update({i: (vector, {"publication_year": 2000 + i % 25}) for i, vector in enumerate(docs)}, set())
+    latencies, recalls = [], []
+    for query, expected in zip(queries, reference):
+        started = time.perf_counter()
+        found = [key for key, _ in store.search(query, k, shortlist)]
+        latencies.append((time.perf_counter() - started) * 1000)
+        recalls.append(len(set(found) & set(expected)) / k)
+    stats = store.stats()
+    return {
+        "code_bytes": stats["code_bytes"],
+        # Everything the store keeps per vector, not only its code
+        "bytes_per_vector": stats["bytes_per_vector"],
+        "compression": round(4 * docs.shape[1] / stats["bytes_per_vector"], 1),
+        f"recall_at_{k}": round(float(np.mean(recalls)), 4),
+        "recall_loss": round(1 - float(np.mean(recalls)), 4),
+        "query_p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "disk_bytes_per_vector": stats["disk_bytes"] // max(len(docs), 1),
+    }
+
+
+def run(docs, queries, k, subvectors, rescore):
+    reference = exact_top_k(docs, queries, k)
+    dimension = docs.shape[1]
+    results = {"float32": {"code_bytes": 4 * dimension, "bytes_per_vector": 4 * dimension, "compression": 1.0, f"recall_at_{k}": 1.0}}
+    results["float16"] = measure(CompressedVectorStore(dimension, "float16"), docs, queries, reference, k)
+    # Trained on the whole sample; in the pipeline on the first PQ_TRAINING_SIZE vectors
+    for name, shortlist in ((f"pq{subvectors}", k), (f"pq{subvectors}_rescore{rescore}", rescore)):
+        store = CompressedVectorStore(dimension, "pq", subvectors=subvectors, training_size=len(docs), rescore=rescore)
+        results[name] = measure(store, docs, queries, reference, k, shortlist)
+    results["config"] = {"docs": len(docs), "queries": len(queries), "dimension": dimension, "k": k}
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory per vector and recall loss of the compressed vector stores.")
+    parser.add_argument("--model", default="intfloat/e5-large-v2")
+    parser.add_argument("--corpus", default=os.path.join(os.environ.get("PUBMED_DATA_DIR", "./pubmed/data"), "*.jsonl"),
+                        help="Glob of PubMed JSONL files")
+    parser.add_argument("--synthetic", action="store_true", help="Use clustered random vectors instead of a corpus")
+    parser.add_argument("--dimension", type=int, default=1024, help="Dimension of --synthetic vectors")
+    parser.add_argument("--sample_size", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--subvectors", type=int, default=pq_subvectors)
+    parser.add_argument("--rescore", type=int, default=pq_rescore)
+    parser.add_argument("--batch_size", type=int, default=32)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        docs, queries = synthetic_sample(args.sample_size, args.queries, args.dimension)
+    else:
+        docs, queries = embed_sample(args.model, args.corpus, args.sample_size, args.queries, args.batch_size)
+    print(json.dumps(run(docs, queries, args.k, args.subvectors, args.rescore), indent=2))
@@ -0,0 +1,27 @@
+import pathway as pw
+
+
+def as_of_now(lookup, query_column, **kwargs):
+    """
+    `lookup(query_column, **kwargs)` answered once for each query as it arrives,
+    and retracted when the query is deleted (the REST connector deletes a query
+    once it has responded).
+
+    Pathway's as-of-now index queries and joins only take queries being inserted:
+    a deleted query makes them retract answers they never gave, and the engine
+    panics. `lookup` therefore only sees arrivals (arguments that are columns of
+    the query table are moved over), and its rows, one per query or one per match
+    with a `query_id`, are joined back to the live queries. Everything downstream
+    is freed with the query; only that join keeps the answer rows.
+    """
+    queries = query_column.table
+    arrived = queries._remove_retractions()
+
+    def moved(value):
+        if isinstance(value, pw.ColumnReference) and value.table is queries:
+            return arrived[value.name]
+        return value
+
+    answers = lookup(moved(query_column), **{name: moved(value) for name, value in kwargs.items()})
+    key = answers.query_id if "query_id" in answers.column_names() else answers.id
+    return answers.join(queries, key == queries.id, id=answers.id).select(*pw.left)
@@ -0,0 +1,221 @@
+import os
+import re
+import threading
+
+import pathway as pw
+from dotenv import load_dotenv
+
+from pubmed.pubmed_data import publication_year
+
+load_dotenv()
+
+# Chunks are measured with the embedding model's own tokenizer so they fit its window
+# (512 tokens for e5-large-v2, leaving room for special tokens and the "passage: " prefix).
+# A local directory works too; "words" measures in WordTokenizer tokens without loading anything.
+chunk_tokenizer_model = os.environ.get("CHUNK_TOKENIZER_MODEL", "intfloat/e5-large-v2")
+chunk_max_tokens = int(os.environ.get("CHUNK_MAX_TOKENS", 384))
+chunk_overlap_sentences = int(os.environ.get("CHUNK_OVERLAP_SENTENCES", 1))
+
+# pubmed_data.parse_pubmed_article writes one AbstractText per line, with its Label
+# attribute as "LABEL: text"; only a label at the start of a line counts, so
+# in-text acronyms ("EGFR: ", "CI: ") never start a section
+SECTION_LABEL = re.compile(r"^[A-Z][A-Z0-9 ,/&()-]{2,60}: ")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9(\[])")
+# A word or punctuation mark with the whitespace before it, so decoding restores the text
+WORD = re.compile(r"\s*(?:\w+|[^\w\s])")
+
+_tokenizer_instance = None
+_tokenizer_lock = threading.Lock()
+
+
+class WordTokenizer:
+    """
+    Local stand-in for the model tokenizer: one token per word or punctuation
+    mark. Subword tokenizers produce more tokens than this for the same text, so
+    chunks measured with it can exceed `chunk_max_tokens` model tokens.
+    """
+
+    def encode(self, text, add_special_tokens=False):
+        return WORD.findall(text)
+
+    def __call__(self, texts, add_special_tokens=False):
+        return {"input_ids": [self.encode(text) for text in texts]}
+
+    def decode(self, ids):
+        return "".join(ids).strip()
+
+
+def _load_tokenizer(model_name):
+    if model_name == "words":
+        return WordTokenizer()
+    from transformers import AutoTokenizer
+
+    # The Hugging Face cache (or a local directory) first, so an offline machine
+    # does not wait on the hub
+    try:
+        return AutoTokenizer.from_pretrained(model_name, local_files_only=True)
+    except OSError as error:
+        if _hub_offline():
+            print(f"Tokenizer {model_name} is not cached and the hub is offline ({error}); measuring chunks in words instead")
+            return WordTokenizer()
+    try:
+        return AutoTokenizer.from_pretrained(model_name)
+    except OSError as error:
+        print(f"Could not load tokenizer {model_name} ({error}); measuring chunks in words instead")
+        return WordTokenizer()
+
+
+def _hub_offline():
+    # Set on machines without access to the hub; downloading would only retry until it gives up
+    return any(
+        os.environ.get(name, "").upper() in ("1", "ON", "YES", "TRUE")
+        for name in ("HF_HUB_OFFLINE", "TRANSFORMERS_OFFLINE")
+    )
+
+
+def _tokenizer():
+    global _tokenizer_instance
+    with _tokenizer_lock:
+        if _tokenizer_instance is None:
+            _tokenizer_instance = _load_tokenizer(chunk_tokenizer_model)
+        return _tokenizer_instance
+
+
+def register_tokenizer(tokenizer):
+    """
+    Measure and split chunks with `tokenizer` (anything with the Hugging Face
+    tokenizer's `encode`, `decode` and batch call) instead of loading
+    CHUNK_TOKENIZER_MODEL, e.g. a local stand-in in benchmarks.
+    """
+    global _tokenizer_instance
+    with _tokenizer_lock:
+        _tokenizer_instance = tokenizer
+
+
+def count_tokens(text):
+    return len(_tokenizer().encode(text, add_special_tokens=False))
+
+
+def count_tokens_batch(texts):
+    # One tokenizer call for many texts is much cheaper than one call each
+    if not texts:
+        return []
+    return [len(ids) for ids in _tokenizer()(list(texts), add_special_tokens=False)["input_ids"]]
+
+
+def split_sections(text):
+    """
+    The abstract's parts, one per line. If some lines start with a label, a
+    section runs from one labelled line to the next, so unlabelled lines stay
+    with the section above them.
+    """
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if not any(SECTION_LABEL.match(line) for line in lines):
+        return lines
+    sections = []
+    for line in lines:
+        if sections and not SECTION_LABEL.match(line):
+            sections[-1] += " " + line
+        else:
+            sections.append(line)
+    return sections
+
+
+def split_sentences(text):
+    return [s.strip() for s in SENTENCE_END.split(text) if s.strip()]
+
+
+def _split_tokens(text, budget):
+    # Last resort for a single sentence longer than the budget
+    ids = _tokenizer().encode(text, add_special_tokens=False)
+    return [_tokenizer().decode(ids[i:i + budget]) for i in range(0, len(ids), budget)]
+
+
+def _split_long_section(section, budget, overlap):
+    pieces = []
+    current, current_tokens = [], 0
+    for sentence in split_sentences(section):
+        tokens = count_tokens(sentence)
+        if tokens > budget:
+            if current:
+                pieces.append(" ".join(current))
+            pieces.extend(_split_tokens(sentence, budget))
+            current, current_tokens = [], 0
+            continue
+        if current and current_tokens + tokens > budget:
+            pieces.append(" ".join(current))
+            current = current[-overlap:] if overlap else []
+            current_tokens = sum(count_tokens(s) for s in current)
+            # Drop the overlap if it would leave no room for the new sentence
+            if current_tokens + tokens > budget:
+                current, current_tokens = [], 0
+        current.append(sentence)
+        current_tokens += tokens
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def chunk_text(text, header="", max_tokens=chunk_max_tokens, overlap=chunk_overlap_sentences):
+    """
+    Split `text` into chunks of at most `max_tokens` tokens, each starting with
+    `header`. Whole sections (BACKGROUND, METHODS, ...) are packed together while
+    they fit; only a section that is too long on its own is split, at sentence
+    boundaries with `overlap` sentences repeated between its pieces.
+    """
+    budget = max(1, max_tokens - count_tokens(header))
+    chunks = []
+    current, current_tokens = [], 0
+
+    for section in split_sections(text):
+        tokens = count_tokens(section)
+        if current_tokens + tokens <= budget:
+            current.append(section)
+            current_tokens += tokens
+            continue
+        if current:
+            chunks.append(header + "\n".join(current))
+        current, current_tokens = [], 0
+        if tokens <= budget:
+            current, current_tokens = [section], tokens
+            continue
+        chunks.extend(header + piece for piece in _split_long_section(section, budget, overlap))
+
+    if current:
+        chunks.append(header + "\n".join(current))
+    return chunks or [header.strip()]
+
+
+@pw.udf
+def chunk_article(title: str, abstract: str) -> list[str]:
+    return chunk_text(abstract, header=f"{title}\n")
+
+
+@pw.udf
+def chunk_metadata(pmid: str, publication_date: str, mesh_headings: list[str]) -> pw.Json:
+    return pw.Json({
+        "pmid": pmid,
+        "publication_date": publication_date,
+        # Numeric year for range filters; null for undated articles
+        "publication_year": publication_year(publication_date),
+        "mesh_headings": list(mesh_headings),
+    })
+
+
+def chunk_articles(articles):
+    """
+    Turn one row per article into one row per token-bounded chunk. Every chunk keeps
+    pmid, publication_date and mesh_headings as columns and as a JSON `metadata`
+    column (with the numeric publication_year too) that the KNN index can filter on.
+    """
+    chunks = articles.select(
+        pw.this.pmid,
+        pw.this.publication_date,
+        pw.this.mesh_headings,
+        doc=chunk_article(pw.this.title, pw.this.abstract),
+    ).flatten(pw.this.doc)
+
+    return chunks.select(
+        *pw.this,
+        metadata=chunk_metadata(pw.this.pmid, pw.this.publication_date, pw.this.mesh_headings),
+    )
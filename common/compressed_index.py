@@ -0,0 +1,390 @@
+import math
+import os
+import sys
+import tempfile
+import threading
+
+import jmespath
+import numpy as np
+import pathway as pw
+from dotenv import load_dotenv
+
+from common.as_of_now import as_of_now
+
+load_dotenv()
+
+# "float32" keeps vectors in the Pathway index picked by KNN_INDEX_MODE; "float16" and
+# "pq" keep them compressed in a CompressedVectorStore instead (codes of 2 KB and
+# PQ_SUBVECTORS bytes per dimension-1024 vector respectively, instead of 4 KB, plus
+# the per-vector bookkeeping counted by CompressedVectorStore.stats).
+vector_storage = os.environ.get("VECTOR_STORAGE", "float32")
+pq_subvectors = int(os.environ.get("PQ_SUBVECTORS", 64))
+# Vectors collected (and searched exactly) before the PQ codebooks are trained
+pq_training_size = int(os.environ.get("PQ_TRAINING_SIZE", 10_000))
+# PQ candidates re-scored against the float32 vectors, which stay on disk
+pq_rescore = int(os.environ.get("PQ_RESCORE", 100))
+vector_store_dir = os.environ.get("VECTOR_STORE_DIR", "./vector_store")
+
+INITIAL_CAPACITY = 1024
+# Rows scored at a time, bounding the float32 temporaries of a search
+SEARCH_BLOCK_SIZE = 4096
+# Metadata fields kept for filtering (the year range of partitioned_index.year_filter)
+FILTER_FIELDS = ("publication_year",)
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _nearest_centroids(points, centroids):
+    # argmin |p - c|^2 == argmax p.c - |c|^2 / 2
+    scores = points @ centroids.T
+    scores -= 0.5 * np.sum(centroids ** 2, axis=1)
+    return np.argmax(scores, axis=1)
+
+
+class ProductQuantizer:
+    """
+    Splits vectors into `subvectors` slices and replaces every slice by the nearest
+    of 256 centroids learned with k-means, so a vector is stored in `subvectors`
+    bytes. Inner products with a query are computed from the codes through one
+    lookup table per query (asymmetric distance computation).
+    """
+
+    def __init__(self, dimension, subvectors=pq_subvectors):
+        if dimension % subvectors:
+            raise ValueError(f"PQ_SUBVECTORS ({subvectors}) must divide the dimension ({dimension})")
+        self.dimension = dimension
+        self.subvectors = subvectors
+        self.sub_dimension = dimension // subvectors
+        self.centroids = None
+
+    def train(self, vectors, iterations=20, seed=0):
+        rng = np.random.default_rng(seed)
+        parts = vectors.reshape(len(vectors), self.subvectors, self.sub_dimension)
+        clusters = min(256, len(vectors))
+        self.centroids = np.empty((self.subvectors, 256, self.sub_dimension), dtype=np.float32)
+        for m in range(self.subvectors):
+            points = parts[:, m]
+            centroids = points[rng.choice(len(points), clusters, replace=False)].copy()
+            members = np.zeros((len(points), clusters), dtype=np.float32)
+            for _ in range(iterations):
+                assignment = _nearest_centroids(points, centroids)
+                counts = np.bincount(assignment, minlength=clusters)
+                # Per-cluster sums as a matrix product with the one-hot assignment
+                members[:] = 0
+                members[np.arange(len(points)), assignment] = 1
+                sums = members.T @ points
+                filled = counts > 0
+                centroids[filled] = sums[filled] / counts[filled, None]
+            self.centroids[m, :clusters] = centroids
+            # Fewer than 256 training vectors leave codes unused
+            self.centroids[m, clusters:] = centroids[0]
+
+    def encode(self, vectors):
+        parts = vectors.reshape(len(vectors), self.subvectors, self.sub_dimension)
+        codes = np.empty((len(vectors), self.subvectors), dtype=np.uint8)
+        for m in range(self.subvectors):
+            codes[:, m] = _nearest_centroids(parts[:, m], self.centroids[m])
+        return codes
+
+    def inner_products(self, query, codes):
+        tables = np.einsum("mkd,md->mk", self.centroids, query.reshape(self.subvectors, self.sub_dimension))
+        return tables[np.arange(self.subvectors), codes].sum(axis=1)
+
+
+class CompressedVectorStore:
+    """
+    The vectors of a streaming table, normalized and kept compressed in memory, with
+    a cosine-distance search.
+
+    "float16" stores half-precision copies and scores them directly. "pq" stores
+    ProductQuantizer codes; the best `rescore` candidates by approximate score are
+    re-scored exactly against float32 copies in a memory-mapped scratch file under
+    VECTOR_STORE_DIR, so only the codes have to stay in RAM. Until `training_size`
+    vectors have arrived, "pq" searches the float32 copies exactly.
+
+    Of the metadata, only the numeric `filter_fields` are kept, one float64 array
+    per field (NaN when missing), so search filters can only refer to those.
+    """
+
+    def __init__(self, dimension, storage, subvectors=pq_subvectors, training_size=pq_training_size,
+                 rescore=pq_rescore, store_dir=vector_store_dir, filter_fields=FILTER_FIELDS):
+        if storage not in ("float16", "pq"):
+            raise ValueError(f"Unknown vector storage: {storage}")
+        self.dimension = dimension
+        self.storage = storage
+        self.training_size = training_size
+        self.rescore = rescore
+        self.lock = threading.Lock()
+        self.keys = []
+        self.slots = {}
+        self.free = []
+        self.capacity = INITIAL_CAPACITY
+        self.valid = np.zeros(self.capacity, dtype=bool)
+        self.fields = {field: np.full(self.capacity, np.nan) for field in filter_fields}
+        self.quantizer = None
+        if storage == "float16":
+            self.codes = np.zeros((self.capacity, dimension), dtype=np.float16)
+            self.originals = None
+        else:
+            self.quantizer = ProductQuantizer(dimension, subvectors)
+            self.codes = np.zeros((self.capacity, subvectors), dtype=np.uint8)
+            os.makedirs(store_dir, exist_ok=True)
+            self.originals_file = tempfile.TemporaryFile(dir=store_dir, suffix=".f32")
+            self.originals = self._map_originals()
+
+    def _map_originals(self):
+        self.originals_file.truncate(self.capacity * 4 * self.dimension)
+        return np.memmap(self.originals_file, dtype=np.float32, mode="r+", shape=(self.capacity, self.dimension))
+
+    def _grow(self):
+        self.capacity *= 2
+        self.valid = np.concatenate([self.valid, np.zeros_like(self.valid)])
+        self.codes = np.concatenate([self.codes, np.zeros_like(self.codes)])
+        for field, values in self.fields.items():
+            self.fields[field] = np.concatenate([values, np.full_like(values, np.nan)])
+        if self.originals is not None:
+            self.originals.flush()
+            self.originals = self._map_originals()
+
+    @property
+    def trained(self):
+        return self.quantizer is None or self.quantizer.centroids is not None
+
+    def update(self, additions, deletions):
+        """
+        Remove the `deletions` keys, then add `additions` ({key: (vector, metadata)}).
+        """
+        with self.lock:
+            for key in deletions:
+                slot = self.slots.pop(key, None)
+                if slot is not None:
+                    self.valid[slot] = False
+                    self.keys[slot] = None
+                    self.free.append(slot)
+            if not additions:
+                return
+            vectors = _normalize([vector for vector, _ in additions.values()])
+            slots = []
+            for key, (_, metadata) in additions.items():
+                slot = self.slots.get(key)
+                if slot is None:
+                    slot = self.free.pop() if self.free else len(self.keys)
+                    if slot == len(self.keys):
+                        self.keys.append(None)
+                    while slot >= self.capacity:
+                        self._grow()
+                    self.slots[key] = slot
+                self.keys[slot] = key
+                for field, values in self.fields.items():
+                    values[slot] = _number((metadata or {}).get(field))
+                slots.append(slot)
+            slots = np.array(slots)
+            self.valid[slots] = True
+            if self.originals is not None:
+                self.originals[slots] = vectors
+            if self.storage == "float16":
+                self.codes[slots] = vectors.astype(np.float16)
+            elif self.trained:
+                self.codes[slots] = self.quantizer.encode(vectors)
+            elif len(self.slots) >= self.training_size:
+                self._train()
+
+    def _train(self):
+        live = np.flatnonzero(self.valid)
+        vectors = np.asarray(self.originals[live])
+        self.quantizer.train(vectors)
+        self.codes[live] = self.quantizer.encode(vectors)
+        stats = self.stats()
+        print(f"Trained PQ codebooks on {len(live)} vectors: {stats['bytes_per_vector']} bytes per vector "
+              f"in memory instead of {4 * self.dimension}")
+
+    def _scores(self, query, count):
+        scores = np.full(count, -np.inf, dtype=np.float32)
+        for start in range(0, count, SEARCH_BLOCK_SIZE):
+            end = min(start + SEARCH_BLOCK_SIZE, count)
+            if self.storage == "float16":
+                block = self.codes[start:end].astype(np.float32) @ query
+            elif self.trained:
+                block = self.quantizer.inner_products(query, self.codes[start:end])
+            else:
+                block = self.originals[start:end] @ query
+            scores[start:end] = np.where(self.valid[start:end], block, -np.inf)
+        return scores
+
+    def search(self, query, k, shortlist=None, metadata_filter=None):
+        """
+        Up to `k` (key, cosine distance) pairs, nearest first. `shortlist` overrides
+        how many PQ candidates are re-scored; `metadata_filter` is a JMESPath
+        expression the metadata of every result must satisfy.
+        """
+        query = _normalize(query)
+        expression = jmespath.compile(metadata_filter) if metadata_filter else None
+        with self.lock:
+            count = len(self.keys)
+            if count == 0 or k <= 0:
+                return []
+            scores = self._scores(query, count)
+            wanted = k
+            if self.storage == "pq" and self.trained:
+                wanted = max(k, shortlist if shortlist is not None else self.rescore)
+
+            # Take more and more of the best candidates until enough of them pass the filter
+            candidates = []
+            taken = min(count, wanted if expression is None else 4 * wanted)
+            while True:
+                best = np.argpartition(-scores, taken - 1)[:taken] if taken < count else np.arange(count)
+                best = best[np.isfinite(scores[best])]
+                best = best[np.argsort(-scores[best], kind="stable")]
+                candidates = [s for s in best if expression is None or expression.search(self._metadata(s))]
+                if len(candidates) >= wanted or taken >= count:
+                    break
+                taken = min(count, 4 * taken)
+            candidates = np.array(candidates[:wanted], dtype=np.int64)
+            if len(candidates) == 0:
+                return []
+
+            if self.storage == "pq" and self.trained:
+                exact = np.asarray(self.originals[candidates]) @ query
+                order = np.argsort(-exact, kind="stable")[:k]
+                candidates, final = candidates[order], exact[order]
+            else:
+                candidates, final = candidates[:k], scores[candidates[:k]]
+            return [(self.keys[slot], float(1 - score)) for slot, score in zip(candidates, final)]
+
+    def _metadata(self, slot):
+        # The filter fields of one vector, as the filter expression sees them
+        metadata = {}
+        for field, values in self.fields.items():
+            value = float(values[slot])
+            if not math.isnan(value):
+                metadata[field] = int(value) if value.is_integer() else value
+        return metadata
+
+    def stats(self):
+        """
+        Sizes of the store. `memory_bytes` counts everything kept per vector (codes,
+        validity flags, filter fields, the key list and the key-to-slot dict with
+        the keys and slots they hold) plus the PQ codebooks; `bytes_per_vector` is
+        its share per stored vector.
+        """
+        count = len(self.slots)
+        arrays = self.codes.nbytes + self.valid.nbytes + sum(values.nbytes for values in self.fields.values())
+        containers = sys.getsizeof(self.keys) + sys.getsizeof(self.slots) + sys.getsizeof(self.free)
+        if count:
+            # Every key has the same type, and every slot is an int
+            key, slot = next(iter(self.slots.items()))
+            containers += count * (sys.getsizeof(key) + sys.getsizeof(slot))
+        codebooks = self.quantizer.centroids.nbytes if self.trained and self.quantizer is not None else 0
+        memory = arrays + containers + codebooks
+        return {
+            "storage": self.storage,
+            "vectors": count,
+            "trained": self.trained,
+            "code_bytes": self.codes.shape[1] * self.codes.itemsize,
+            "bytes_per_vector": round(memory / count) if count else None,
+            "memory_bytes": memory,
+            "disk_bytes": self.originals.nbytes if self.originals is not None else 0,
+        }
+
+
+def _number(value):
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else np.nan
+
+
+class CompressedKnnIndex:
+    """
+    Nearest-neighbour index over a CompressedVectorStore, with the
+    `get_nearest_items` interface of `KNNIndex`. The table's vectors are fed to the
+    store as they change, and only the other columns stay in Pathway, so results
+    do not include the embedding column. Queries are answered as of the moment
+    they arrive; `candidates` sets the PQ re-scoring shortlist per query.
+    """
+
+    def __init__(self, data_embedding, data, n_dimensions, metadata=None, storage=vector_storage):
+        self.store = CompressedVectorStore(n_dimensions, storage)
+        self.payload = data.without(data_embedding.name)
+        self.columns = list(self.payload.column_names())
+        self._additions = {}
+        self._deletions = set()
+        feed = data.select(
+            _pw_vector=data_embedding,
+            _pw_metadata=metadata if metadata is not None else None,
+        )
+        pw.io.subscribe(feed, on_change=self._on_change, on_time_end=self._on_time_end)
+
+    def _on_change(self, key, row, time, is_addition):
+        if is_addition:
+            metadata = row["_pw_metadata"]
+            self._additions[key] = (row["_pw_vector"], metadata.value if isinstance(metadata, pw.Json) else metadata)
+        else:
+            self._deletions.add(key)
+
+    def _on_time_end(self, time):
+        # An update retracts and re-inserts the same key, in any order, within one time
+        additions, deletions = self._additions, self._deletions
+        self._additions, self._deletions = {}, set()
+        self.store.update(additions, deletions - additions.keys())
+
+    def get_nearest_items(self, query_embedding, k=3, collapse_rows=True, with_distances=False,
+                          metadata_filter=None, candidates=None):
+        """
+        The `k` nearest documents of every query, as tuples per column (one row per
+        query) or, with `collapse_rows=False`, one row per match with a `query_id`.
+        """
+        queries = query_embedding.table
+        rows = as_of_now(
+            self._query,
+            query_embedding,
+            k=k,
+            metadata_filter=metadata_filter,
+            candidates=candidates,
+        )
+        output_columns = self.columns + (["dist"] if with_distances else [])
+
+        if not collapse_rows:
+            return rows.select(*[pw.this[column] for column in output_columns], pw.this.query_id)
+
+        grouped = rows.groupby(pw.this.query_id, sort_by=pw.this._pw_rank).reduce(
+            pw.this.query_id,
+            **{column: pw.reducers.tuple(pw.this[column]) for column in output_columns},
+        )
+        return queries.join_left(grouped, queries.id == grouped.query_id, id=queries.id).select(
+            **{column: pw.coalesce(pw.right[column], ()) for column in output_columns}
+        )
+
+    def _query(self, query_embedding, k, metadata_filter, candidates):
+        # One row per match of every query, with its `query_id`
+        store = self.store
+
+        @pw.udf
+        def search(vector: np.ndarray, k: int, shortlist: int | None,
+                   metadata_filter: str | None) -> list[tuple[int, pw.Pointer, float]]:
+            matches = store.search(vector, k, shortlist, metadata_filter)
+            return [(rank, key, distance) for rank, (key, distance) in enumerate(matches)]
+
+        matches = query_embedding.table.select(
+            query_id=pw.this.id,
+            _pw_match=search(
+                query_embedding,
+                k,
+                pw.declare_type(int | None, candidates),
+                pw.declare_type(str | None, metadata_filter),
+            ),
+        ).flatten(pw.this._pw_match)
+        matches = matches.select(
+            pw.this.query_id,
+            _pw_rank=pw.this._pw_match[0],
+            _pw_key=pw.this._pw_match[1],
+            dist=pw.this._pw_match[2],
+        )
+        # Documents deleted after the search drop out here
+        return matches.asof_now_join(self.payload, matches._pw_key == self.payload.id).select(
+            *[pw.right[column] for column in self.columns],
+            query_id=pw.left.query_id,
+            dist=pw.left.dist,
+            _pw_rank=pw.left._pw_rank,
+        )
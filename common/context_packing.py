@@ -0,0 +1,165 @@
+import math
+import os
+import re
+from functools import lru_cache
+
+from dotenv import load_dotenv
+
+from common.chunker import count_tokens_batch, split_sentences
+
+load_dotenv()
+
+# Context windows of the chat models, matched by longest prefix of MODEL_LOCATOR;
+# CONTEXT_WINDOW overrides the lookup for other models
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 16_385,
+    "gpt-4": 8_192,
+    "gpt-4-32k": 32_768,
+    "gpt-4-turbo": 128_000,
+    "gpt-4o": 128_000,
+    "gpt-4.1": 1_047_576,
+}
+DEFAULT_CONTEXT_WINDOW = 4_096
+context_window = int(os.environ.get("CONTEXT_WINDOW", 0))
+# Passages retrieved per query; as many as fit the budget end up in the prompt
+context_passages = int(os.environ.get("CONTEXT_PASSAGES", 8))
+# Upper bound on the documents part of a prompt, whatever the model allows: prompt
+# size, and with it LLM latency and cost, stays predictable
+context_token_budget = int(os.environ.get("CONTEXT_TOKEN_BUDGET", 2_000))
+# Passages whose word-trigram Jaccard similarity with a more relevant passage reaches
+# this are dropped as near-duplicates (e.g. preprint and published abstract)
+near_duplicate_threshold = float(os.environ.get("NEAR_DUPLICATE_THRESHOLD", 0.8))
+# At most this many sentences are kept from each passage, besides its title line
+context_sentences_per_passage = int(os.environ.get("CONTEXT_SENTENCES_PER_PASSAGE", 6))
+# Tokens the chat format adds around a prompt sent as a single user message
+MESSAGE_TOKENS = 7
+
+WORD = re.compile(r"\w+")
+
+
+def model_context_window(model):
+    if context_window:
+        return context_window
+    matches = [name for name in MODEL_CONTEXT_WINDOWS if model.startswith(name)]
+    return MODEL_CONTEXT_WINDOWS[max(matches, key=len)] if matches else DEFAULT_CONTEXT_WINDOW
+
+
+@lru_cache(maxsize=None)
+def _chat_encoding(model):
+    import tiktoken
+
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            # Not an OpenAI model; cl100k_base is the closest tokenizer tiktoken has
+            return tiktoken.get_encoding("cl100k_base")
+    except OSError as error:
+        # tiktoken downloads an encoding on first use (or reads it from TIKTOKEN_CACHE_DIR)
+        print(f"Could not load the tokenizer of {model} ({error}); counting prompt tokens with the chunker's")
+        return None
+
+
+def count_chat_tokens(texts, model):
+    """
+    Tokens of each of `texts` for the chat `model`, the tokens the prompt budget
+    and the context window are measured in.
+    """
+    if not texts:
+        return []
+    encoding = _chat_encoding(model)
+    if encoding is None:
+        return count_tokens_batch(texts)
+    return [len(ids) for ids in encoding.encode_ordinary_batch(list(texts))]
+
+
+def token_budget(model, max_tokens, reserved=0):
+    """
+    Tokens left for documents: the model's context window minus the answer
+    (`max_tokens`) and the rest of the prompt (`reserved`), capped at
+    CONTEXT_TOKEN_BUDGET.
+    """
+    return max(0, min(context_token_budget, model_context_window(model) - max_tokens - reserved))
+
+
+def _words(text):
+    return WORD.findall(text.lower())
+
+
+def _shingles(text, size=3):
+    words = _words(text)
+    return {tuple(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+
+def drop_near_duplicates(passages, threshold=near_duplicate_threshold):
+    """
+    `passages` (most relevant first) without those too similar to a more relevant one.
+    """
+    kept, kept_shingles = [], []
+    for passage in passages:
+        shingles = _shingles(passage)
+        if any(len(shingles & other) / len(shingles | other) >= threshold for other in kept_shingles):
+            continue
+        kept.append(passage)
+        kept_shingles.append(shingles)
+    return kept
+
+
+def _relevant_sentences(body, query_weights, limit):
+    # (position, sentence) of the sentences sharing the most (IDF-weighted) query words, best first
+    sentences = split_sentences(body)
+    scores = [sum(query_weights.get(word, 0) for word in set(_words(s))) for s in sentences]
+    # Sentences without any query word are only kept from passages that have no other
+    # (e.g. found by meaning rather than by words), as their opening sentences
+    ranked = [i for i in range(len(sentences)) if scores[i] > 0] or range(len(sentences))
+    best = sorted(ranked, key=lambda i: (-scores[i], i))[:limit]
+    return [(i, sentences[i]) for i in best]
+
+
+def pack_context(passages, query, budget, model, sentences_per_passage=context_sentences_per_passage,
+                 threshold=near_duplicate_threshold):
+    """
+    Assemble the documents part of a prompt from `passages` (most relevant first)
+    in at most `budget` tokens of the chat `model`: near-duplicates are dropped, each passage keeps its
+    title line and its most query-relevant sentences, and passages are added by
+    relevance until the budget is spent. Returns the packed passages.
+    """
+    passages = drop_near_duplicates(passages, threshold)
+    # Query words are weighted by how few of the passages contain them
+    query_words = set(_words(query))
+    passage_words = [set(_words(passage)) for passage in passages]
+    query_weights = {
+        word: math.log(1 + len(passages) / (1 + sum(word in words for words in passage_words)))
+        for word in query_words
+    }
+
+    candidates = []
+    for passage in passages:
+        title, _, body = passage.partition("\n")
+        candidates.append((title, body, _relevant_sentences(body, query_weights, sentences_per_passage)))
+    # Titles and candidate sentences of all passages are counted in one batch
+    counts = iter(count_chat_tokens(
+        [text for title, _, sentences in candidates for text in [title] + [s for _, s in sentences]], model
+    ))
+
+    packed, used = [], 0
+    for title, body, sentences in candidates:
+        tokens = next(counts) + 1
+        sentence_counts = [next(counts) + 1 for _ in sentences]
+        if used + tokens > budget:
+            break
+        kept = []
+        for (position, sentence), sentence_tokens in zip(sentences, sentence_counts):
+            if used + tokens + sentence_tokens <= budget:
+                kept.append((position, sentence))
+                tokens += sentence_tokens
+        if body.strip() and not kept:
+            # A title without any of its text is not worth the tokens
+            continue
+        text = title
+        if kept:
+            # Kept sentences are put back in reading order
+            text += "\n" + " ".join(sentence for _, sentence in sorted(kept))
+        packed.append(text)
+        used += tokens
+    return packed
@@ -1,20 +1,101 @@
 import os
+import numpy as np
 from dotenv import load_dotenv
 
-import pathway as pw
-from pathway.stdlib.ml.index import KNNIndex
 from pathway.xpacks.llm import embedders
 
+from common import model_registry
+from common.embedding_cache import CachedEmbedder
+from common.knn_index import build_knn_index
+from common.partitioned_index import PartitionedKnnIndex
+
 
 load_dotenv()
 
 
 embedding_dimension = int(os.environ.get("EMBEDDING_DIMENSION", 1024))
-embedder = embedders.SentenceTransformerEmbedder(model="intfloat/e5-large-v2")
+embedding_model = "intfloat/e5-large-v2"
+# "torch" runs the fp32 model; "onnx-int8" runs a dynamically quantized ONNX export of
+# the same model on CPU (see benchmarks/embedder_benchmark.py for the trade-off).
+embedder_backend = os.environ.get("EMBEDDER_BACKEND", "torch")
+
+
+class SharedModelEmbedder(embedders.BaseEmbedder):
+    """
+    Batched embedder backed by the process-wide model from `model_registry`, so
+    every pipeline and every embedder in the process shares one loaded copy. The
+    model is loaded on first use, or up front by `warm_up_embedder`.
+
+    A `deterministic` embedder is called again to retract a row, instead of
+    Pathway keeping every float32 vector it produced for the life of the row.
+    """
+
+    def __init__(self, model_name, backend="torch", max_batch_size=1024, deterministic=True):
+        super().__init__(max_batch_size=max_batch_size, deterministic=deterministic)
+        self.model_name = model_name
+        self.backend = backend
+
+    def __wrapped__(self, input: list[str], **kwargs) -> list[np.ndarray]:
+        model = model_registry.load_model(self.model_name, self.backend)
+        return list(model.encode(input, batch_size=len(input), show_progress_bar=False))
+
+    def get_embedding_dimension(self, **kwargs):
+        return model_registry.load_model(self.model_name, self.backend).get_sentence_embedding_dimension()
+
+
+embedder = SharedModelEmbedder(embedding_model, embedder_backend)
+
+# Corpus embeddings are cached on disk by (model, normalized text), so a restart only
+# embeds new text. Set EMBEDDING_CACHE_DIR to an empty string to disable the cache.
+embedding_cache_dir = os.environ.get("EMBEDDING_CACHE_DIR", "./embedding_cache")
+embedding_cache_max_entries = int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", 1_000_000))
+document_embedder = CachedEmbedder(
+    embedder,
+    # Quantized vectors differ slightly, so each backend keeps its own entries
+    model_name=embedding_model if embedder_backend == "torch" else f"{embedding_model}:{embedder_backend}",
+    cache_dir=embedding_cache_dir,
+    dimension=embedding_dimension,
+    max_entries=embedding_cache_max_entries,
+) if embedding_cache_dir else embedder
+
+# Query rows committed together by the REST connector (within QUERY_BATCH_MAX_WAIT_MS)
+# are embedded in one forward pass of at most QUERY_BATCH_MAX_SIZE texts.
+query_batch_max_size = int(os.environ.get("QUERY_BATCH_MAX_SIZE", 32))
+query_batch_max_wait_ms = int(os.environ.get("QUERY_BATCH_MAX_WAIT_MS", 50))
+# Answered queries are deleted right away: keeping their vectors until then is cheaper
+# than embedding every query a second time to retract it
+query_embedder = SharedModelEmbedder(
+    embedding_model, embedder_backend, max_batch_size=query_batch_max_size, deterministic=False
+)
+
+
+def warm_up_embedder():
+    """
+    Load the embedding model, run one inference and check that it produces
+    EMBEDDING_DIMENSION-dimensional vectors. Call before serving requests.
+    """
+    return model_registry.warm_up(embedding_model, embedder_backend, expected_dimension=embedding_dimension)
+
 
 def embeddings(context, data_to_embed):
-    return context + context.select(vector=embedder(data_to_embed))
+    return context + context.select(vector=document_embedder(data_to_embed))
+
+
+def query_embeddings(context, data_to_embed):
+    return context + context.select(vector=query_embedder(data_to_embed))
 
 
 def index_embeddings(embedded_data):
-    return KNNIndex(embedded_data.vector, embedded_data, n_dimensions=embedding_dimension)
+    # Chunked documents carry a JSON metadata column that queries can filter on
+    metadata = embedded_data.metadata if "metadata" in embedded_data.column_names() else None
+    if metadata is not None and "publication_date" in embedded_data.column_names():
+        # PubMed chunks are split into one index per publication year (INDEX_PARTITION_YEARS)
+        return PartitionedKnnIndex(
+            embedded_data.vector,
+            embedded_data,
+            n_dimensions=embedding_dimension,
+            publication_date=embedded_data.publication_date,
+            metadata=metadata,
+        )
+    # KNN_INDEX_MODE picks LSH (default), HNSW or exact search
+    return build_knn_index(embedded_data.vector, embedded_data, n_dimensions=embedding_dimension, metadata=metadata)
@@ -0,0 +1,252 @@
+import asyncio
+import fcntl
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+from pathway.xpacks.llm.embedders import BaseEmbedder
+
+# SQLite caps the number of bound parameters per statement.
+LOOKUP_CHUNK_SIZE = 500
+INITIAL_CAPACITY = 1024
+
+
+def cache_key(model_name, text):
+    """
+    Key of an embedding: the model and the whitespace-normalized text.
+    """
+    normalized = " ".join(text.split())
+    return hashlib.sha256(f"{model_name}\0{normalized}".encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache shared by every pipeline that points at the same directory.
+
+    Vectors live in a fixed-width float32 file that is memory-mapped, so a hit is a
+    row read without deserialization. A SQLite index maps each key to its row
+    ("slot") and records when it was last used. When more than `max_entries`
+    vectors are stored, the least recently used ones are evicted and their slots
+    reused. A file lock serializes writers across processes.
+    """
+
+    def __init__(self, cache_dir, dimension, max_entries=1_000_000):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.dimension = dimension
+        self.max_entries = max_entries
+        self.vectors_path = os.path.join(cache_dir, "vectors.f32")
+        self.index_path = os.path.join(cache_dir, "index.sqlite")
+        self.lock = threading.Lock()
+        self.lock_file = open(os.path.join(cache_dir, ".lock"), "a+")
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.conn = sqlite3.connect(self.index_path, check_same_thread=False)
+        with self._file_lock(fcntl.LOCK_EX), self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key BLOB PRIMARY KEY, slot INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS free_slots (slot INTEGER PRIMARY KEY)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self.conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('dimension', ?)", (dimension,))
+            self.conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('next_slot', 0)")
+            stored_dimension = self._meta("dimension")
+            if stored_dimension != dimension:
+                raise ValueError(
+                    f"Embedding cache in {cache_dir} holds {stored_dimension}-dimensional vectors, not {dimension}"
+                )
+            if not os.path.exists(self.vectors_path):
+                self._resize(INITIAL_CAPACITY)
+        self.vectors = None
+        self._map()
+
+    @contextmanager
+    def _file_lock(self, mode):
+        with self.lock:
+            fcntl.flock(self.lock_file, mode)
+            try:
+                yield
+            finally:
+                fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+
+    def _meta(self, key):
+        return self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()[0]
+
+    def _capacity_on_disk(self):
+        return os.path.getsize(self.vectors_path) // (4 * self.dimension)
+
+    def _resize(self, capacity):
+        with open(self.vectors_path, "ab") as f:
+            f.truncate(capacity * 4 * self.dimension)
+
+    def _map(self):
+        # Another process may have grown the file since it was mapped
+        capacity = self._capacity_on_disk()
+        if self.vectors is None or len(self.vectors) != capacity:
+            self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dimension))
+
+    def _lookup(self, keys):
+        slots = {}
+        for i in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+            chunk = keys[i:i + LOOKUP_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(f"SELECT key, slot FROM entries WHERE key IN ({placeholders})", chunk)
+            slots.update(rows)
+        return slots
+
+    def get_many(self, keys):
+        """
+        Cached vectors for `keys`, with None for every miss.
+        """
+        with self._file_lock(fcntl.LOCK_SH):
+            self._map()
+            slots = self._lookup(list(set(keys)))
+            results = [np.array(self.vectors[slots[key]]) if key in slots else None for key in keys]
+        with self.lock:
+            self.hits += sum(result is not None for result in results)
+            self.misses += sum(result is None for result in results)
+        if slots:
+            # Recency is only used for eviction, so it is recorded outside the read lock
+            with self._file_lock(fcntl.LOCK_EX), self.conn:
+                now = time.time()
+                self.conn.executemany("UPDATE entries SET last_used = ? WHERE key = ?", ((now, key) for key in slots))
+        return results
+
+    def put_many(self, keys, vectors):
+        with self._file_lock(fcntl.LOCK_EX):
+            self._map()
+            new = {key: vector for key, vector in zip(keys, vectors)}
+            for key in self._lookup(list(new)):
+                del new[key]
+            if not new:
+                return
+
+            slots = self._allocate(len(new))
+            for slot, vector in zip(slots, new.values()):
+                self.vectors[slot] = vector
+            # Vectors reach the file before the index points at them
+            self.vectors.flush()
+            with self.conn:
+                now = time.time()
+                self.conn.executemany(
+                    "INSERT INTO entries (key, slot, last_used) VALUES (?, ?, ?)",
+                    ((key, slot, now) for key, slot in zip(new, slots)),
+                )
+                self._evict()
+
+    def _allocate(self, count):
+        free = [row[0] for row in self.conn.execute("SELECT slot FROM free_slots LIMIT ?", (count,))]
+        self.conn.executemany("DELETE FROM free_slots WHERE slot = ?", ((slot,) for slot in free))
+        next_slot = self._meta("next_slot")
+        needed = count - len(free)
+        slots = free + list(range(next_slot, next_slot + needed))
+        self.conn.execute("UPDATE meta SET value = ? WHERE key = 'next_slot'", (next_slot + needed,))
+
+        capacity = len(self.vectors)
+        if next_slot + needed > capacity:
+            while capacity < next_slot + needed:
+                capacity *= 2
+            self.vectors.flush()
+            self._resize(capacity)
+            self._map()
+        return slots
+
+    def _evict(self):
+        excess = self.count() - self.max_entries
+        if excess <= 0:
+            return
+        rows = self.conn.execute("SELECT key, slot FROM entries ORDER BY last_used LIMIT ?", (excess,)).fetchall()
+        self.conn.executemany("DELETE FROM entries WHERE key = ?", ((key,) for key, _ in rows))
+        self.conn.executemany("INSERT OR IGNORE INTO free_slots (slot) VALUES (?)", ((slot,) for _, slot in rows))
+        self.evictions += len(rows)
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def disk_bytes(self):
+        paths = [self.vectors_path, self.index_path, self.index_path + "-wal"]
+        return sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        with self.lock:
+            entries = self.count()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "evictions": self.evictions,
+            "disk_bytes": self.disk_bytes(),
+        }
+
+    def close(self):
+        self.vectors.flush()
+        self.conn.close()
+        self.lock_file.close()
+
+
+class CachedEmbedder(BaseEmbedder):
+    """
+    Wraps any Pathway embedder with an EmbeddingCache: only texts whose
+    (model_name, normalized text) is not cached yet are sent to `embedder`.
+
+    The cache directory is created and opened on the first embedding, not when
+    the embedder is constructed; `cache` is None until then.
+    """
+
+    def __init__(self, embedder, model_name, cache_dir, dimension=None, max_entries=1_000_000, max_batch_size=1024):
+        # Deterministic: a retraction looks the vector up again instead of Pathway
+        # keeping a float32 copy of every embedding
+        super().__init__(max_batch_size=max_batch_size, deterministic=True)
+        self.embedder = embedder
+        self.model_name = model_name
+        self.cache_dir = cache_dir
+        self.dimension = dimension
+        self.max_entries = max_entries
+        self.cache = None
+        self._open_lock = threading.Lock()
+
+    def _open_cache(self):
+        with self._open_lock:
+            if self.cache is None:
+                dimension = self.dimension or self.embedder.get_embedding_dimension()
+                self.cache = EmbeddingCache(self.cache_dir, dimension, max_entries=self.max_entries)
+            return self.cache
+
+    async def __wrapped__(self, input: list[str], **kwargs) -> list[np.ndarray]:
+        cache = self.cache or self._open_cache()
+        keys = [cache_key(self.model_name, text) for text in input]
+        results = cache.get_many(keys)
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            embedded = await self._embed(
+                [input[i] for i in missing],
+                {name: [values[i] for i in missing] for name, values in kwargs.items()},
+            )
+            cache.put_many([keys[i] for i in missing], embedded)
+            for i, vector in zip(missing, embedded):
+                results[i] = vector
+        return results
+
+    async def _embed(self, texts, kwargs):
+        # Wrapped embedders either take a whole batch or one text per call
+        if self.embedder.max_batch_size is not None:
+            calls = [self.embedder.__wrapped__(texts, **kwargs)]
+        else:
+            calls = [
+                self.embedder.__wrapped__(text, **{name: values[i] for name, values in kwargs.items()})
+                for i, text in enumerate(texts)
+            ]
+        results = [await call if asyncio.iscoroutine(call) else call for call in calls]
+        if self.embedder.max_batch_size is None:
+            results = [results]
+        return [np.asarray(vector, dtype=np.float32) for vector in results[0]]
@@ -0,0 +1,184 @@
+import os
+import re
+
+import numpy as np
+import pathway as pw
+from dotenv import load_dotenv
+from pathway.stdlib import indexing
+
+from common.as_of_now import as_of_now
+from common.partitioned_index import year_filter
+
+load_dotenv()
+
+# Matches taken from each retriever before fusion, and the RRF constant
+hybrid_candidates = int(os.environ.get("HYBRID_CANDIDATES", 20))
+rrf_k = int(os.environ.get("RRF_K", 60))
+# A query is answered from BM25 alone, without being embedded, when its best BM25 score
+# is at least LEXICAL_DECISIVE_MIN_SCORE and LEXICAL_DECISIVE_RATIO times the runner-up.
+# A ratio of 0 turns lexical-only answers off.
+lexical_decisive_ratio = float(os.environ.get("LEXICAL_DECISIVE_RATIO", 0))
+lexical_decisive_min_score = float(os.environ.get("LEXICAL_DECISIVE_MIN_SCORE", 0))
+
+WORD = re.compile(r"\w+")
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index (Tantivy) over a text column, updated in place as rows are
+    inserted or retracted. Answers are as of the moment a query arrives.
+    """
+
+    def __init__(self, data_text, data, metadata=None):
+        self.data = data
+        self.index = indexing.DataIndex(data, indexing.TantivyBM25(data_text, metadata))
+
+    def get_nearest_items(self, query_text, k=3, metadata_filter=None):
+        """
+        The `k` best BM25 matches of every query, as tuples per column plus a
+        `score` tuple, best first.
+        """
+        # Tantivy parses queries, so punctuation in free text would be a syntax error
+        terms = query_text.table.select(
+            _pw_terms=_terms(query_text),
+            _pw_filter=pw.declare_type(str | None, metadata_filter),
+        )
+        return as_of_now(self._query, terms._pw_terms, k=k, metadata_filter=terms._pw_filter).with_universe_of(
+            query_text.table
+        )
+
+    def _query(self, terms, k, metadata_filter):
+        return self.index.query_as_of_now(
+            terms,
+            number_of_matches=k,
+            collapse_rows=True,
+            metadata_filter=metadata_filter,
+        ).select(
+            **{column: pw.coalesce(pw.right[column], ()) for column in self.data.column_names()},
+            score=pw.coalesce(pw.right._pw_index_reply_score, ()),
+        )
+
+
+def hybrid_search(queries, query_text, vector_index, lexical_index, embed, k=3, from_year=None, to_year=None,
+                  candidates=hybrid_candidates, index_candidates=None):
+    """
+    Top `k` documents for every query, fusing the BM25 and vector rankings with
+    reciprocal-rank fusion. Queries whose BM25 result is decisive (see
+    LEXICAL_DECISIVE_RATIO) skip `embed` and the vector index.
+
+    `embed(table, text)` adds a `vector` column, like `embedder.query_embeddings`.
+    `index_candidates` (an int or a column of `queries`, None for the index's
+    default) is the vector index's per-query `candidates`, its recall/latency knob.
+    Returns `queries` with one tuple column per document column, best first,
+    `retrieval` ("hybrid" or "lexical") and the query `vector` (None for
+    lexical-only answers).
+    """
+    columns = list(lexical_index.data.column_names())
+    ranged = queries.with_columns(
+        _pw_from=pw.declare_type(int | None, from_year),
+        _pw_to=pw.declare_type(int | None, to_year),
+        _pw_candidates=pw.declare_type(int | None, index_candidates),
+    )
+    lexical = lexical_index.get_nearest_items(
+        ranged[query_text.name],
+        k=candidates,
+        metadata_filter=_lexical_filter(ranged._pw_from, ranged._pw_to),
+    )
+    ranged += lexical.select(
+        _pw_lexical=_rows(*[pw.this[column] for column in columns]),
+        _pw_scores=pw.this.score,
+    )
+
+    if lexical_decisive_ratio > 0:
+        decisive = _decisive(pw.this._pw_scores, lexical_decisive_ratio, lexical_decisive_min_score)
+        answered = ranged.filter(decisive).select(
+            _pw_rows=_first(pw.this._pw_lexical, k),
+            retrieval="lexical",
+            vector=pw.declare_type(np.ndarray | None, None),
+        )
+        to_embed = ranged.filter(~decisive)
+    else:
+        answered = None
+        to_embed = ranged
+
+    embedded = embed(to_embed, to_embed[query_text.name])
+    dense = vector_index.get_nearest_items(
+        embedded.vector, k=candidates, collapse_rows=True,
+        **_date_range(from_year, to_year, embedded),
+        **({"candidates": embedded._pw_candidates} if index_candidates is not None else {}),
+    )
+    embedded += dense.select(_pw_dense=_rows(*[pw.this[column] for column in columns]))
+    fused = embedded.select(
+        _pw_rows=_fuse(pw.this._pw_dense, pw.this._pw_lexical, k, rrf_k),
+        retrieval="hybrid",
+        vector=pw.declare_type(np.ndarray | None, pw.this.vector),
+    )
+
+    if answered is not None:
+        answered.promise_universes_are_disjoint(fused)
+        fused = pw.Table.concat(answered, fused)
+    fused = fused.with_universe_of(queries)
+    return queries + fused.select(
+        **{column: _column(pw.this._pw_rows, i) for i, column in enumerate(columns)},
+        retrieval=pw.this.retrieval,
+        vector=pw.this.vector,
+    )
+
+
+def _date_range(from_year, to_year, table):
+    # Only the partitioned index takes a date range; ranges are passed as columns of `table`
+    if from_year is None and to_year is None:
+        return {}
+    return dict(from_year=table._pw_from, to_year=table._pw_to)
+
+
+@pw.udf(deterministic=True)
+def _terms(text: str) -> str:
+    return " ".join(WORD.findall(text))
+
+
+@pw.udf(deterministic=True)
+def _lexical_filter(from_year: int | None, to_year: int | None) -> str | None:
+    return year_filter(None, None, from_year, to_year)
+
+
+@pw.udf(deterministic=True)
+def _rows(*columns: tuple) -> tuple:
+    return tuple(zip(*columns))
+
+
+@pw.udf(deterministic=True)
+def _column(rows: tuple, position: int) -> tuple:
+    return tuple(row[position] for row in rows)
+
+
+@pw.udf(deterministic=True)
+def _first(rows: tuple, k: int) -> tuple:
+    return rows[:k]
+
+
+@pw.udf(deterministic=True)
+def _decisive(scores: tuple, ratio: float, min_score: float) -> bool:
+    if not scores or scores[0] < min_score:
+        return False
+    return len(scores) == 1 or scores[0] >= ratio * scores[1]
+
+
+def rrf(rankings, k, rrf_k=rrf_k, key=lambda row: row):
+    """
+    Reciprocal-rank fusion: every row scores 1 / (rrf_k + rank) in each ranking
+    it appears in; the `k` best rows are returned.
+    """
+    scores, rows = {}, {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            scores[key(row)] = scores.get(key(row), 0) + 1 / (rrf_k + rank)
+            rows.setdefault(key(row), row)
+    best = sorted(scores, key=lambda row_key: -scores[row_key])[:k]
+    return tuple(rows[row_key] for row_key in best)
+
+
+@pw.udf(deterministic=True)
+def _fuse(dense: tuple, lexical: tuple, k: int, rrf_k: int) -> tuple:
+    # Rows from both indexes are compared by value, so a chunk found by both counts once
+    return rrf([dense, lexical], k, rrf_k, key=repr)
@@ -0,0 +1,200 @@
+import os
+
+import numpy as np
+import pathway as pw
+from pathway.stdlib import indexing
+from pathway.stdlib.ml.index import KNNIndex
+from dotenv import load_dotenv
+
+from common.as_of_now import as_of_now
+from common.compressed_index import CompressedKnnIndex, vector_storage
+
+load_dotenv()
+
+# "lsh" keeps the original KNNIndex (answering as of now); "hnsw" uses a USearch HNSW graph and "exact" a
+# brute-force scan, both updated in place as documents are inserted and deleted.
+knn_index_mode = os.environ.get("KNN_INDEX_MODE", "lsh")
+# Initial capacity of the index; it grows as needed
+knn_reserved_space = int(os.environ.get("KNN_RESERVED_SPACE", 100_000))
+# HNSW build/search trade-offs (0 lets USearch choose its defaults)
+hnsw_connectivity = int(os.environ.get("HNSW_CONNECTIVITY", 0))
+hnsw_expansion_add = int(os.environ.get("HNSW_EXPANSION_ADD", 0))
+hnsw_expansion_search = int(os.environ.get("HNSW_EXPANSION_SEARCH", 0))
+
+
+class StreamingKnnIndex:
+    """
+    Nearest-neighbour index over a Pathway `DataIndex`, with the `get_nearest_items`
+    interface of `KNNIndex` so existing call sites keep working.
+
+    Queries are answered as of the moment they arrive (the underlying indexes only
+    support as-of-now queries), which is what the REST endpoints need. Besides `k`,
+    each query may set `candidates`: that many approximate neighbours are fetched
+    and re-ranked by exact cosine distance before the top `k` are kept. Raising it
+    trades latency for recall.
+    """
+
+    def __init__(self, data_embedding, data, n_dimensions, metadata=None, mode="hnsw",
+                 reserved_space=knn_reserved_space):
+        self.data = data
+        self.embedding_column = data_embedding.name
+        if mode == "hnsw":
+            inner = indexing.USearchKnn(
+                data_embedding,
+                metadata,
+                dimensions=n_dimensions,
+                reserved_space=reserved_space,
+                metric=indexing.USearchMetricKind.COS,
+                connectivity=hnsw_connectivity,
+                expansion_add=hnsw_expansion_add,
+                expansion_search=hnsw_expansion_search,
+            )
+        elif mode == "exact":
+            inner = indexing.BruteForceKnn(
+                data_embedding,
+                metadata,
+                dimensions=n_dimensions,
+                reserved_space=reserved_space,
+                metric=indexing.BruteForceKnnMetricKind.COS,
+            )
+        else:
+            raise ValueError(f"Unknown KNN index mode: {mode}")
+        self.index = indexing.DataIndex(data, inner)
+
+    def get_nearest_items(self, query_embedding, k=3, collapse_rows=True, with_distances=False,
+                          metadata_filter=None, candidates=None):
+        """
+        The `k` nearest documents of every query, as tuples per column (one row per
+        query) or, with `collapse_rows=False`, one row per match with a `query_id`.
+        `k` and `candidates` may be ints or columns of the query table; a query
+        whose `candidates` is None, or less than `k`, fetches `k`.
+        """
+        queries = query_embedding.table
+        columns = list(self.data.column_names())
+        if isinstance(metadata_filter, str):
+            # KNNIndex accepts a constant filter; DataIndex needs an expression
+            metadata_filter = pw.declare_type(str | None, metadata_filter)
+        matches = as_of_now(
+            self._query, query_embedding, k=k, metadata_filter=metadata_filter, candidates=candidates
+        ).with_universe_of(queries)
+
+        if candidates is not None:
+            order = matches.select(
+                order=_rerank(pw.this._pw_query_vector, pw.this[self.embedding_column], pw.this._pw_k)
+            )
+            result = matches.select(
+                **{column: _pick(pw.this[column], order.order) for column in columns},
+                dist=_pick(_cosine_distances(pw.this._pw_query_vector, pw.this[self.embedding_column]), order.order),
+            )
+        else:
+            # Index scores are negated distances, best first
+            result = matches.select(
+                *pw.this.without(pw.this._pw_query_vector, pw.this._pw_k, pw.this._pw_score),
+                dist=_negate(pw.this._pw_score),
+            )
+
+        if not with_distances:
+            result = result.without(pw.this.dist)
+        if collapse_rows:
+            return result
+
+        output_columns = result.column_names()
+        rows = result.select(
+            query_id=pw.this.id,
+            _pw_row=_transpose(*[pw.this[column] for column in output_columns]),
+        ).flatten(pw.this._pw_row)
+        return rows.select(
+            **{column: pw.this._pw_row[i] for i, column in enumerate(output_columns)},
+            query_id=pw.this.query_id,
+        )
+
+    def _query(self, query_embedding, k, metadata_filter, candidates):
+        if candidates is not None:
+            candidates = _at_least(pw.declare_type(int | None, candidates), k)
+        return self.index.query_as_of_now(
+            query_embedding,
+            number_of_matches=candidates if candidates is not None else k,
+            collapse_rows=True,
+            metadata_filter=metadata_filter,
+        ).select(
+            **{column: pw.coalesce(pw.right[column], ()) for column in self.data.column_names()},
+            _pw_query_vector=pw.left[query_embedding.name],
+            _pw_k=k,
+            _pw_score=pw.coalesce(pw.right._pw_index_reply_score, ()),
+        )
+
+
+class LshKnnIndex:
+    """
+    The LSH `KNNIndex`, answering every query once, as of the moment it arrives,
+    like the other modes. (`KNNIndex.get_nearest_items` revisits answers, so a
+    query would be answered again whenever its top-k changes.)
+
+    LSH has no per-query search width: `candidates` is accepted, like in the
+    other modes, and ignored.
+    """
+
+    def __init__(self, data_embedding, data, n_dimensions, metadata=None):
+        self.index = KNNIndex(data_embedding, data, n_dimensions=n_dimensions, metadata=metadata)
+
+    def get_nearest_items(self, query_embedding, k=3, collapse_rows=True, with_distances=False,
+                          metadata_filter=None, candidates=None):
+        matches = as_of_now(
+            self.index.get_nearest_items_asof_now,
+            query_embedding,
+            k=k,
+            collapse_rows=collapse_rows,
+            with_distances=with_distances,
+            metadata_filter=metadata_filter,
+        )
+        return matches.with_universe_of(query_embedding.table) if collapse_rows else matches
+
+
+def cosine_distances(query, vectors):
+    if not vectors:
+        return ()
+    matrix = np.stack([np.asarray(v, dtype=np.float32) for v in vectors])
+    query = np.asarray(query, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+    return tuple(float(d) for d in 1 - (matrix @ query) / np.maximum(norms, 1e-12))
+
+
+@pw.udf(deterministic=True)
+def _cosine_distances(query, vectors: tuple) -> tuple:
+    return cosine_distances(query, vectors)
+
+
+@pw.udf(deterministic=True)
+def _at_least(candidates: int | None, k: int) -> int:
+    return k if candidates is None else max(candidates, k)
+
+
+@pw.udf(deterministic=True)
+def _rerank(query, vectors: tuple, k: int) -> tuple:
+    distances = cosine_distances(query, vectors)
+    return tuple(int(i) for i in np.argsort(distances, kind="stable")[:k])
+
+
+@pw.udf(deterministic=True)
+def _pick(values: tuple, order: tuple) -> tuple:
+    return tuple(values[i] for i in order)
+
+
+@pw.udf(deterministic=True)
+def _negate(scores: tuple) -> tuple:
+    return tuple(-score for score in scores)
+
+
+@pw.udf(deterministic=True)
+def _transpose(*columns: tuple) -> list:
+    return list(zip(*columns))
+
+
+def build_knn_index(data_embedding, data, n_dimensions, metadata=None, mode=knn_index_mode,
+                    storage=vector_storage):
+    # VECTOR_STORAGE=float16 or pq replaces the float32 index with a compressed one
+    if storage != "float32":
+        return CompressedKnnIndex(data_embedding, data, n_dimensions, metadata=metadata, storage=storage)
+    if mode == "lsh":
+        return LshKnnIndex(data_embedding, data, n_dimensions=n_dimensions, metadata=metadata)
+    return StreamingKnnIndex(data_embedding, data, n_dimensions, metadata=metadata, mode=mode)
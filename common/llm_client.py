@@ -0,0 +1,227 @@
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import deque
+
+import aiohttp
+import numpy as np
+
+# Latencies kept per endpoint for the percentiles in `stats`
+LATENCY_WINDOW = 10_000
+
+
+class LLMClient:
+    """
+    Long-lived client for an OpenAI-compatible API, shared by every caller in the
+    process.
+
+    Requests run on the client's own event loop thread, over one pooled aiohttp
+    session, so callers on any thread or event loop (Pathway UDFs, the webserver)
+    reuse connections. At most `max_concurrency` requests are sent at once;
+    identical requests already in flight are coalesced into one upstream call
+    whose result every caller receives. Rate limits (429), server errors (5xx),
+    connection errors and timeouts are retried up to `max_retries` times with
+    exponential backoff starting at `retry_delay` seconds; other errors are
+    raised at once. `stats` reports calls, upstream calls, coalesced calls,
+    retries, errors and the latency percentiles of successful requests per
+    endpoint.
+    """
+
+    def __init__(self, api_base, api_key, max_concurrency=16, timeout=60, max_retries=3, retry_delay=1.0):
+        self.api_base = api_base.rstrip("/")
+        self.api_key = api_key
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.in_flight = {}
+        self.counters = {}
+        self.latencies = {}
+        self.lock = threading.Lock()
+        self.loop = None
+        self.session = None
+        self.semaphore = None
+
+    def _start(self):
+        with self.lock:
+            if self.loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm-client", daemon=True).start()
+                self.loop = loop
+        return self.loop
+
+    async def _open(self):
+        # Runs on the client's loop, which the session and semaphore are bound to
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                base_url=self.api_base + "/",
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                raise_for_status=True,
+            )
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self.session
+
+    async def _submit(self, coroutine):
+        future = asyncio.run_coroutine_threadsafe(coroutine, self._start())
+        return await asyncio.wrap_future(future)
+
+    async def chat(self, prompt, model, temperature=0.0, max_tokens=200):
+        payload = {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        }
+        response = await self._submit(self._post("chat/completions", payload))
+        return response["choices"][0]["message"]["content"]
+
+    async def embed(self, texts, model):
+        response = await self._submit(self._post("embeddings", {"model": model, "input": list(texts)}))
+        data = sorted(response["data"], key=lambda item: item["index"])
+        return [np.asarray(item["embedding"], dtype=np.float32) for item in data]
+
+    async def _post(self, path, payload):
+        key = (path, hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest())
+        self._count(path, "calls")
+        task = self.in_flight.get(key)
+        if task is not None:
+            self._count(path, "coalesced")
+            # Shielded so one caller giving up does not cancel the call for the others
+            return await asyncio.shield(task)
+        task = asyncio.ensure_future(self._request(path, payload))
+        self.in_flight[key] = task
+        task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _request(self, path, payload):
+        session = await self._open()
+        delay = self.retry_delay
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self._attempt(session, path, payload)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                if attempt == self.max_retries or not _retryable(error):
+                    self._count(path, "errors")
+                    raise
+            self._count(path, "retries")
+            # Backing off outside the semaphore, so other requests can go meanwhile
+            await asyncio.sleep(delay * (1 + random.random() / 4))
+            delay *= 2
+
+    async def _attempt(self, session, path, payload):
+        async with self.semaphore:
+            self._count(path, "upstream")
+            started = time.perf_counter()
+            async with session.post(path, json=payload) as response:
+                result = await response.json()
+            # Failed attempts are only counted: a refused request returns at once and a
+            # timed out one after `timeout`, and either would skew the percentiles
+            self._record(path, time.perf_counter() - started)
+        return result
+
+    async def chat_stream(self, prompt, model, temperature=0.0, max_tokens=200):
+        """
+        Yield the answer to `prompt` piece by piece as the model generates it.
+        Streams are never coalesced, but count against the concurrency cap.
+        """
+        payload = {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True,
+        }
+        caller = asyncio.get_running_loop()
+        pieces = asyncio.Queue()
+        done = object()
+
+        async def produce():
+            try:
+                async for piece in self._stream("chat/completions", payload):
+                    caller.call_soon_threadsafe(pieces.put_nowait, piece)
+                caller.call_soon_threadsafe(pieces.put_nowait, done)
+            except Exception as e:
+                caller.call_soon_threadsafe(pieces.put_nowait, e)
+
+        future = asyncio.run_coroutine_threadsafe(produce(), self._start())
+        try:
+            while (piece := await pieces.get()) is not done:
+                if isinstance(piece, Exception):
+                    raise piece
+                yield piece
+        finally:
+            future.cancel()
+
+    async def _stream(self, path, payload):
+        session = await self._open()
+        # Whole streams are timed, so they are reported apart from complete responses
+        name = f"{path} (stream)"
+        async with self.semaphore:
+            self._count(name, "calls")
+            self._count(name, "upstream")
+            started = time.perf_counter()
+            try:
+                async with session.post(path, json=payload) as response:
+                    # Server-sent events, one `data: {chunk}` line each, ending with `data: [DONE]`
+                    async for line in response.content:
+                        line = line.strip()
+                        if not line.startswith(b"data:"):
+                            continue
+                        data = line[len(b"data:"):].strip()
+                        if data == b"[DONE]":
+                            break
+                        for choice in json.loads(data).get("choices", []):
+                            piece = (choice.get("delta") or {}).get("content")
+                            if piece:
+                                yield piece
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                self._count(name, "errors")
+                raise
+            self._record(name, time.perf_counter() - started)
+
+    def _count(self, path, counter):
+        with self.lock:
+            counters = self.counters.setdefault(
+                path, {"calls": 0, "upstream": 0, "coalesced": 0, "retries": 0, "errors": 0}
+            )
+            counters[counter] += 1
+
+    def _record(self, path, seconds):
+        with self.lock:
+            self.latencies.setdefault(path, deque(maxlen=LATENCY_WINDOW)).append(seconds * 1000)
+
+    def stats(self):
+        with self.lock:
+            stats = {}
+            for path, counters in self.counters.items():
+                latencies = np.asarray(self.latencies.get(path, ()))
+                stats[path] = {
+                    **counters,
+                    "latency_ms": {
+                        "p50": round(float(np.percentile(latencies, 50)), 1),
+                        "p95": round(float(np.percentile(latencies, 95)), 1),
+                        "p99": round(float(np.percentile(latencies, 99)), 1),
+                        "mean": round(float(latencies.mean()), 1),
+                    } if len(latencies) else None,
+                }
+            return stats
+
+    def close(self):
+        if self.loop is None:
+            return
+        if self.session is not None:
+            asyncio.run_coroutine_threadsafe(self.session.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+def _retryable(error):
+    # Rate limits and server errors may pass; other statuses (and malformed
+    # responses, which carry the 200 status) would fail again
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status == 429 or error.status >= 500
+    return isinstance(error, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
@@ -0,0 +1,57 @@
+import os
+import threading
+import time
+
+from common.onnx_embedder import load_onnx_int8_model
+
+device = os.environ.get("EMBEDDER_DEVICE", "cpu")
+
+# One instance per (model, backend) for the whole process, however many pipelines use it
+_models = {}
+_lock = threading.Lock()
+
+
+def load_model(model_name, backend="torch"):
+    """
+    Process-wide SentenceTransformer for `model_name`, loaded on first use.
+    `backend` is "torch" (fp32) or "onnx-int8".
+    """
+    key = (model_name, backend)
+    with _lock:
+        if key not in _models:
+            started = time.time()
+            if backend == "onnx-int8":
+                model = load_onnx_int8_model(model_name, device=device)
+            else:
+                from sentence_transformers import SentenceTransformer
+
+                model = SentenceTransformer(model_name, device=device)
+            print(f"Loaded {model_name} ({backend}) in {time.time() - started:.1f}s")
+            _models[key] = model
+        return _models[key]
+
+
+def register_model(model_name, backend, model):
+    """
+    Use `model` (anything with SentenceTransformer's `encode`) for `model_name` and
+    `backend` instead of loading it, e.g. a local stand-in in benchmarks.
+    """
+    with _lock:
+        _models[(model_name, backend)] = model
+
+
+def warm_up(model_name, backend="torch", expected_dimension=None):
+    """
+    Load the model and run one inference, so the first real request does not pay
+    for lazy initialization. Fails if the model's output dimension differs from
+    `expected_dimension` (the dimension the index is built with).
+    """
+    model = load_model(model_name, backend)
+    started = time.time()
+    dimension = len(model.encode(["warm-up"], show_progress_bar=False)[0])
+    if expected_dimension is not None and dimension != expected_dimension:
+        raise ValueError(
+            f"EMBEDDING_DIMENSION is {expected_dimension}, but {model_name} produces {dimension}-dimensional vectors"
+        )
+    print(f"Warmed up {model_name} ({backend}, {dimension} dimensions) in {time.time() - started:.2f}s")
+    return dimension
@@ -0,0 +1,46 @@
+import glob
+import os
+
+# Where the exported, quantized copy of the model is kept, and which CPU instruction
+# set the int8 kernels target ("avx2", "avx512", "avx512_vnni" or "arm64").
+onnx_model_dir = os.environ.get("EMBEDDER_ONNX_DIR", "./models/e5-large-v2-onnx-int8")
+onnx_quantization = os.environ.get("EMBEDDER_ONNX_QUANTIZATION", "avx2")
+
+
+def quantized_model_file(model_dir, quantization=onnx_quantization):
+    """
+    Path of the quantized ONNX file inside `model_dir` (relative to it), or None if
+    it has not been exported yet. Depending on the target it is named
+    model_qint8_<target>.onnx or model_quint8_<target>.onnx.
+    """
+    matches = glob.glob(os.path.join(model_dir, "onnx", f"model_q*int8_{quantization}.onnx"))
+    return os.path.relpath(matches[0], model_dir) if matches else None
+
+
+def export_quantized_model(model_name, model_dir=onnx_model_dir, quantization=onnx_quantization):
+    """
+    Export `model_name` to ONNX and save a dynamically int8-quantized copy in
+    `model_dir`. Needs `sentence-transformers[onnx]` (optimum and onnxruntime).
+    """
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.backend import export_dynamic_quantized_onnx_model
+
+    print(f"Exporting {model_name} to a {quantization} int8 ONNX model in {model_dir}")
+    model = SentenceTransformer(model_name, backend="onnx")
+    model.save(model_dir)
+    export_dynamic_quantized_onnx_model(model, quantization, model_dir)
+    return quantized_model_file(model_dir, quantization)
+
+
+def load_onnx_int8_model(model_name, model_dir=onnx_model_dir, quantization=onnx_quantization, **kwargs):
+    """
+    SentenceTransformer running the int8 ONNX export of `model_name` on ONNX
+    Runtime. The model is exported on first use and reused afterwards; its output
+    has the same dimension as the original model.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    file_name = quantized_model_file(model_dir, quantization) or export_quantized_model(
+        model_name, model_dir, quantization
+    )
+    return SentenceTransformer(model_dir, backend="onnx", model_kwargs={"file_name": file_name}, **kwargs)
@@ -1,6 +1,10 @@
 from dotenv import load_dotenv
 import os
-from llm_app.model_wrappers import OpenAIEmbeddingModel, OpenAIChatGPTModel
+
+import numpy as np
+import pathway as pw
+
+from common.llm_client import LLMClient
 
 load_dotenv()
 
@@ -8,22 +12,58 @@ load_dotenv()
 embedder_locator = os.environ.get("EMBEDDER_LOCATOR", "text-embedding-ada-002")
 api_key = os.environ.get("OPENAI_API_TOKEN", "")
 model_locator = os.environ.get("MODEL_LOCATOR", "gpt-3.5-turbo")
+# Any OpenAI-compatible API, e.g. a local mock server in tests
+api_base = os.environ.get("OPENAI_API_BASE", "https://api.openai.com/v1")
 max_tokens = int(os.environ.get("MAX_TOKENS", 200))
 temperature = float(os.environ.get("TEMPERATURE", 0.0))
+# Requests sent to the API at once, across all callers in the process
+llm_max_concurrency = int(os.environ.get("LLM_MAX_CONCURRENCY", 16))
+llm_timeout = float(os.environ.get("LLM_TIMEOUT", 60))
+# Retries of rate-limited (429), failed (5xx) and timed out requests; others fail at once
+llm_max_retries = int(os.environ.get("LLM_MAX_RETRIES", 3))
+# How often finished chat completions are committed to the pipeline
+llm_commit_ms = int(os.environ.get("LLM_COMMIT_MS", 20))
 
+# One pooled client for every chat, stream and embedding call
+llm_client = LLMClient(
+    api_base, api_key, max_concurrency=llm_max_concurrency, timeout=llm_timeout, max_retries=llm_max_retries
+)
 
-def openai_embedder(data):
-    embedder = OpenAIEmbeddingModel(api_key=api_key)
+# Retries are left to llm_client, which only retries errors that may pass
+llm_executor = pw.udfs.async_executor(capacity=llm_max_concurrency)
+
+
+@pw.udf(executor=llm_executor)
+async def _embed(text: str) -> np.ndarray:
+    # Concurrent rows arrive as concurrent calls, each sent (or coalesced) on its own
+    vectors = await llm_client.embed([text], embedder_locator)
+    return vectors[0]
+
+
+# Answers are fully asynchronous: queries of later commits are retrieved and sent while
+# earlier answers are still being generated, instead of waiting for them
+chat_executor = pw.udfs.fully_async_executor(
+    capacity=llm_max_concurrency,
+    autocommit_duration_ms=llm_commit_ms,
+)
 
-    return embedder.apply(text=data, locator=embedder_locator)
+
+@pw.udf(executor=chat_executor)
+async def _chat(prompt: str) -> str:
+    return await llm_client.chat(prompt, model_locator, temperature=temperature, max_tokens=max_tokens)
+
+
+def openai_embedder(data):
+    return _embed(data)
 
 
 def openai_chat_completion(prompt):
-    model = OpenAIChatGPTModel(api_key=api_key)
-
-    return model.apply(
-            prompt,
-            locator=model_locator,
-            temperature=temperature,
-            max_tokens=max_tokens,
-        )
+    # A future: tables with this column need `await_futures()` before its value is used
+    return _chat(prompt)
+
+
+def openai_chat_completion_stream(prompt):
+    """
+    Async iterator over the pieces of the answer to `prompt`, as the model generates them.
+    """
+    return llm_client.chat_stream(prompt, model_locator, temperature=temperature, max_tokens=max_tokens)
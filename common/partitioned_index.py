@@ -0,0 +1,174 @@
+import os
+from datetime import date
+
+import pathway as pw
+from dotenv import load_dotenv
+
+from common.knn_index import build_knn_index
+from pubmed.pubmed_data import publication_year
+
+load_dotenv()
+
+# Each of the INDEX_PARTITION_YEARS most recent publication years gets its own index;
+# older and undated articles share one more. 0 keeps a single index.
+index_partition_years = int(os.environ.get("INDEX_PARTITION_YEARS", 10))
+
+
+def year_partitions(recent_years=index_partition_years, current_year=None):
+    """
+    (first_year, last_year) of every partition, None meaning unbounded: one per
+    recent year, the current year open-ended (articles published ahead of print),
+    and the oldest one also holding undated articles.
+    """
+    if recent_years <= 0:
+        return [(None, None)]
+    current_year = current_year or date.today().year
+    first_year = current_year - recent_years + 1
+    return (
+        [(None, first_year - 1)]
+        + [(year, year) for year in range(first_year, current_year)]
+        + [(current_year, None)]
+    )
+
+
+def _overlaps(first, last, from_year, to_year):
+    return (from_year is None or last is None or from_year <= last) and (
+        to_year is None or first is None or to_year >= first
+    )
+
+
+def year_filter(first, last, from_year, to_year):
+    """
+    JMESPath metadata filter restricting documents published between `first` and
+    `last` to the query range, or None when that span lies fully inside it.
+    """
+    conditions = []
+    if from_year is not None and (first is None or from_year > first):
+        conditions.append(f"publication_year >= `{from_year}`")
+    if to_year is not None and (last is None or to_year < last):
+        conditions.append(f"publication_year <= `{to_year}`")
+    return " && ".join(conditions) or None
+
+
+class PartitionedKnnIndex:
+    """
+    One KNN index per publication-year partition (see `year_partitions`).
+
+    `get_nearest_items` takes an optional `from_year`/`to_year` range per query.
+    A query is sent only to the partitions its range overlaps and their top-k
+    lists are merged by distance, so a query about the last few years searches
+    only those years' documents. Inside partitions the range only partly covers
+    (the multi-year oldest one, or the open-ended current one), documents are
+    filtered on the `publication_year` field of `metadata`, which is therefore
+    required when a range can be given.
+    """
+
+    def __init__(self, data_embedding, data, n_dimensions, publication_date, metadata=None,
+                 partitions=None):
+        # Compressed indexes do not keep the vectors, so results never include them
+        self.columns = [column for column in data.column_names() if column != data_embedding.name]
+        self.partitions = []
+        for first, last in partitions or year_partitions():
+            part = data.filter(_in_partition(_publication_year(publication_date), first, last))
+            index = build_knn_index(
+                part[data_embedding.name],
+                part,
+                n_dimensions=n_dimensions,
+                metadata=part[metadata.name] if metadata is not None else None,
+            )
+            self.partitions.append((first, last, index))
+
+    def get_nearest_items(self, query_embedding, k=3, collapse_rows=True, with_distances=False,
+                          from_year=None, to_year=None, candidates=None):
+        """
+        The `k` nearest documents of every query published between `from_year` and
+        `to_year` (inclusive; None for no bound), as with `KNNIndex`. `candidates`
+        is passed on to every partition's index (see `StreamingKnnIndex`). `k`, the
+        years and `candidates` may be ints or columns of the query table.
+        """
+        queries = query_embedding.table
+        routed = queries.select(
+            _pw_vector=query_embedding,
+            _pw_k=k,
+            _pw_from=pw.declare_type(int | None, from_year),
+            _pw_to=pw.declare_type(int | None, to_year),
+            _pw_candidates=pw.declare_type(int | None, candidates),
+        )
+
+        matches = []
+        for first, last, index in self.partitions:
+            part = routed.filter(_query_overlaps(pw.this._pw_from, pw.this._pw_to, first, last))
+            part = part.with_columns(_pw_filter=_query_filter(pw.this._pw_from, pw.this._pw_to, first, last))
+            found = index.get_nearest_items(
+                part._pw_vector,
+                k=part._pw_k,
+                collapse_rows=False,
+                with_distances=True,
+                metadata_filter=part._pw_filter,
+                candidates=part._pw_candidates if candidates is not None else None,
+            )
+            # Queries with no match in the partition come back as a single empty row
+            matches.append(found.filter(pw.this.dist.is_not_none()).select(*pw.this[self.columns + ["dist", "query_id"]]))
+
+        merged = (
+            pw.Table.concat_reindex(*matches)
+            .groupby(pw.this.query_id)
+            .reduce(
+                pw.this.query_id,
+                _pw_rows=pw.reducers.tuple(pw.make_tuple(pw.this.dist, *[pw.this[c] for c in self.columns])),
+            )
+        )
+        merged = merged.select(
+            pw.this.query_id,
+            _pw_rows=_closest(pw.this._pw_rows, routed.ix(pw.this.query_id)._pw_k),
+        )
+        output_columns = self.columns + (["dist"] if with_distances else [])
+        positions = {column: i + 1 for i, column in enumerate(self.columns)}
+        positions["dist"] = 0
+
+        if collapse_rows:
+            # One row per query, empty for queries that matched nothing
+            collapsed = routed.join_left(merged, routed.id == merged.query_id, id=routed.id).select(
+                _pw_rows=pw.coalesce(pw.right._pw_rows, ())
+            )
+            return collapsed.select(
+                **{column: _column(pw.this._pw_rows, positions[column]) for column in output_columns}
+            )
+
+        rows = merged.flatten(pw.this._pw_rows)
+        return rows.select(
+            **{column: pw.this._pw_rows[positions[column]] for column in output_columns},
+            query_id=pw.this.query_id,
+        )
+
+
+@pw.udf(deterministic=True)
+def _publication_year(publication_date: str) -> int | None:
+    return publication_year(publication_date)
+
+
+@pw.udf(deterministic=True)
+def _in_partition(year: int | None, first: int | None, last: int | None) -> bool:
+    if year is None:
+        return first is None
+    return (first is None or year >= first) and (last is None or year <= last)
+
+
+@pw.udf(deterministic=True)
+def _query_overlaps(from_year: int | None, to_year: int | None, first: int | None, last: int | None) -> bool:
+    return _overlaps(first, last, from_year, to_year)
+
+
+@pw.udf(deterministic=True)
+def _query_filter(from_year: int | None, to_year: int | None, first: int | None, last: int | None) -> str | None:
+    return year_filter(first, last, from_year, to_year)
+
+
+@pw.udf(deterministic=True)
+def _closest(rows: tuple, k: int) -> tuple:
+    return tuple(sorted(rows, key=lambda row: row[0])[:k])
+
+
+@pw.udf(deterministic=True)
+def _column(rows: tuple, position: int) -> tuple:
+    return tuple(row[position] for row in rows)
@@ -0,0 +1,38 @@
+import os
+
+import pathway as pw
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Directory for Pathway snapshots; persistence is off when it is empty
+persistence_dir = os.environ.get("PERSISTENCE_DIR", "")
+snapshot_interval_ms = int(os.environ.get("PERSISTENCE_SNAPSHOT_INTERVAL_MS", 60_000))
+# "input" snapshots the connector offsets and the rows read so far; on restart they are
+# replayed to rebuild the index, with embeddings served from the embedding cache, and
+# only data that arrived since the snapshot reaches the model. "operator" also
+# snapshots operator state (the index included) so nothing is replayed, but Pathway
+# requires a PATHWAY_LICENSE_KEY for it.
+persistence_mode = os.environ.get("PERSISTENCE_MODE", "input")
+
+
+def persistence_config():
+    """
+    `pw.persistence.Config` for `pw.run`, or None when PERSISTENCE_DIR is not set.
+    Give every input connector a stable `name` so its snapshot is found after a
+    restart. Replayed REST queries are not answered again.
+    """
+    if not persistence_dir:
+        return None
+    if persistence_mode == "operator":
+        mode = pw.PersistenceMode.OPERATOR_PERSISTING
+    elif persistence_mode == "input":
+        mode = pw.PersistenceMode.PERSISTING
+    else:
+        raise ValueError(f"Unknown PERSISTENCE_MODE: {persistence_mode}")
+    print(f"Persisting pipeline state to {persistence_dir} every {snapshot_interval_ms} ms ({persistence_mode})")
+    return pw.persistence.Config(
+        pw.persistence.Backend.filesystem(persistence_dir),
+        snapshot_interval_ms=snapshot_interval_ms,
+        persistence_mode=mode,
+    )
@@ -1,25 +1,109 @@
 import pathway as pw
-from datetime import datetime
-from common.openaiapi_helper import openai_chat_completion_chat_completion
+from common.context_packing import MESSAGE_TOKENS, count_chat_tokens, pack_context, token_budget
+from common.openaiapi_helper import max_tokens, model_locator, openai_chat_completion
+from common.response_cache import date_bucket, documents_key, open_response_cache
 
 
-def prompt(index, embedded_query, user_query):
+def prompt(retrieved, user_query):
+    prompted = _with_prompt(retrieved, user_query)
 
-    @pw.udf
-    def build_prompt(local_indexed_data, query):
-        docs_str = "\n".join(local_indexed_data)
-        prompt = f"Given the following data: \n {docs_str} \nanswer this query: {query}, Assume that current date is: {datetime.now()}. and clean the output"
-        return prompt
-
-    query_context = embedded_query + index.get_nearest_items(
-        embedded_query.vector, k=3, collapse_rows=True
-    ).select(local_indexed_data_list=pw.this.doc).promise_universe_is_equal_to(embedded_query)
+    if open_response_cache() is None:
+        return prompted.select(
+            query_id=pw.this.id,
+            result=openai_chat_completion(pw.this.prompt),
+        ).await_futures()
 
-    prompt = query_context.select(
-        prompt=build_prompt(pw.this.local_indexed_data_list, user_query)
+    # Cached answers come back without an LLM call; the rest are generated and stored
+    vector = pw.this.vector if "vector" in retrieved.column_names() else None
+    looked_up = prompted.with_columns(_pw_cached=_cached_answer(user_query, pw.this._pw_documents_key, vector))
+    hits = looked_up.filter(pw.this._pw_cached.is_not_none()).select(
+        query_id=pw.this.id,
+        result=pw.unwrap(pw.this._pw_cached),
     )
+    misses = looked_up.filter(pw.this._pw_cached.is_none())
+    answered = misses.with_columns(_pw_answer=openai_chat_completion(pw.this.prompt)).await_futures()
+    generated = answered.select(
+        query_id=pw.this.id,
+        result=_remember(user_query, pw.this._pw_documents_key, vector, pw.this._pw_answer),
+    )
+    hits.promise_universes_are_disjoint(generated)
+    return pw.Table.concat(hits, generated)
+
 
-    return prompt.select(
+def retrieval_response(retrieved, user_query):
+    """
+    Respond without calling the LLM: a JSON object with the retrieved `documents`,
+    the `prompt` they would be sent in, the response cache's `documents_key`, the
+    cached `answer`, if any, and the query `vector` to store a new answer under.
+    Clients generate the answer themselves (`/stream`).
+    """
+    prompted = _with_prompt(retrieved, user_query)
+    vector = pw.this.vector if "vector" in retrieved.column_names() else None
+    if open_response_cache() is None:
+        cached = None
+    else:
+        cached = _cached_answer(user_query, pw.this._pw_documents_key, vector)
+    return prompted.select(
         query_id=pw.this.id,
-        result=gemini_chat_completion(pw.this.prompt),
+        result=_documents_response(
+            pw.this.doc, pw.this.metadata, pw.this.prompt, pw.this._pw_documents_key, cached, vector
+        ),
     )
+
+
+def _with_prompt(retrieved, user_query):
+
+    @pw.udf
+    def build_prompt(local_indexed_data, query, day):
+        def render(docs_str):
+            return f"Given the following data: \n {docs_str} \nanswer this query: {query}, Assume that current date is: {day}. and clean the output"
+
+        # The documents get what the model's window leaves after the answer and the rest
+        # of the prompt, up to CONTEXT_TOKEN_BUDGET
+        reserved = count_chat_tokens([render("")], model_locator)[0] + MESSAGE_TOKENS
+        budget = token_budget(model_locator, max_tokens, reserved=reserved)
+        return render("\n".join(pack_context(list(local_indexed_data), query, budget, model_locator)))
+
+    # The date is bucketed (RESPONSE_CACHE_DATE_BUCKET) so identical questions over the
+    # same documents produce identical prompts and can share an answer
+    prompted = retrieved.with_columns(_pw_day=_today(user_query))
+    return prompted.with_columns(
+        prompt=build_prompt(pw.this.doc, user_query, pw.this._pw_day),
+        _pw_documents_key=_documents_key(pw.this.doc, pw.this._pw_day),
+    )
+
+
+@pw.udf
+def _today(query: str) -> str:
+    # Evaluated once per query, when it arrives
+    return date_bucket()
+
+
+@pw.udf(deterministic=True)
+def _documents_key(docs: tuple, day: str) -> str:
+    return documents_key(docs, day, model_locator)
+
+
+@pw.udf
+def _cached_answer(query: str, documents_key: str, vector) -> str | None:
+    answer, _ = open_response_cache().get(query, documents_key, vector)
+    return answer
+
+
+@pw.udf
+def _remember(query: str, documents_key: str, vector, answer: str) -> str:
+    open_response_cache().put(query, documents_key, answer, vector)
+    return answer
+
+
+@pw.udf
+def _documents_response(
+    docs: tuple, metadata: tuple, prompt: str, documents_key: str, answer: str | None, vector
+) -> pw.Json:
+    return pw.Json({
+        "documents": [{"doc": doc, **meta.value} for doc, meta in zip(docs, metadata)],
+        "prompt": prompt,
+        "documents_key": documents_key,
+        "answer": answer,
+        "vector": vector.tolist() if vector is not None else None,
+    })
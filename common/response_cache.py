@@ -0,0 +1,169 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Set RESPONSE_CACHE_PATH to an empty string to disable the cache
+response_cache_path = os.environ.get("RESPONSE_CACHE_PATH", "response_cache.sqlite")
+# Answers are reused within one "day", "week" or "month", and prompts state that bucket's date
+response_cache_date_bucket = os.environ.get("RESPONSE_CACHE_DATE_BUCKET", "day")
+# Minimum cosine similarity of query embeddings for the semantic tier; 0 disables it
+response_cache_similarity = float(os.environ.get("RESPONSE_CACHE_SIMILARITY", 0.95))
+response_cache_max_entries = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", 100_000))
+
+
+def normalize_query(query):
+    return " ".join(query.lower().split())
+
+
+def date_bucket(day=None, bucket=response_cache_date_bucket):
+    """
+    First day (ISO format) of the day, week or month containing `day`, by default today.
+    """
+    day = day or date.today()
+    if bucket == "week":
+        day -= timedelta(days=day.weekday())
+    elif bucket == "month":
+        day = day.replace(day=1)
+    elif bucket != "day":
+        raise ValueError(f"Unknown date bucket: {bucket}")
+    return day.isoformat()
+
+
+def documents_key(docs, bucket, model=""):
+    """
+    Key of what an answer was generated from: the retrieved documents (in any
+    order), the date bucket and the model.
+    """
+    digest = hashlib.sha256(f"{model}\0{bucket}".encode("utf-8"))
+    for doc in sorted(docs):
+        digest.update(b"\0" + doc.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """
+    LLM answers in SQLite, looked up in two tiers that both require the same
+    documents key (see `documents_key`):
+
+    - exact: the same normalized query;
+    - semantic: a query whose embedding has a cosine similarity of at least
+      `similarity` with the new one.
+
+    The least recently used answers are evicted beyond `max_entries`.
+    """
+
+    def __init__(self, path, similarity=response_cache_similarity, max_entries=response_cache_max_entries):
+        self.similarity = similarity
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.hits = {"exact": 0, "semantic": 0}
+        self.misses = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS answers (
+                    documents_key TEXT NOT NULL,
+                    query TEXT NOT NULL,
+                    vector BLOB,
+                    answer TEXT NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (documents_key, query)
+                )
+                """
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS answers_last_used ON answers (last_used)")
+
+    def get(self, query, documents_key, vector=None):
+        """
+        Return (answer, tier) with tier "exact" or "semantic", or (None, None).
+        """
+        query = normalize_query(query)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT answer FROM answers WHERE documents_key = ? AND query = ?", (documents_key, query)
+            ).fetchone()
+            tier = "exact" if row is not None else None
+            if row is None and vector is not None and self.similarity > 0:
+                row, query = self._nearest(documents_key, vector)
+                tier = "semantic" if row is not None else None
+            if row is None:
+                self.misses += 1
+                return None, None
+            self.hits[tier] += 1
+            with self.conn:
+                self.conn.execute(
+                    "UPDATE answers SET last_used = ? WHERE documents_key = ? AND query = ?",
+                    (time.time(), documents_key, query),
+                )
+            return row[0], tier
+
+    def _nearest(self, documents_key, vector):
+        # Only answers over the same documents are compared, so this is a handful of rows
+        rows = self.conn.execute(
+            "SELECT query, vector, answer FROM answers WHERE documents_key = ? AND vector IS NOT NULL",
+            (documents_key,),
+        ).fetchall()
+        if not rows:
+            return None, None
+        vector = np.asarray(vector, dtype=np.float32)
+        stored = np.stack([np.frombuffer(blob, dtype=np.float32) for _, blob, _ in rows])
+        similarities = stored @ vector / np.maximum(np.linalg.norm(stored, axis=1) * np.linalg.norm(vector), 1e-12)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity:
+            return None, None
+        return (rows[best][2],), rows[best][0]
+
+    def put(self, query, documents_key, answer, vector=None):
+        blob = np.asarray(vector, dtype=np.float32).tobytes() if vector is not None else None
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO answers (documents_key, query, vector, answer, last_used) VALUES (?, ?, ?, ?, ?)",
+                (documents_key, normalize_query(query), blob, answer, time.time()),
+            )
+            excess = self.conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self.conn.execute(
+                    "DELETE FROM answers WHERE rowid IN (SELECT rowid FROM answers ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
+
+    def stats(self):
+        lookups = self.misses + sum(self.hits.values())
+        return {
+            "exact_hits": self.hits["exact"],
+            "semantic_hits": self.hits["semantic"],
+            "misses": self.misses,
+            "hit_rate": (lookups - self.misses) / lookups if lookups else None,
+        }
+
+    def close(self):
+        self.conn.close()
+
+
+_response_cache = None
+_open_lock = threading.Lock()
+
+
+def open_response_cache():
+    """
+    The process-wide response cache, opened (and its SQLite file created) on the
+    first call, or None when RESPONSE_CACHE_PATH is empty. The server opens it
+    on startup; importing this module creates nothing.
+    """
+    global _response_cache
+    if not response_cache_path:
+        return None
+    with _open_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache(response_cache_path)
+        return _response_cache
@@ -0,0 +1,192 @@
+import argparse
+import json
+import os
+import threading
+import time
+import traceback
+from datetime import date, datetime, timedelta, timezone
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dotenv import load_dotenv
+
+from pubmed.pubmed_data import DELTA_TABLE_DIR, append_to_delta, ensure_delta_table, harvest, write_part_file
+from pubmed.pubmed_store import PubMedStore
+
+load_dotenv()
+
+# Search terms are separated by ";" since PubMed queries may contain commas
+SEARCH_TERMS = [t.strip() for t in os.environ.get("PUBMED_SEARCH_TERMS", "cancer").split(";") if t.strip()]
+INTERVAL_SECONDS = int(os.environ.get("INGEST_INTERVAL_SECONDS", 3600))
+BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", 500))
+# How far back the first harvest of a new search term reaches
+SINCE_DAYS = int(os.environ.get("INGEST_SINCE_DAYS", 30))
+
+# Directory watched by the Pathway jsonlines reader in api/ragapp.py
+OUTPUT_DIR = os.environ.get("PUBMED_DATA_DIR", "./pubmed/data")
+# Cursors, the PMID store and the status file live outside the watched directory
+STATE_DIR = os.environ.get("INGEST_STATE_DIR", "./pubmed/state")
+# "jsonl" writes one JSONL file per batch, "parquet" appends to a Delta Lake table of Parquet files
+# (api/ragapp.py then needs a PATHWAY_LICENSE_KEY to read it)
+DATA_FORMAT = os.environ.get("PUBMED_DATA_FORMAT", "jsonl")
+STATUS_PORT = int(os.environ.get("INGEST_STATUS_PORT", 0))
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class IngestStatus:
+    """
+    Health/throughput report of the ingestion service, mirrored to a JSON file
+    after every change and optionally served over HTTP.
+    """
+
+    def __init__(self, path, search_terms):
+        self.path = path
+        self.lock = threading.Lock()
+        self.data = {
+            "state": "starting",
+            "search_terms": search_terms,
+            "interval_seconds": INTERVAL_SECONDS,
+            "started_at": _now(),
+            "runs": 0,
+            "last_run_started": None,
+            "last_success": None,
+            "last_error": None,
+            "last_error_at": None,
+            "last_run_articles": 0,
+            "last_run_seconds": None,
+            "articles_per_second": None,
+            "total_articles": 0,
+            "next_run_at": None,
+        }
+        self.write()
+
+    def update(self, **fields):
+        with self.lock:
+            self.data.update(fields)
+            self.write()
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.data)
+
+    def write(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+class StatusHandler(BaseHTTPRequestHandler):
+    def __init__(self, status, *args, **kwargs):
+        self.status = status
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("", "/status", "/health"):
+            self.send_error(404)
+            return
+        snapshot = self.status.snapshot()
+        body = json.dumps(snapshot).encode("utf-8")
+        # /health fails while the last run errored, so orchestrators can alert on it
+        healthy = snapshot["state"] != "error" or self.path.rstrip("/") != "/health"
+        self.send_response(200 if healthy else 503)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_status(status, port):
+    server = ThreadingHTTPServer(("0.0.0.0", port), partial(StatusHandler, status))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    print(f"Ingestion status served on port {port}")
+    return server
+
+
+def output_sink():
+    if DATA_FORMAT == "parquet":
+        table_uri = os.path.join(OUTPUT_DIR, DELTA_TABLE_DIR)
+        ensure_delta_table(table_uri)
+        return partial(append_to_delta, table_uri)
+    return partial(write_part_file, OUTPUT_DIR)
+
+
+def run_once(search_terms, store, status):
+    """
+    Harvest every search term once, writing each batch of changes into OUTPUT_DIR.
+    Returns the number of lines written.
+    """
+    started = time.monotonic()
+    status.update(state="running", last_run_started=_now())
+
+    written = 0
+    errors = []
+    sink = output_sink()
+    for term in search_terms:
+        try:
+            written += harvest(
+                term,
+                STATE_DIR,
+                batch_size=BATCH_SIZE,
+                store=store,
+                sink=sink,
+                since=date.today() - timedelta(days=SINCE_DAYS),
+            )
+        except Exception as e:
+            traceback.print_exc()
+            errors.append(f"{term}: {e}")
+
+    elapsed = time.monotonic() - started
+    snapshot = status.snapshot()
+    fields = {
+        "runs": snapshot["runs"] + 1,
+        "last_run_articles": written,
+        "last_run_seconds": round(elapsed, 3),
+        "articles_per_second": round(written / elapsed, 3) if elapsed > 0 else None,
+        "total_articles": snapshot["total_articles"] + written,
+    }
+    if errors:
+        status.update(state="error", last_error="; ".join(errors), last_error_at=_now(), **fields)
+    else:
+        status.update(state="idle", last_success=_now(), **fields)
+    return written
+
+
+def main(search_terms, once=False):
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    os.makedirs(STATE_DIR, exist_ok=True)
+
+    status = IngestStatus(os.path.join(STATE_DIR, "ingest_status.json"), search_terms)
+    if STATUS_PORT:
+        serve_status(status, STATUS_PORT)
+
+    store = PubMedStore(os.path.join(STATE_DIR, "pubmed_store.sqlite"))
+    print(f"Ingesting {search_terms} into {OUTPUT_DIR} every {INTERVAL_SECONDS}s")
+
+    while True:
+        next_run = time.monotonic() + INTERVAL_SECONDS
+        written = run_once(search_terms, store, status)
+        print(f"Ingestion run finished, {written} new lines written.")
+        if once:
+            break
+        status.update(next_run_at=datetime.fromtimestamp(
+            time.time() + max(0, next_run - time.monotonic()), timezone.utc
+        ).isoformat())
+        time.sleep(max(0, next_run - time.monotonic()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Continuously ingest PubMed articles for the RAG pipeline.")
+    parser.add_argument("--search_term", action="append",
+                        help="Search term to harvest; repeat for several. Defaults to PUBMED_SEARCH_TERMS.")
+    parser.add_argument("--once", action="store_true", help="Run a single ingestion pass and exit")
+    args = parser.parse_args()
+
+    main(args.search_term or SEARCH_TERMS, once=args.once)
@@ -0,0 +1,164 @@
+import os
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Base URL for PubMed E-utilities API, overridable to point at a local stub server
+BASE_URL = os.environ.get("EUTILS_BASE_URL", "https://eutils.ncbi.nlm.nih.gov/entrez/eutils")
+
+API_KEY = os.environ.get("NCBI_API_KEY", "")
+EMAIL = os.environ.get("NCBI_EMAIL", "")
+TOOL = "docassist"
+
+# NCBI allows 3 requests/second per client, 10 with an API key.
+DEFAULT_RATE = 3.0
+API_KEY_RATE = 10.0
+
+MAX_WORKERS = int(os.environ.get("PUBMED_FETCH_WORKERS", 4))
+MAX_RETRIES = int(os.environ.get("PUBMED_FETCH_RETRIES", 5))
+BACKOFF_FACTOR = float(os.environ.get("PUBMED_FETCH_BACKOFF", 1.0))
+TIMEOUT = float(os.environ.get("PUBMED_FETCH_TIMEOUT", 60))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# NCBI asks for POST once an id list gets long enough to risk URL length limits.
+POST_THRESHOLD = 200
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket. `acquire` blocks until a token is available, so all
+    workers sharing one limiter together stay under `rate` requests per second.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class EUtilsClient:
+    """
+    E-utilities client sharing one keep-alive session and one rate limiter across
+    a pool of worker threads. Transient failures (429, 5xx, dropped connections,
+    truncated XML) are retried with exponential backoff, and every attempt goes
+    through the rate limiter.
+    """
+
+    def __init__(self, base_url=BASE_URL, api_key=API_KEY, max_workers=MAX_WORKERS,
+                 max_retries=MAX_RETRIES, backoff_factor=BACKOFF_FACTOR, timeout=TIMEOUT, rate=None):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self.rate_limiter = RateLimiter(rate or (API_KEY_RATE if api_key else DEFAULT_RATE))
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = None
+
+    def _url(self, endpoint):
+        if endpoint.startswith(("http://", "https://")):
+            return endpoint
+        return f"{self.base_url}/{endpoint}"
+
+    def _params(self, params):
+        params = dict(params or {})
+        params.setdefault("tool", TOOL)
+        if EMAIL:
+            params.setdefault("email", EMAIL)
+        if self.api_key:
+            params.setdefault("api_key", self.api_key)
+        return params
+
+    def _backoff(self, attempt, response=None):
+        delay = self.backoff_factor * (2 ** attempt)
+        if response is not None and response.headers.get("Retry-After", "").isdigit():
+            delay = max(delay, int(response.headers["Retry-After"]))
+        time.sleep(delay)
+
+    def request(self, endpoint, params=None, parse=None, stream=False):
+        """
+        Send a request and return `parse(response)` (or the response itself).
+
+        Parsing happens inside the retry loop, so a stream cut off halfway through
+        is fetched again. Long `id` lists are sent as POST bodies.
+        """
+        url = self._url(endpoint)
+        params = self._params(params)
+        use_post = len(str(params.get("id", "")).split(",")) > POST_THRESHOLD
+
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            response = None
+            try:
+                if use_post:
+                    response = self.session.post(url, data=params, stream=stream, timeout=self.timeout)
+                else:
+                    response = self.session.get(url, params=params, stream=stream, timeout=self.timeout)
+                if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                    response.close()
+                    self._backoff(attempt, response)
+                    continue
+                response.raise_for_status()
+                if parse is None:
+                    return response
+                with response:
+                    return parse(response)
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError, ET.ParseError):
+                if response is not None:
+                    response.close()
+                if attempt >= self.max_retries:
+                    raise
+                self._backoff(attempt)
+
+    def map(self, func, items):
+        """
+        Run `func` over `items` on the worker pool, yielding results in input order.
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        return self._executor.map(func, items)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Return the process-wide client, creating it on first use.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = EUtilsClient()
+        return _client
@@ -1,28 +1,68 @@
 import os
+import re
+import time
+import uuid
 import requests
 import json
 import csv
+import gzip
 import argparse
+from datetime import date, datetime, timedelta
+from functools import partial
 from urllib.parse import urlencode
 import xml.etree.ElementTree as ET
 
-# Base URL for PubMed E-utilities API
-BASE_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
+import pyarrow as pa
+import pyarrow.parquet as pq
+from deltalake import WriterProperties, write_deltalake
+
+from pubmed.eutils import BASE_URL, get_client
+from pubmed.pubmed_store import PubMedStore
 
 # Base parameters for the PubMed API request
 BASE_PARAMS = {
     "db": "pubmed",
 }
 
+# esearch will not page past this many records for a single query, so incremental
+# harvests split their date window until every window fits below it.
+ESEARCH_MAX_RECORDS = 9999
+
+# IDs per efetch request when fetching an explicit id list.
+EFETCH_BATCH_SIZE = 200
+
+# Entrez date format used by mindate/maxdate.
+ENTREZ_DATE_FORMAT = "%Y/%m/%d"
+HARVEST_START_DATE = "1900/01/01"
+
+CURSOR_FILE = "pubmed_harvest_cursor.json"
+
+# Columnar output: Parquet row groups, and the Delta Lake table (Parquet files plus a
+# transaction log) that the streaming RAG pipeline reads appends from.
+PARQUET_ROW_GROUP_SIZE = 10000
+DELTA_TABLE_DIR = "pubmed_articles_delta"
+
+ARTICLE_ARROW_SCHEMA = pa.schema([
+    ("pmid", pa.string()),
+    ("title", pa.string()),
+    ("abstract", pa.string()),
+    ("journal", pa.string()),
+    ("publication_date", pa.string()),
+    ("doi", pa.string()),
+    ("authors", pa.list_(pa.string())),
+    ("mesh_headings", pa.list_(pa.string())),
+    ("op", pa.string()),
+    ("version", pa.int64()),
+])
+ARTICLE_ARROW_DEFAULTS = {"authors": [], "mesh_headings": [], "op": "insert", "version": 0}
+
 def get_search_url(term, max_results=20):
     params = {**BASE_PARAMS, "retmode": "json", "term": term, "retmax": max_results}
     encoded = urlencode(params)
     return f"{BASE_URL}/esearch.fcgi?{encoded}"
 
 def fetch_article_ids(search_url):
-    response = requests.get(search_url)
-    response.raise_for_status()
-    data = response.json()
+    data = get_client().request(search_url).json()
     return data.get("esearchresult", {}).get("idlist", [])
 
 def parse_pub_date(pub_date_elem):
@@ -38,91 +78,179 @@ def parse_pub_date(pub_date_elem):
         return f"{year}-{month}-{day}" if month or day else year
     return ""
 
-def fetch_full_article_details(id_list):
-    if not id_list:
-        return []
-    ids = ",".join(id_list)
+PUB_YEAR = re.compile(r"\b(\d{4})\b")
+
+def publication_year(publication_date):
+    """
+    Year of a date produced by parse_pub_date ("2021-Mar-4", "2021" or a
+    MedlineDate such as "1998 Dec-1999 Jan", which counts as its first year), or
+    None when it has no year.
+    """
+    match = PUB_YEAR.search(publication_date or "")
+    return int(match.group(1)) if match else None
+
+def fetch_article_batch(id_batch, include_deletions=False):
     params = {
         **BASE_PARAMS,
-        "id": ids,
+        "id": ",".join(id_batch),
         "retmode": "xml"
     }
-    response = requests.get(f"{BASE_URL}/efetch.fcgi", params=params)
-    response.raise_for_status()
-    xml_data = response.text
+    return get_client().request(
+        "efetch.fcgi", params, stream=True,
+        parse=lambda response: list(iter_articles(response, include_deletions=include_deletions)),
+    )
 
-    root = ET.fromstring(xml_data)
+def fetch_full_article_details(id_list, batch_size=EFETCH_BATCH_SIZE, include_deletions=False):
+    """
+    Fetch article records for `id_list`, split into efetch batches that run
+    concurrently on the shared E-utilities worker pool. Order of `id_list` batches
+    is preserved.
+    """
+    if not id_list:
+        return []
+    batches = [id_list[i:i + batch_size] for i in range(0, len(id_list), batch_size)]
     articles = []
+    fetch_batch = lambda id_batch: fetch_article_batch(id_batch, include_deletions=include_deletions)
+    for batch_articles in get_client().map(fetch_batch, batches):
+        articles.extend(batch_articles)
+    return articles
 
-    for pubmed_article in root.findall('.//PubmedArticle'):
-        medline = pubmed_article.find('MedlineCitation')
-        if medline is None:
-            continue
+def _open_xml_source(source):
+    """
+    Return a binary file object for an efetch response, a path to a (gzipped) XML
+    file or an already open binary stream, and whether the caller must close it.
+    """
+    if isinstance(source, requests.Response):
+        source.raw.decode_content = True
+        return source.raw, False
+    if isinstance(source, (str, os.PathLike)):
+        if os.fspath(source).endswith(".gz"):
+            return gzip.open(source, 'rb'), True
+        return open(source, 'rb'), True
+    return source, False
 
-        pmid = medline.findtext('PMID', default="")
+def iter_articles(source, include_deletions=False):
+    """
+    Yield article records from PubmedArticleSet XML one at a time.
 
-        article_elem = medline.find('Article')
-        if article_elem is None:
-            continue
+    `source` can be a streamed efetch response (`requests.get(..., stream=True)`),
+    a path to a local XML or MEDLINE baseline `.xml.gz` file, or a binary file
+    object. Each article element is released as soon as its record is built, so
+    memory use stays flat regardless of the size of the input.
 
-        title = article_elem.findtext('ArticleTitle', default="No Title")
-
-        abstract_text = ""
-        abstract_elem = article_elem.find('Abstract')
-        if abstract_elem is not None:
-            texts = []
-            for abstract_part in abstract_elem.findall('AbstractText'):
-                if abstract_part.text:
-                    texts.append(abstract_part.text.strip())
-            abstract_text = " ".join(texts)
-
-        journal_title = ""
-        publication_date = ""
-        journal_elem = article_elem.find('Journal')
-        if journal_elem is not None:
-            journal_title = journal_elem.findtext('Title', default="")
-            journal_issue = journal_elem.find('JournalIssue')
-            if journal_issue is not None:
-                pub_date_elem = journal_issue.find('PubDate')
-                publication_date = parse_pub_date(pub_date_elem)
-
-        doi = ""
-        for elem in article_elem.findall('ELocationID'):
-            if elem.get('EIdType') == 'doi':
-                doi = elem.text.strip() if elem.text else ""
-                break
-
-        authors = []
-        author_list = article_elem.find('AuthorList')
-        if author_list is not None:
-            for author in author_list.findall('Author'):
-                last_name = author.findtext('LastName')
-                fore_name = author.findtext('ForeName')
-                if fore_name and last_name:
-                    authors.append(f"{fore_name} {last_name}")
-                elif last_name:
-                    authors.append(last_name)
-
-        mesh_headings = []
-        mesh_heading_list = medline.find('MeshHeadingList')
-        if mesh_heading_list is not None:
-            for mesh_heading in mesh_heading_list.findall('MeshHeading'):
-                descriptor = mesh_heading.find('DescriptorName')
-                if descriptor is not None and descriptor.text:
-                    mesh_headings.append(descriptor.text.strip())
-
-        record = {
-            "pmid": pmid,
-            "title": title,
-            "abstract": abstract_text,
-            "journal": journal_title,
-            "publication_date": publication_date,
-            "doi": doi,
-            "authors": authors,
-            "mesh_headings": mesh_headings,
-        }
-        articles.append(record)
-    return articles
+    With `include_deletions`, retracted articles and the PMIDs listed in
+    DeleteCitation (MEDLINE update files) are yielded as `{"pmid": ..., "deleted": True}`
+    markers instead of article records.
+    """
+    stream, should_close = _open_xml_source(source)
+    try:
+        root = None
+        depth = 0
+        for event, elem in ET.iterparse(stream, events=("start", "end")):
+            if event == "start":
+                if root is None:
+                    root = elem
+                depth += 1
+                continue
+            depth -= 1
+            # Only direct children of the root (PubmedArticle, PubmedBookArticle,
+            # DeleteCitation) are complete records; anything deeper is still being built.
+            if depth != 1:
+                continue
+            if elem.tag == "PubmedArticle":
+                record = parse_pubmed_article(elem)
+                if record is not None and include_deletions and is_retracted(elem):
+                    yield {"pmid": record["pmid"], "deleted": True}
+                elif record is not None:
+                    yield record
+            elif elem.tag == "DeleteCitation" and include_deletions:
+                for pmid_elem in elem.findall('PMID'):
+                    if pmid_elem.text:
+                        yield {"pmid": pmid_elem.text.strip(), "deleted": True}
+            root.clear()
+    finally:
+        if should_close:
+            stream.close()
+
+def is_retracted(pubmed_article):
+    for publication_type in pubmed_article.iter('PublicationType'):
+        if publication_type.text == "Retracted Publication":
+            return True
+    return False
+
+def parse_pubmed_article(pubmed_article):
+    medline = pubmed_article.find('MedlineCitation')
+    if medline is None:
+        return None
+
+    pmid = medline.findtext('PMID', default="")
+
+    article_elem = medline.find('Article')
+    if article_elem is None:
+        return None
+
+    title = article_elem.findtext('ArticleTitle', default="No Title")
+
+    abstract_text = ""
+    abstract_elem = article_elem.find('Abstract')
+    if abstract_elem is not None:
+        texts = []
+        for abstract_part in abstract_elem.findall('AbstractText'):
+            # itertext keeps text after inline markup such as <i> or <sup>
+            text = " ".join("".join(abstract_part.itertext()).split())
+            if text:
+                # One part per line, labelled ones as "LABEL: text", so chunking
+                # can split structured abstracts on their sections
+                label = abstract_part.get('Label')
+                texts.append(f"{label}: {text}" if label else text)
+        abstract_text = "\n".join(texts)
+
+    journal_title = ""
+    publication_date = ""
+    journal_elem = article_elem.find('Journal')
+    if journal_elem is not None:
+        journal_title = journal_elem.findtext('Title', default="")
+        journal_issue = journal_elem.find('JournalIssue')
+        if journal_issue is not None:
+            pub_date_elem = journal_issue.find('PubDate')
+            publication_date = parse_pub_date(pub_date_elem)
+
+    doi = ""
+    for elem in article_elem.findall('ELocationID'):
+        if elem.get('EIdType') == 'doi':
+            doi = elem.text.strip() if elem.text else ""
+            break
+
+    authors = []
+    author_list = article_elem.find('AuthorList')
+    if author_list is not None:
+        for author in author_list.findall('Author'):
+            last_name = author.findtext('LastName')
+            fore_name = author.findtext('ForeName')
+            if fore_name and last_name:
+                authors.append(f"{fore_name} {last_name}")
+            elif last_name:
+                authors.append(last_name)
+
+    mesh_headings = []
+    mesh_heading_list = medline.find('MeshHeadingList')
+    if mesh_heading_list is not None:
+        for mesh_heading in mesh_heading_list.findall('MeshHeading'):
+            descriptor = mesh_heading.find('DescriptorName')
+            if descriptor is not None and descriptor.text:
+                mesh_headings.append(descriptor.text.strip())
+
+    record = {
+        "pmid": pmid,
+        "title": title,
+        "abstract": abstract_text,
+        "journal": journal_title,
+        "publication_date": publication_date,
+        "doi": doi,
+        "authors": authors,
+        "mesh_headings": mesh_headings,
+    }
+    return record
 
 def save_to_jsonl(file_path, articles):
     with open(file_path, 'w', encoding='utf-8') as f:
@@ -134,16 +262,296 @@ def save_to_csv(file_path, articles):
         print("No articles to save.")
         return
     fieldnames = ["pmid", "title", "abstract", "journal", "publication_date", "doi", "authors", "mesh_headings"]
+    list_fields = {"authors", "mesh_headings"}
     with open(file_path, 'w', newline='', encoding='utf-8') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
+        writer = csv.writer(csvfile)
+        writer.writerow(fieldnames)
+        for article in articles:
+            writer.writerow([
+                "; ".join(article.get(field, [])) if field in list_fields else article.get(field, "")
+                for field in fieldnames
+            ])
+
+def articles_to_arrow(articles):
+    """
+    Build an Arrow table with typed list columns for authors and MeSH headings.
+    Plain article records get the change-log defaults (op=insert, version=0).
+    """
+    columns = {name: [] for name in ARTICLE_ARROW_SCHEMA.names}
+    for article in articles:
+        for name, values in columns.items():
+            values.append(article.get(name, ARTICLE_ARROW_DEFAULTS.get(name, "")))
+    return pa.Table.from_pydict(columns, schema=ARTICLE_ARROW_SCHEMA)
+
+def save_to_parquet(file_path, articles, row_group_size=PARQUET_ROW_GROUP_SIZE):
+    """
+    Write articles to a Parquet file one row group at a time, so `articles` can be
+    a generator over a corpus larger than memory.
+    """
+    with pq.ParquetWriter(file_path, ARTICLE_ARROW_SCHEMA, compression="zstd") as writer:
+        chunk = []
         for article in articles:
-            article_copy = article.copy()
-            article_copy["authors"] = "; ".join(article_copy.get("authors", []))
-            article_copy["mesh_headings"] = "; ".join(article_copy.get("mesh_headings", []))
-            writer.writerow(article_copy)
+            chunk.append(article)
+            if len(chunk) >= row_group_size:
+                writer.write_table(articles_to_arrow(chunk), row_group_size=row_group_size)
+                chunk = []
+        if chunk:
+            writer.write_table(articles_to_arrow(chunk), row_group_size=row_group_size)
 
-def main(search_term, data_dir):
+def ensure_delta_table(table_uri):
+    """
+    Create an empty article Delta table at `table_uri` if there is none yet, so a
+    reader can start before the first batch has been ingested.
+    """
+    if not os.path.isdir(os.path.join(table_uri, "_delta_log")):
+        os.makedirs(table_uri, exist_ok=True)
+        write_deltalake(table_uri, articles_to_arrow([]), mode="append")
+
+def append_to_delta(table_uri, articles, row_group_size=PARQUET_ROW_GROUP_SIZE):
+    """
+    Append articles to the Delta table at `table_uri` as one atomic commit of
+    zstd-compressed Parquet.
+    """
+    if not articles:
+        return
+    write_deltalake(
+        table_uri,
+        articles_to_arrow(articles),
+        mode="append",
+        writer_properties=WriterProperties(compression="ZSTD", max_row_group_size=row_group_size),
+    )
+
+def append_to_jsonl(file_path, articles):
+    """
+    Append articles to a JSONL file and flush them to disk, so a streaming reader
+    only ever sees whole new lines and never a rewrite of the existing ones.
+    """
+    with open(file_path, 'a', encoding='utf-8') as f:
+        for article in articles:
+            f.write(json.dumps(article) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+def write_part_file(output_dir, articles):
+    """
+    Write articles as a new JSONL file in `output_dir`. The file is written under a
+    hidden temporary name and renamed into place, so a reader watching
+    `output_dir/*.jsonl` only ever sees complete files. Returns the new path.
+    """
+    if not articles:
+        return None
+    os.makedirs(output_dir, exist_ok=True)
+    name = f"part-{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}.jsonl"
+    tmp_path = os.path.join(output_dir, f".{name}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for article in articles:
+            f.write(json.dumps(article) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    path = os.path.join(output_dir, name)
+    os.replace(tmp_path, path)
+    return path
+
+def esearch_history(term, mindate, maxdate):
+    """
+    Run an esearch for `term` restricted to an Entrez-date window and keep the result
+    on the History server. Returns (count, webenv, query_key).
+    """
+    params = {
+        **BASE_PARAMS,
+        "retmode": "json",
+        "term": term,
+        "usehistory": "y",
+        "retmax": 0,
+        "datetype": "edat",
+        "mindate": mindate,
+        "maxdate": maxdate,
+    }
+    result = get_client().request("esearch.fcgi", params).json().get("esearchresult", {})
+    return int(result.get("count", 0)), result.get("webenv"), result.get("querykey")
+
+def fetch_history_batch(webenv, query_key, retstart, retmax, include_deletions=False):
+    """
+    Fetch one page of a History server result set with efetch.
+    """
+    params = {
+        **BASE_PARAMS,
+        "WebEnv": webenv,
+        "query_key": query_key,
+        "retstart": retstart,
+        "retmax": retmax,
+        "retmode": "xml",
+    }
+    return get_client().request(
+        "efetch.fcgi", params, stream=True,
+        parse=lambda response: list(iter_articles(response, include_deletions=include_deletions)),
+    )
+
+def load_cursor(cursor_path, search_term):
+    if not os.path.exists(cursor_path):
+        return {}
+    with open(cursor_path, 'r', encoding='utf-8') as f:
+        return json.load(f).get(search_term, {})
+
+def save_cursor(cursor_path, search_term, cursor):
+    """
+    Persist the cursor for `search_term` atomically, keeping cursors of other terms.
+    """
+    cursors = {}
+    if os.path.exists(cursor_path):
+        with open(cursor_path, 'r', encoding='utf-8') as f:
+            cursors = json.load(f)
+    cursors[search_term] = cursor
+    tmp_path = cursor_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(cursors, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, cursor_path)
+
+def _parse_entrez_date(value):
+    return datetime.strptime(value, ENTREZ_DATE_FORMAT).date()
+
+def _format_entrez_date(value):
+    return value.strftime(ENTREZ_DATE_FORMAT)
+
+def harvest(search_term, data_dir, batch_size=500, until=None, store=None, sink=None, since=None):
+    """
+    Incrementally harvest PubMed records for `search_term` into
+    `pubmed_full_articles.jsonl`, appending only records that were not harvested
+    by a previous run.
+
+    Progress is tracked by a cursor on the Entrez (entry) date: each run covers the
+    closed days after `last_entry_date` up to yesterday, so the set of records in
+    a window never changes while it is being paged. Windows larger than what
+    esearch can page are split in half until they fit. Within a window the cursor
+    also stores the paging offset and the PMIDs already written, so an interrupted
+    run resumes without duplicating lines.
+
+    With a `PubMedStore`, records are diffed against what was ingested before and
+    only inserts, real updates and retractions are appended (see `PubMedStore.apply`).
+
+    `sink`, if given, receives each batch of lines instead of the JSONL file; the
+    cursor is still kept in `data_dir`. `since` bounds the very first harvest of a
+    term (default: everything since HARVEST_START_DATE).
+
+    Returns the number of appended lines.
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    jsonl_path = os.path.join(data_dir, "pubmed_full_articles.jsonl")
+    sink = sink or (lambda lines: append_to_jsonl(jsonl_path, lines))
+    cursor_path = os.path.join(data_dir, CURSOR_FILE)
+
+    cursor = load_cursor(cursor_path, search_term)
+    until = until or date.today() - timedelta(days=1)
+
+    pending = cursor.get("pending")
+    if pending:
+        windows = [(_parse_entrez_date(pending["maxdate"]) + timedelta(days=1), until)]
+        windows.append((_parse_entrez_date(pending["mindate"]), _parse_entrez_date(pending["maxdate"])))
+    else:
+        last_entry_date = cursor.get("last_entry_date")
+        if last_entry_date:
+            start = _parse_entrez_date(last_entry_date) + timedelta(days=1)
+        else:
+            start = since or _parse_entrez_date(HARVEST_START_DATE)
+        windows = [(start, until)]
+
+    appended = 0
+    # Windows are processed as a stack with the oldest window on top, so the cursor
+    # only ever moves forward in time.
+    while windows:
+        mindate, maxdate = windows.pop()
+        if mindate > maxdate:
+            continue
+
+        count, webenv, query_key = esearch_history(
+            search_term, _format_entrez_date(mindate), _format_entrez_date(maxdate)
+        )
+
+        if count > ESEARCH_MAX_RECORDS and mindate < maxdate:
+            middle = mindate + (maxdate - mindate) // 2
+            windows.append((middle + timedelta(days=1), maxdate))
+            windows.append((mindate, middle))
+            continue
+        if count > ESEARCH_MAX_RECORDS:
+            print(f"Warning: {count} records entered on {mindate}, only the first "
+                  f"{ESEARCH_MAX_RECORDS} can be harvested.")
+            count = ESEARCH_MAX_RECORDS
+
+        window = {"mindate": _format_entrez_date(mindate), "maxdate": _format_entrez_date(maxdate)}
+        if pending and pending["mindate"] == window["mindate"] and pending["maxdate"] == window["maxdate"]:
+            retstart = pending.get("retstart", 0)
+            written = set(pending.get("pmids", []))
+        else:
+            retstart = 0
+            written = set()
+
+        print(f"Harvesting {count} records entered {window['mindate']} - {window['maxdate']}.")
+        # Pages are fetched concurrently but handed back in order, so the cursor
+        # offset always matches what has been appended.
+        page_starts = range(retstart, count, batch_size)
+        pages = get_client().map(
+            lambda start: fetch_history_batch(webenv, query_key, start, batch_size,
+                                              include_deletions=store is not None),
+            page_starts,
+        )
+        for page_start, articles in zip(page_starts, pages):
+            new_articles = [a for a in articles if a["pmid"] not in written]
+            if store is not None:
+                lines = store.apply(new_articles, sink)
+            else:
+                lines = new_articles
+                sink(lines)
+            appended += len(lines)
+
+            written.update(a["pmid"] for a in new_articles)
+            retstart = page_start + batch_size
+            if new_articles:
+                cursor["last_pmid"] = new_articles[-1]["pmid"]
+            cursor["pending"] = {**window, "retstart": retstart, "pmids": sorted(written)}
+            save_cursor(cursor_path, search_term, cursor)
+
+        pending = None
+        cursor.pop("pending", None)
+        cursor["last_entry_date"] = window["maxdate"]
+        save_cursor(cursor_path, search_term, cursor)
+
+    print(f"Harvested {appended} new lines for '{search_term}'")
+    return appended
+
+def load_baseline(xml_paths, data_dir, batch_size=1000, store=None, sink=None):
+    """
+    Bulk-load local MEDLINE baseline/update files (`.xml` or `.xml.gz`) into
+    `pubmed_full_articles.jsonl` without network access. Records are streamed from
+    disk and appended in batches, so memory use does not grow with file size.
+    With a `PubMedStore`, only changes are appended, including DeleteCitation entries.
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    jsonl_path = os.path.join(data_dir, "pubmed_full_articles.jsonl")
+    sink = sink or (lambda lines: append_to_jsonl(jsonl_path, lines))
+
+    def flush(batch):
+        if store is None:
+            sink(batch)
+            return len(batch)
+        return len(store.apply(batch, sink))
+
+    loaded = 0
+    for xml_path in xml_paths:
+        batch = []
+        for article in iter_articles(xml_path, include_deletions=store is not None):
+            batch.append(article)
+            if len(batch) >= batch_size:
+                loaded += flush(batch)
+                batch = []
+        loaded += flush(batch)
+        print(f"Loaded {xml_path}")
+
+    print(f"Loaded {loaded} lines")
+    return loaded
+
+def main(search_term, data_dir, store=None, formats=("jsonl", "csv")):
     search_url = get_search_url(search_term)
     print(f"Searching PubMed with URL:\n{search_url}\n")
 
@@ -160,25 +568,68 @@ def main(search_term, data_dir):
     print(f"Found {len(id_list)} article IDs.")
 
     try:
-        articles = fetch_full_article_details(id_list)
+        articles = fetch_full_article_details(id_list, include_deletions=store is not None)
     except requests.HTTPError as e:
         print(f"Error fetching article details: {e}")
         return
 
     os.makedirs(data_dir, exist_ok=True)
-
     jsonl_path = os.path.join(data_dir, "pubmed_full_articles.jsonl")
-    save_to_jsonl(jsonl_path, articles)
-    print(f"Article details saved to JSONL: {jsonl_path}")
 
-    csv_path = os.path.join(data_dir, "pubmed_full_articles.csv")
-    save_to_csv(csv_path, articles)
-    print(f"Article details saved to CSV: {csv_path}")
+    if store is not None:
+        def emit(changes):
+            if "jsonl" in formats:
+                append_to_jsonl(jsonl_path, changes)
+                print(f"Appended {len(changes)} changed articles to JSONL: {jsonl_path}")
+            if "parquet" in formats:
+                delta_path = os.path.join(data_dir, DELTA_TABLE_DIR)
+                append_to_delta(delta_path, changes)
+                print(f"Appended {len(changes)} changed articles to Delta table: {delta_path}")
+
+        # The changes are written before the store records them as emitted
+        store.apply(articles, emit)
+        articles = [a for a in articles if not a.get("deleted")]
+    else:
+        if "jsonl" in formats:
+            save_to_jsonl(jsonl_path, articles)
+            print(f"Article details saved to JSONL: {jsonl_path}")
+        if "parquet" in formats:
+            parquet_path = os.path.join(data_dir, "pubmed_full_articles.parquet")
+            save_to_parquet(parquet_path, articles)
+            print(f"Article details saved to Parquet: {parquet_path}")
+
+    if "csv" in formats:
+        csv_path = os.path.join(data_dir, "pubmed_full_articles.csv")
+        save_to_csv(csv_path, articles)
+        print(f"Article details saved to CSV: {csv_path}")
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Fetch and save PubMed articles.")
-    parser.add_argument('--search_term', type=str, required=True, help='Search term for PubMed')
+    parser.add_argument('--search_term', type=str, help='Search term for PubMed')
     parser.add_argument('--data_dir', type=str, default='.', help='Directory to save the output files')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Append only articles entered since the last harvest instead of rewriting the output')
+    parser.add_argument('--batch_size', type=int, default=500, help='Records per efetch request in incremental mode')
+    parser.add_argument('--baseline', type=str, nargs='+',
+                        help='Local MEDLINE baseline/update XML files (.xml or .xml.gz) to load instead of searching')
+    parser.add_argument('--store', type=str,
+                        help='SQLite file tracking ingested PMIDs; when set only inserts, updates and deletions are written')
+    parser.add_argument('--formats', type=str, default='jsonl,csv',
+                        help='Comma-separated output formats: jsonl, csv, parquet. Incremental and baseline '
+                             'modes append to a Delta Lake table when parquet is requested without jsonl')
     args = parser.parse_args()
+    formats = [f.strip() for f in args.formats.split(',') if f.strip()]
+
+    store = PubMedStore(args.store) if args.store else None
+    sink = None
+    if "parquet" in formats and "jsonl" not in formats:
+        sink = partial(append_to_delta, os.path.join(args.data_dir, DELTA_TABLE_DIR))
 
-    main(args.search_term, args.data_dir)
+    if args.baseline:
+        load_baseline(args.baseline, args.data_dir, store=store, sink=sink)
+    elif not args.search_term:
+        parser.error('--search_term is required unless --baseline is given')
+    elif args.incremental:
+        harvest(args.search_term, args.data_dir, batch_size=args.batch_size, store=store, sink=sink)
+    else:
+        main(args.search_term, args.data_dir, store=store, formats=formats)
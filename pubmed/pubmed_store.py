@@ -0,0 +1,144 @@
+import hashlib
+import json
+import sqlite3
+import time
+
+ARTICLE_FIELDS = ["pmid", "title", "abstract", "journal", "publication_date", "doi", "authors", "mesh_headings"]
+
+# SQLite caps the number of bound parameters per statement.
+LOOKUP_CHUNK_SIZE = 500
+
+
+def normalize_record(record):
+    """
+    Canonical form of an article used for change detection: whitespace is
+    collapsed and MeSH headings are order-insensitive.
+    """
+    def clean(value):
+        return " ".join(value.split()) if isinstance(value, str) else value
+
+    normalized = {field: clean(record.get(field, "")) for field in ARTICLE_FIELDS if field not in ("authors", "mesh_headings")}
+    normalized["authors"] = [clean(author) for author in record.get("authors", [])]
+    normalized["mesh_headings"] = sorted(clean(heading) for heading in record.get("mesh_headings", []))
+    return normalized
+
+
+def content_hash(record):
+    payload = json.dumps(normalize_record(record), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def deletion_record(pmid):
+    """
+    Change row for a deleted PMID. All article fields are present (and empty) so
+    the downstream stream keeps a single schema.
+    """
+    record = {field: "" for field in ARTICLE_FIELDS}
+    record.update({"pmid": pmid, "authors": [], "mesh_headings": []})
+    return record
+
+
+class PubMedStore:
+    """
+    Persistent PMID-keyed record of what has already been sent downstream.
+
+    `apply` takes freshly fetched records (and deletion markers, i.e. records with
+    `"deleted": True`), compares them with the stored content hashes and emits
+    only the changes: inserts, updates whose normalized content actually differs,
+    and deletions of PMIDs that are currently live. Every call to `apply` gets a
+    new `version`, so consumers can keep the latest change per PMID.
+    """
+
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.conn:
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS articles (
+                    pmid TEXT PRIMARY KEY,
+                    content_hash TEXT NOT NULL,
+                    deleted INTEGER NOT NULL DEFAULT 0,
+                    version INTEGER NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def _next_version(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        version = (row[0] if row else 0) + 1
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (version,))
+        return version
+
+    def _lookup(self, pmids):
+        existing = {}
+        for i in range(0, len(pmids), LOOKUP_CHUNK_SIZE):
+            chunk = pmids[i:i + LOOKUP_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT pmid, content_hash, deleted FROM articles WHERE pmid IN ({placeholders})", chunk
+            )
+            for pmid, digest, deleted in rows:
+                existing[pmid] = (digest, bool(deleted))
+        return existing
+
+    def apply(self, records, emit):
+        """
+        Record `records` in the store and pass the change rows to `emit`, each an
+        article dict with additional `op` ("insert", "update" or "delete") and
+        `version` keys. Returns the change rows.
+
+        `emit` writes the changes downstream and runs before the store commits:
+        if it fails, nothing is recorded and the next run emits the changes again.
+        A crash after `emit` but before the commit replays them with the same
+        version, which consumers keeping the latest version per PMID absorb.
+        """
+        # The last occurrence of a PMID within one batch wins.
+        latest = {}
+        for record in records:
+            latest[record["pmid"]] = record
+        if not latest:
+            return []
+
+        changes = []
+        now = time.time()
+        with self.conn:
+            version = self._next_version()
+            existing = self._lookup(list(latest))
+            for pmid, record in latest.items():
+                stored_hash, stored_deleted = existing.get(pmid, (None, True))
+
+                if record.get("deleted"):
+                    if stored_deleted:
+                        continue
+                    self.conn.execute(
+                        "UPDATE articles SET deleted = 1, version = ?, updated_at = ? WHERE pmid = ?",
+                        (version, now, pmid),
+                    )
+                    changes.append({**deletion_record(pmid), "op": "delete", "version": version})
+                    continue
+
+                digest = content_hash(record)
+                if stored_deleted:
+                    op = "insert"
+                elif digest != stored_hash:
+                    op = "update"
+                else:
+                    continue
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO articles (pmid, content_hash, deleted, version, updated_at) "
+                    "VALUES (?, ?, 0, ?, ?)",
+                    (pmid, digest, version, now),
+                )
+                article = {field: record.get(field, "") for field in ARTICLE_FIELDS}
+                changes.append({**article, "op": op, "version": version})
+            emit(changes)
+        return changes
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM articles WHERE deleted = 0").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,95 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+
+def normalize_name(name):
+    """
+    Cache key for a drug name: case- and whitespace-insensitive.
+    """
+    return " ".join(name.lower().split())
+
+
+class TTLCache:
+    """
+    Two-level cache: an in-memory LRU in front of a SQLite file, both honouring a
+    per-entry TTL. Entries are grouped by namespace (e.g. "rxcui", "interactions").
+
+    Expired entries are kept on disk so `get(..., allow_stale=True)` can still
+    answer when the upstream API is unavailable.
+    """
+
+    def __init__(self, path, max_memory_entries=4096):
+        self.max_memory_entries = max_memory_entries
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cache (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+                """
+            )
+
+    def _remember(self, mem_key, value, expires_at):
+        self.memory[mem_key] = (value, expires_at)
+        self.memory.move_to_end(mem_key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+    def get(self, namespace, key, allow_stale=False):
+        """
+        Return the cached value or `MISSING`. Expired values are only returned with
+        `allow_stale`.
+        """
+        mem_key = (namespace, key)
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(mem_key)
+            if entry is not None and (allow_stale or entry[1] > now):
+                self.memory.move_to_end(mem_key)
+                return entry[0]
+
+            row = self.conn.execute(
+                "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            if row is None:
+                return MISSING
+            value, expires_at = json.loads(row[0]), row[1]
+            if expires_at > now:
+                self._remember(mem_key, value, expires_at)
+            elif not allow_stale:
+                return MISSING
+            return value
+
+    def set(self, namespace, key, value, ttl):
+        expires_at = time.time() + ttl
+        with self.lock:
+            self._remember((namespace, key), value, expires_at)
+            with self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                    (namespace, key, json.dumps(value), expires_at),
+                )
+
+    def purge_expired(self, older_than=0):
+        """
+        Delete entries that expired more than `older_than` seconds ago.
+        """
+        with self.lock:
+            with self.conn:
+                self.conn.execute("DELETE FROM cache WHERE expires_at < ?", (time.time() - older_than,))
+
+    def close(self):
+        self.conn.close()
@@ -1,29 +1,188 @@
-import requests
-import json
+import os
+import asyncio
+import threading
+
+import aiohttp
+
+from rxnorm.rxnorm_cache import MISSING, TTLCache, normalize_name
+from rxnorm.rxnorm_index import RxNormIndex
 
 RXNORM_BASE = "https://rxnav.nlm.nih.gov/REST"
 
-def get_rxcui(drug_name):
+# Name -> RxCUI mappings rarely change; interaction data is refreshed more often.
+NAME_TTL = int(os.environ.get("RXNORM_NAME_TTL", 30 * 24 * 3600))
+NOT_FOUND_TTL = int(os.environ.get("RXNORM_NOT_FOUND_TTL", 24 * 3600))
+INTERACTION_TTL = int(os.environ.get("RXNORM_INTERACTION_TTL", 24 * 3600))
+
+cache_path = os.environ.get("RXNORM_CACHE_PATH", "rxnorm_cache.sqlite")
+_cache = None
+_cache_lock = threading.Lock()
+
+# Local index built from the RxNorm RRF release (see rxnorm/rxnorm_index.py). When it
+# is present names are resolved offline; with RXNORM_OFFLINE set, RxNav is never
+# called and only the index and the cache answer.
+index_path = os.environ.get("RXNORM_INDEX_PATH", "rxnorm_index.sqlite")
+local_index = RxNormIndex(index_path) if os.path.exists(index_path) else None
+offline = os.environ.get("RXNORM_OFFLINE", "").lower() in ("1", "true", "yes")
+
+# RxNav allows about 20 requests per second per client; names are resolved with at
+# most this many requests in flight over one pooled session.
+CONCURRENCY = int(os.environ.get("RXNORM_CONCURRENCY", 8))
+REQUEST_TIMEOUT = float(os.environ.get("RXNORM_REQUEST_TIMEOUT", 10))
+
+class OfflineError(aiohttp.ClientError):
     """
-    Fetch the RxCUI (RxNorm Concept Unique Identifier) for a given drug name.
+    RXNORM_OFFLINE is set and the answer is neither local nor cached; handled
+    like RxNav being unreachable.
+    """
+
+
+def open_session(concurrency=CONCURRENCY):
+    """
+    HTTP session shared by all requests of one resolution run; its connector caps
+    the number of open connections to RxNav.
+    """
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=concurrency),
+        timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+        raise_for_status=True,
+    )
+
+def open_cache():
+    """
+    The process-wide RxNorm cache, opened (and its SQLite file created) on the
+    first lookup rather than at import.
     """
-    url = f"{RXNORM_BASE}/rxcui.json"
-    params = {"name": drug_name}
-    response = requests.get(url, params=params)
-    response.raise_for_status()
-    data = response.json()
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TTLCache(cache_path)
+        return _cache
+
+async def cached_lookup(namespace, key, ttl, fetch, ttl_for=None):
+    """
+    Return the cached value for `key`, awaiting `fetch()` on a miss. If RxNav is
+    unreachable, an expired entry is served instead of failing.
+    """
+    cache = open_cache()
+    value = cache.get(namespace, key)
+    if value is not MISSING:
+        return value
+    try:
+        value = await fetch()
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        stale = cache.get(namespace, key, allow_stale=True)
+        if stale is MISSING:
+            raise
+        return stale
+    cache.set(namespace, key, value, ttl_for(value) if ttl_for else ttl)
+    return value
+
+async def fetch_rxcui_async(session, drug_name):
+    """
+    RxCUI of the exact (normalized) `drug_name`: from the local index, else from
+    RxNav unless offline. None if neither knows the name.
+    """
+    if local_index is not None:
+        rxcui = local_index.lookup(drug_name)
+        if rxcui:
+            return rxcui
+    if offline:
+        return None
+    async with session.get(f"{RXNORM_BASE}/rxcui.json", params={"name": drug_name}) as response:
+        data = await response.json()
     return data.get("idGroup", {}).get("rxnormId", [None])[0]
 
-def check_interactions(rxcui_list):
+async def get_rxcui_async(session, drug_name):
+    """
+    Fetch the RxCUI (RxNorm Concept Unique Identifier) for a given drug name.
+    Lookups are case- and whitespace-insensitive and cached; unknown names are
+    cached for a shorter time.
+    """
+    name = normalize_name(drug_name)
+    return await cached_lookup(
+        "rxcui", name, NAME_TTL, lambda: fetch_rxcui_async(session, name),
+        ttl_for=lambda rxcui: NAME_TTL if rxcui else NOT_FOUND_TTL,
+    )
+
+def approximate_rxcui(drug_name):
+    """
+    (rxcui, matched_name) of the local ingredient or brand name closest to a
+    misspelled `drug_name`, or None. Not cached: the index answers it directly.
+    """
+    if local_index is None:
+        return None
+    match = local_index.fuzzy_lookup(drug_name)
+    return match[:2] if match else None
+
+async def resolve_rxcui_async(session, drug_name):
+    """
+    (rxcui, approximate) for `drug_name`. The exact name is looked up first (local
+    index, then RxNav); only if it is unknown, or cannot be looked up, is the
+    closest name in the local index used, and the result marked `approximate`.
+    """
+    try:
+        rxcui = await get_rxcui_async(session, drug_name)
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        # Nothing cached and RxNav unreachable (or offline): the index is all there is
+        match = approximate_rxcui(drug_name)
+        if match is None:
+            raise
+    else:
+        if rxcui:
+            return rxcui, False
+        match = approximate_rxcui(drug_name)
+        if match is None:
+            return None, False
+    print(f"  {drug_name} → approximate match '{match[1]}' (RxCUI {match[0]})")
+    return match[0], True
+
+async def resolve_rxcuis(drug_names, session=None, concurrency=CONCURRENCY):
+    """
+    Resolve all `drug_names` concurrently, yielding `(name, rxcui, approximate)` as
+    soon as each one is known (cache hits first; see `resolve_rxcui_async`). Names
+    that cannot be resolved, including ones whose request failed, yield `None`.
+    """
+    own_session = session is None
+    if own_session:
+        session = open_session(concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def resolve(name):
+        async with semaphore:
+            try:
+                return name, *await resolve_rxcui_async(session, name)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"  {name} → lookup failed: {e}")
+                return name, None, False
+
+    try:
+        for next_done in asyncio.as_completed([resolve(name) for name in dict.fromkeys(drug_names)]):
+            yield await next_done
+    finally:
+        if own_session:
+            await session.close()
+
+async def check_interactions_async(session, rxcui_list):
     """
     Given a list of RxCUIs, check for known drug interactions using the RxNorm Interaction API.
+    Results are cached per set of RxCUIs, independent of their order.
     """
+    key = "+".join(sorted(set(rxcui_list)))
+    return await cached_lookup(
+        "interactions", key, INTERACTION_TTL, lambda: fetch_interactions_async(session, rxcui_list)
+    )
+
+async def fetch_interactions_async(session, rxcui_list):
+    if offline:
+        raise OfflineError(f"No cached interactions for {rxcui_list}")
     joined_ids = "+".join(rxcui_list)
     url = f"{RXNORM_BASE}/interaction/list.json?rxcuis={joined_ids}"
-    response = requests.get(url)
-    response.raise_for_status()
-    data = response.json()
+    async with session.get(url) as response:
+        data = await response.json()
+    return parse_interactions(data)
 
+def parse_interactions(data):
     interactions = []
     groups = data.get("fullInteractionTypeGroup", [])
     for group in groups:
@@ -37,26 +196,48 @@ def check_interactions(rxcui_list):
                 interactions.append(interaction)
     return interactions
 
-def main(drug_names):
+async def _with_session(call, *args):
+    async with open_session() as session:
+        return await call(session, *args)
+
+# Synchronous entry points, kept for the CLI and existing callers
+
+def fetch_rxcui(drug_name):
+    return asyncio.run(_with_session(fetch_rxcui_async, drug_name))
+
+def get_rxcui(drug_name):
+    return asyncio.run(_with_session(get_rxcui_async, drug_name))
+
+def check_interactions(rxcui_list):
+    return asyncio.run(_with_session(check_interactions_async, rxcui_list))
+
+def fetch_interactions(rxcui_list):
+    return asyncio.run(_with_session(fetch_interactions_async, rxcui_list))
+
+async def main_async(drug_names):
     """
-    Main function to get drug interactions.
+    Resolve all drug names concurrently, reporting each as it arrives, then check
+    the resolved RxCUIs for interactions over the same session.
     """
     print("Getting RxCUIs for:", drug_names)
-    rxcui_list = []
-    for name in drug_names:
-        rxcui = get_rxcui(name)
-        if rxcui:
-            print(f"  {name} → RxCUI: {rxcui}")
-            rxcui_list.append(rxcui)
-        else:
-            print(f"  {name} → RxCUI not found.")
+    resolved = {}
+    async with open_session() as session:
+        async for name, rxcui, approximate in resolve_rxcuis(drug_names, session=session):
+            if rxcui:
+                print(f"  {name} → RxCUI: {rxcui}{' (approximate match)' if approximate else ''}")
+                resolved[name] = rxcui
+            else:
+                print(f"  {name} → RxCUI not found.")
+
+        # Keep the user's order for the interaction request
+        rxcui_list = [resolved[name] for name in dict.fromkeys(drug_names) if name in resolved]
+        if len(rxcui_list) < 2:
+            print("\nNeed at least 2 valid drugs to check for conflicts.")
+            return
 
-    if len(rxcui_list) < 2:
-        print("\nNeed at least 2 valid drugs to check for conflicts.")
-        return
+        print("\nChecking for interactions...")
+        interactions = await check_interactions_async(session, rxcui_list)
 
-    print("\nChecking for interactions...")
-    interactions = check_interactions(rxcui_list)
     if not interactions:
         print("No conflicts found.")
     else:
@@ -66,6 +247,12 @@ def main(drug_names):
             print(f"   Severity: {interaction['severity']}")
             print(f"   Description: {interaction['description']}\n")
 
+def main(drug_names):
+    """
+    Main function to get drug interactions.
+    """
+    asyncio.run(main_async(drug_names))
+
 if __name__ == '__main__':
     # Example: Replace with dynamic input or pass from CLI, UI, etc.
     user_input_drugs = input("Enter medicine names separated by comma: ")
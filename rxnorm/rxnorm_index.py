@@ -0,0 +1,201 @@
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from difflib import SequenceMatcher
+
+from rxnorm.rxnorm_cache import normalize_name
+
+# Column positions in RXNCONSO.RRF
+# RXCUI|LAT|TS|LUI|STT|SUI|ISPREF|RXAUI|SAUI|SCUI|SDUI|SAB|TTY|CODE|STR|SRL|SUPPRESS|CVF|
+CONSO_RXCUI, CONSO_LAT, CONSO_SAB, CONSO_TTY, CONSO_STR, CONSO_SUPPRESS = 0, 1, 11, 12, 14, 16
+
+# Column positions in RXNREL.RRF
+# RXCUI1|RXAUI1|STYPE1|REL|RXCUI2|RXAUI2|STYPE2|RELA|RUI|SRUI|SAB|SL|DIR|RG|SUPPRESS|CVF|
+REL_RXCUI1, REL_RXCUI2, REL_RELA, REL_SAB = 0, 4, 7, 10
+
+# When several concepts share a name, prefer ingredients, then brands, then drugs,
+# mirroring what the RxNav name lookup tends to return.
+TTY_RANK = {
+    "IN": 0, "PIN": 1, "MIN": 2, "BN": 3,
+    "SCD": 4, "SBD": 5, "GPCK": 6, "BPCK": 7,
+    "SCDF": 8, "SBDF": 9, "SCDC": 10, "SBDC": 11,
+    "SY": 12, "TMSY": 13, "PSN": 14,
+}
+DEFAULT_TTY_RANK = 20
+
+# Only ingredient and brand names go into the misspelling index; they are what
+# clinicians type, and keeping it small keeps fuzzy lookups fast.
+FUZZY_TTYS = {"IN", "PIN", "MIN", "BN"}
+FUZZY_MIN_SCORE = 0.8
+FUZZY_CANDIDATES = 25
+
+
+def trigrams(name):
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _read_rrf(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            yield line.rstrip("\n").split("|")
+
+
+def build_index(conso_path, db_path, rel_path=None):
+    """
+    Build a local name -> RxCUI index from an RxNorm release.
+
+    `conso_path` is RXNCONSO.RRF. If `rel_path` (RXNREL.RRF) is given, brand names
+    are also linked to their ingredients. The index is written to a fresh SQLite
+    file at `db_path`.
+    """
+    started = time.time()
+    best = {}
+    for row in _read_rrf(conso_path):
+        if row[CONSO_LAT] != "ENG" or row[CONSO_SUPPRESS] != "N":
+            continue
+        name = normalize_name(row[CONSO_STR])
+        if not name:
+            continue
+        tty = row[CONSO_TTY]
+        rank = (TTY_RANK.get(tty, DEFAULT_TTY_RANK), row[CONSO_SAB] != "RXNORM")
+        current = best.get(name)
+        if current is None or rank < current[0]:
+            best[name] = (rank, row[CONSO_RXCUI], tty)
+
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("CREATE TABLE names (name TEXT PRIMARY KEY, rxcui TEXT NOT NULL, tty TEXT NOT NULL) WITHOUT ROWID")
+    conn.execute("CREATE TABLE fuzzy_names (id INTEGER PRIMARY KEY, name TEXT NOT NULL, rxcui TEXT NOT NULL)")
+    conn.execute("CREATE TABLE trigrams (gram TEXT NOT NULL, name_id INTEGER NOT NULL)")
+    conn.execute("CREATE TABLE ingredients (rxcui TEXT NOT NULL, ingredient_rxcui TEXT NOT NULL)")
+    conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    conn.executemany(
+        "INSERT INTO names (name, rxcui, tty) VALUES (?, ?, ?)",
+        ((name, rxcui, tty) for name, (_, rxcui, tty) in best.items()),
+    )
+    fuzzy = [(name, rxcui) for name, (_, rxcui, tty) in best.items() if tty in FUZZY_TTYS]
+    conn.executemany(
+        "INSERT INTO fuzzy_names (id, name, rxcui) VALUES (?, ?, ?)",
+        ((i, name, rxcui) for i, (name, rxcui) in enumerate(fuzzy)),
+    )
+    conn.executemany(
+        "INSERT INTO trigrams (gram, name_id) VALUES (?, ?)",
+        ((gram, i) for i, (name, _) in enumerate(fuzzy) for gram in trigrams(name)),
+    )
+    conn.execute("CREATE INDEX trigrams_gram ON trigrams (gram)")
+
+    if rel_path:
+        links = set()
+        for row in _read_rrf(rel_path):
+            if row[REL_SAB] != "RXNORM":
+                continue
+            # RELA describes the second concept relative to the first
+            if row[REL_RELA] == "tradename_of":
+                links.add((row[REL_RXCUI2], row[REL_RXCUI1]))
+            elif row[REL_RELA] == "has_tradename":
+                links.add((row[REL_RXCUI1], row[REL_RXCUI2]))
+        conn.executemany("INSERT INTO ingredients (rxcui, ingredient_rxcui) VALUES (?, ?)", links)
+        conn.execute("CREATE INDEX ingredients_rxcui ON ingredients (rxcui)")
+
+    conn.executemany(
+        "INSERT INTO meta (key, value) VALUES (?, ?)",
+        [("source", os.path.abspath(conso_path)), ("built_at", str(time.time())), ("names", str(len(best)))],
+    )
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+    print(f"Indexed {len(best)} names ({len(fuzzy)} fuzzy) in {time.time() - started:.1f}s -> {db_path}")
+
+
+class RxNormIndex:
+    """
+    Read-only lookups against an index built by `build_index`. The SQLite file is
+    memory-mapped, so opening it is instant and exact lookups are a single B-tree probe.
+    """
+
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+        self.conn.execute("PRAGMA mmap_size=1073741824")
+        self.lock = threading.Lock()
+
+    def lookup(self, drug_name):
+        """
+        Exact (normalized) name lookup. Returns the RxCUI or None.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT rxcui FROM names WHERE name = ?", (normalize_name(drug_name),)
+            ).fetchone()
+        return row[0] if row else None
+
+    def fuzzy_lookup(self, drug_name, min_score=FUZZY_MIN_SCORE):
+        """
+        Best ingredient or brand name sharing enough trigrams with `drug_name`,
+        ranked by edit similarity. Returns (rxcui, matched_name, score) or None.
+        """
+        name = normalize_name(drug_name)
+        grams = list(trigrams(name))
+        placeholders = ",".join("?" * len(grams))
+        with self.lock:
+            candidates = self.conn.execute(
+                f"""
+                SELECT f.name, f.rxcui FROM fuzzy_names f
+                JOIN (
+                    SELECT name_id, COUNT(*) AS shared FROM trigrams
+                    WHERE gram IN ({placeholders}) GROUP BY name_id
+                    ORDER BY shared DESC LIMIT ?
+                ) t ON t.name_id = f.id
+                """,
+                (*grams, FUZZY_CANDIDATES),
+            ).fetchall()
+
+        best = None
+        for candidate, rxcui in candidates:
+            score = SequenceMatcher(None, name, candidate).ratio()
+            if score >= min_score and (best is None or score > best[2]):
+                best = (rxcui, candidate, score)
+        return best
+
+    def resolve(self, drug_name):
+        """
+        Exact lookup, falling back to the closest ingredient/brand name for misspellings.
+        """
+        rxcui = self.lookup(drug_name)
+        if rxcui:
+            return rxcui
+        match = self.fuzzy_lookup(drug_name)
+        return match[0] if match else None
+
+    def ingredients(self, rxcui):
+        """
+        Ingredient RxCUIs of a brand concept (requires RXNREL at build time).
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT ingredient_rxcui FROM ingredients WHERE rxcui = ?", (rxcui,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build a local RxNorm name index from an RRF release.")
+    parser.add_argument('rrf_dir', type=str, help='Directory containing RXNCONSO.RRF (and optionally RXNREL.RRF)')
+    parser.add_argument('--output', type=str, default='rxnorm_index.sqlite', help='Path of the index to write')
+    args = parser.parse_args()
+
+    rel_path = os.path.join(args.rrf_dir, "RXNREL.RRF")
+    build_index(
+        os.path.join(args.rrf_dir, "RXNCONSO.RRF"),
+        args.output,
+        rel_path=rel_path if os.path.exists(rel_path) else None,
+    )
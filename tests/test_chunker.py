@@ -0,0 +1,67 @@
+import pytest
+
+import common.chunker as chunker
+from common.chunker import WordTokenizer, chunk_text, count_tokens, split_sections
+
+
+@pytest.fixture(autouse=True)
+def word_tokenizer(monkeypatch):
+    # Measured in words, without loading the model's tokenizer
+    monkeypatch.setattr(chunker, "_tokenizer_instance", WordTokenizer())
+
+
+def sentences(prefix, count, words=4):
+    # `count` sentences of `words` tokens (the full stop included); sentences only
+    # end before a capital or a digit, so `prefix` starts with one
+    return " ".join(f"{prefix}{i} " + " ".join(["word"] * (words - 2)) + "." for i in range(count))
+
+
+def test_sections_start_at_labels_only():
+    text = "BACKGROUND: Known EGFR: mutations.\nMore background.\nMETHODS: A trial.\nRESULTS: CI: 0.5."
+    assert split_sections(text) == [
+        "BACKGROUND: Known EGFR: mutations. More background.",
+        "METHODS: A trial.",
+        "RESULTS: CI: 0.5.",
+    ]
+    assert split_sections("First part.\nSecond part.") == ["First part.", "Second part."]
+
+
+def test_whole_sections_are_packed_while_they_fit():
+    text = "\n".join(f"SECTION{i}: " + sentences(f"S{i}", 2) for i in range(4))
+    chunks = chunk_text(text, header="Title\n", max_tokens=25, overlap=1)
+    # Each section is 2 + 2 * 5 tokens, the header 1: two sections per chunk
+    assert [chunk.count("SECTION") for chunk in chunks] == [2, 2]
+    for chunk in chunks:
+        assert chunk.startswith("Title\n")
+        assert count_tokens(chunk) <= 25
+
+
+def test_long_section_is_split_at_sentences_with_overlap():
+    text = "RESULTS: " + sentences("S", 10)
+    chunks = chunk_text(text, max_tokens=16, overlap=1)
+    assert len(chunks) > 1
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert count_tokens(chunk) <= 16
+        # The next piece repeats the last sentence of the previous one
+        last_sentence = previous.rsplit(". ", 1)[-1]
+        assert chunk.startswith(last_sentence.rstrip(".") + ".")
+    # Every sentence is in some chunk
+    for i in range(10):
+        assert any(f"S{i} " in chunk for chunk in chunks)
+
+
+def test_overlap_is_dropped_when_it_leaves_no_room():
+    text = sentences("A", 1, words=6) + " " + sentences("B", 1, words=9)
+    chunks = chunk_text(text, max_tokens=10, overlap=1)
+    assert chunks == ["A0 word word word word.", "B0 word word word word word word word."]
+
+
+def test_sentence_longer_than_the_budget_is_split_in_tokens():
+    text = "x " * 25 + "end."
+    chunks = chunk_text(text, max_tokens=10)
+    assert [count_tokens(chunk) for chunk in chunks] == [10, 10, 7]
+    assert "".join(chunks).replace("x", "").strip(" .end") == ""
+
+
+def test_empty_abstract_keeps_the_title():
+    assert chunk_text("", header="Title\n") == ["Title"]
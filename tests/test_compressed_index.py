@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from common.compressed_index import CompressedVectorStore
+
+DIMENSION = 64
+
+
+def normalized(vectors):
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+@pytest.fixture(scope="module")
+def sample():
+    # Clustered vectors, as embeddings are, and queries near some of them
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(32, DIMENSION))
+    docs = centers[rng.integers(32, size=2000)] + 0.5 * rng.normal(size=(2000, DIMENSION))
+    queries = docs[:50] + 0.3 * rng.normal(size=(50, DIMENSION))
+    reference = np.argsort(-(normalized(queries) @ normalized(docs).T), axis=1)[:, :10]
+    return docs.astype(np.float32), queries.astype(np.float32), reference
+
+
+@pytest.fixture(scope="module")
+def pq_store(sample, tmp_path_factory):
+    docs, _, _ = sample
+    store = CompressedVectorStore(
+        DIMENSION, "pq", subvectors=16, training_size=len(docs), rescore=100,
+        store_dir=str(tmp_path_factory.mktemp("vectors")),
+    )
+    store.update({i: (vector, {"publication_year": 2000 + i % 20}) for i, vector in enumerate(docs)}, set())
+    return store
+
+
+def recall(store, sample, shortlist=None):
+    _, queries, reference = sample
+    found = [{key for key, _ in store.search(query, 10, shortlist)} for query in queries]
+    return np.mean([len(keys & set(expected)) / 10 for keys, expected in zip(found, reference)])
+
+
+def test_rescoring_recovers_the_recall_pq_loses(pq_store, sample):
+    assert pq_store.trained
+    approximate = recall(pq_store, sample, shortlist=10)
+    rescored = recall(pq_store, sample)
+    assert approximate < 0.8
+    assert rescored >= 0.98
+
+
+def test_rescored_distances_are_exact(pq_store, sample):
+    docs, queries, _ = sample
+    results = pq_store.search(queries[0], 10)
+    exact = 1 - normalized(docs) @ normalized(queries[0])
+    assert [distance for _, distance in results] == pytest.approx([exact[key] for key, _ in results], abs=1e-5)
+    assert [distance for _, distance in results] == sorted(distance for _, distance in results)
+
+
+def test_filters_apply_before_the_top_k(pq_store, sample):
+    _, queries, _ = sample
+    results = pq_store.search(queries[0], 10, metadata_filter="publication_year >= `2015`")
+    assert len(results) == 10
+    assert all(2000 + key % 20 >= 2015 for key, _ in results)
+
+
+def test_untrained_pq_searches_exactly(sample, tmp_path):
+    docs, queries, reference = sample
+    store = CompressedVectorStore(DIMENSION, "pq", subvectors=16, training_size=10_000, store_dir=str(tmp_path))
+    store.update({i: (vector, None) for i, vector in enumerate(docs)}, set())
+    assert not store.trained
+    assert recall(store, sample) == 1.0
+
+
+def test_float16_recall_and_deletions(sample):
+    docs, queries, _ = sample
+    store = CompressedVectorStore(DIMENSION, "float16")
+    store.update({i: (vector, None) for i, vector in enumerate(docs)}, set())
+    assert recall(store, sample) >= 0.98
+
+    nearest = store.search(queries[0], 1)[0][0]
+    slot = store.slots[nearest]
+    store.update({}, {nearest})
+    assert nearest not in {key for key, _ in store.search(queries[0], 10)}
+    # The freed slot is reused
+    store.update({"new": (docs[1], None)}, set())
+    assert store.slots["new"] == slot
+    assert len(store.keys) == len(docs)
+
+
+def test_stats_count_more_than_the_codes(pq_store):
+    stats = pq_store.stats()
+    assert stats["vectors"] == 2000
+    assert stats["code_bytes"] == 16
+    # Validity flags, filter fields, keys and slots and the codebooks come on top
+    assert stats["bytes_per_vector"] > stats["code_bytes"] + 8
+    assert stats["memory_bytes"] >= pq_store.quantizer.centroids.nbytes
+    assert stats["disk_bytes"] >= 2000 * 4 * DIMENSION
@@ -0,0 +1,68 @@
+import threading
+import time
+
+import pytest
+
+import pubmed.eutils as eutils
+from pubmed.eutils import RateLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # pubmed.eutils' time module replaced by a fake clock that records sleeps. Tests use
+    # rates with exact binary periods, so the clock lands exactly on each token
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    monkeypatch.setattr(eutils.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(eutils.time, "sleep", sleep)
+    return now, sleeps
+
+
+def test_burst_up_to_capacity_then_waits(clock):
+    now, sleeps = clock
+    limiter = RateLimiter(rate=8, capacity=3)
+    for _ in range(3):
+        limiter.acquire()
+    assert sleeps == []
+    limiter.acquire()
+    assert sleeps == [pytest.approx(0.125)]
+
+
+def test_sustained_rate(clock):
+    now, sleeps = clock
+    limiter = RateLimiter(rate=4)
+    started = now[0]
+    for _ in range(9):
+        limiter.acquire()
+    # The first token is there at once, the other eight arrive every 1/rate seconds
+    assert now[0] - started == pytest.approx(2.0)
+
+
+def test_tokens_refill_while_idle_up_to_capacity(clock):
+    now, sleeps = clock
+    limiter = RateLimiter(rate=8, capacity=2)
+    limiter.acquire()
+    limiter.acquire()
+    now[0] += 60
+    limiter.acquire()
+    limiter.acquire()
+    assert sleeps == []
+    limiter.acquire()
+    assert sleeps == [pytest.approx(0.125)]
+
+
+def test_threads_share_the_rate():
+    limiter = RateLimiter(rate=100)
+    started = time.monotonic()
+    threads = [threading.Thread(target=lambda: [limiter.acquire() for _ in range(10)]) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 40 tokens at 100 per second, the first one at once
+    assert time.monotonic() - started >= 0.39
@@ -0,0 +1,37 @@
+from common.hybrid_search import _decisive, _fuse, rrf
+
+
+def test_rows_found_by_both_rankings_come_first():
+    dense = ["a", "b", "c"]
+    lexical = ["d", "e", "c"]
+    assert rrf([dense, lexical], k=3, rrf_k=60) == ("c", "a", "d")
+
+
+def test_rrf_k_weighs_top_ranks():
+    rankings = [["a", "x", "b"], ["y", "z", "b"]]
+    # 2 / (60 + 3) beats 1 / (60 + 1), but 1 / (0 + 1) beats 2 / (0 + 3)
+    assert rrf(rankings, k=1, rrf_k=60) == ("b",)
+    assert rrf(rankings, k=1, rrf_k=0) == ("a",)
+
+
+def test_ties_keep_the_first_ranking_first_and_k_caps_the_result():
+    assert rrf([["a", "b"], ["c", "d"]], k=3) == ("a", "c", "b")
+    assert rrf([["a"], []], k=5) == ("a",)
+    assert rrf([[], []], k=5) == ()
+
+
+def test_fuse_counts_a_chunk_found_by_both_indexes_once():
+    chunk = ("shared chunk", {"pmid": "1"})
+    dense = (("dense only", {"pmid": "2"}), chunk)
+    lexical = (chunk, ("lexical only", {"pmid": "3"}))
+    fused = _fuse.func(dense, lexical, 3, 60)
+    assert fused[0] == chunk
+    assert len(fused) == 3 and set(map(repr, fused)) == set(map(repr, dense + lexical))
+
+
+def test_decisive_bm25_answers():
+    assert _decisive.func((9.0, 2.0), 3.0, 5.0)
+    assert not _decisive.func((9.0, 4.0), 3.0, 5.0)
+    assert not _decisive.func((4.0,), 3.0, 5.0)
+    assert _decisive.func((6.0,), 3.0, 5.0)
+    assert not _decisive.func((), 3.0, 0.0)
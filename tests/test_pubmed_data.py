@@ -0,0 +1,90 @@
+import io
+import xml.etree.ElementTree as ET
+
+import pubmed.pubmed_data as pubmed_data
+from pubmed.pubmed_data import iter_articles, publication_year
+
+
+def article_xml(pmid, abstract_parts, publication_type="Journal Article"):
+    parts = "".join(
+        f'<AbstractText Label="{label}">{text}</AbstractText>' if label else f"<AbstractText>{text}</AbstractText>"
+        for label, text in abstract_parts
+    )
+    return f"""
+    <PubmedArticle>
+      <MedlineCitation>
+        <PMID>{pmid}</PMID>
+        <Article>
+          <Journal><Title>Journal {pmid}</Title><JournalIssue><PubDate><Year>2021</Year><Month>Mar</Month></PubDate></JournalIssue></Journal>
+          <ArticleTitle>Title {pmid}</ArticleTitle>
+          <Abstract>{parts}</Abstract>
+          <PublicationTypeList><PublicationType>{publication_type}</PublicationType></PublicationTypeList>
+        </Article>
+      </MedlineCitation>
+    </PubmedArticle>"""
+
+
+def article_set(*articles, deleted=()):
+    delete = "".join(f"<PMID>{pmid}</PMID>" for pmid in deleted)
+    return io.BytesIO(
+        f"<PubmedArticleSet>{''.join(articles)}<DeleteCitation>{delete}</DeleteCitation></PubmedArticleSet>".encode()
+    )
+
+
+def test_labelled_sections_are_one_line_each():
+    source = article_set(article_xml("1", [
+        ("BACKGROUND", "Why <i>it</i> matters."),
+        ("METHODS", "What   was done."),
+        (None, "Unlabelled part."),
+    ]))
+    [record] = iter_articles(source)
+    assert record["pmid"] == "1"
+    assert record["publication_date"] == "2021-Mar-"
+    # Text after inline markup is kept and whitespace is collapsed
+    assert record["abstract"].splitlines() == [
+        "BACKGROUND: Why it matters.",
+        "METHODS: What was done.",
+        "Unlabelled part.",
+    ]
+
+
+def test_root_is_cleared_after_each_article(monkeypatch):
+    roots = []
+    iterparse = ET.iterparse
+
+    def recording_iterparse(*args, **kwargs):
+        for event, elem in iterparse(*args, **kwargs):
+            if not roots:
+                roots.append(elem)
+            yield event, elem
+
+    monkeypatch.setattr(pubmed_data.ET, "iterparse", recording_iterparse)
+    source = article_set(*(article_xml(str(pmid), [(None, "Text.")]) for pmid in range(5)))
+    pmids = []
+    for record in iter_articles(source):
+        # Articles already yielded are no longer attached to the root
+        assert not {child.findtext("MedlineCitation/PMID") for child in roots[0]} & set(pmids)
+        pmids.append(record["pmid"])
+    assert pmids == ["0", "1", "2", "3", "4"]
+    assert len(roots[0]) == 0
+
+
+def test_deletions_are_markers_only_when_asked():
+    def source():
+        return article_set(
+            article_xml("1", [(None, "Kept.")]),
+            article_xml("2", [(None, "Retracted.")], publication_type="Retracted Publication"),
+            deleted=("3",),
+        )
+
+    assert [record["pmid"] for record in iter_articles(source())] == ["1", "2"]
+    records = list(iter_articles(source(), include_deletions=True))
+    assert records[0]["pmid"] == "1" and "deleted" not in records[0]
+    assert records[1:] == [{"pmid": "2", "deleted": True}, {"pmid": "3", "deleted": True}]
+
+
+def test_publication_year():
+    assert publication_year("2021-Mar-4") == 2021
+    assert publication_year("1998 Dec-1999 Jan") == 1998
+    assert publication_year("") is None
+    assert publication_year(None) is None
@@ -0,0 +1,78 @@
+import pytest
+
+from pubmed.pubmed_store import PubMedStore
+
+
+def article(pmid, title="Title", mesh_headings=("A", "B")):
+    return {"pmid": pmid, "title": title, "abstract": "Abstract.", "mesh_headings": list(mesh_headings)}
+
+
+def deleted(pmid):
+    return {"pmid": pmid, "deleted": True}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = PubMedStore(str(tmp_path / "store.sqlite"))
+    yield store
+    store.close()
+
+
+def ops(changes):
+    return [(change["pmid"], change["op"]) for change in changes]
+
+
+def test_changelog_of_one_article(store):
+    emitted = []
+    store.apply([article("1")], emitted.extend)
+    # Whitespace and MeSH order are not changes
+    store.apply([article("1", title=" Title ", mesh_headings=("B", "A"))], emitted.extend)
+    store.apply([article("1", title="New title")], emitted.extend)
+    store.apply([deleted("1")], emitted.extend)
+    store.apply([deleted("1")], emitted.extend)
+    store.apply([article("1")], emitted.extend)
+
+    assert ops(emitted) == [("1", "insert"), ("1", "update"), ("1", "delete"), ("1", "insert")]
+    versions = [change["version"] for change in emitted]
+    assert versions == sorted(versions) and len(set(versions)) == len(versions)
+    assert emitted[1]["title"] == "New title"
+    assert emitted[2]["title"] == "" and emitted[2]["mesh_headings"] == []
+    assert store.count() == 1
+
+
+def test_last_record_of_a_pmid_in_a_batch_wins(store):
+    changes = store.apply([article("1", title="First"), article("2"), article("1", title="Second")], lambda _: None)
+    assert ops(changes) == [("1", "insert"), ("2", "insert")]
+    assert changes[0]["title"] == "Second"
+    assert {change["version"] for change in changes} == {changes[0]["version"]}
+
+
+def test_deleting_an_unknown_pmid_emits_nothing(store):
+    assert store.apply([deleted("404")], lambda _: None) == []
+    assert store.count() == 0
+
+
+def test_failed_emit_records_nothing(store):
+    def fail(changes):
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        store.apply([article("1")], fail)
+    emitted = []
+    store.apply([article("1")], emitted.extend)
+    # Emitted again, with the version the failed call would have used
+    assert ops(emitted) == [("1", "insert")]
+    assert emitted[0]["version"] == 1
+
+
+def test_state_survives_reopening(tmp_path):
+    path = str(tmp_path / "store.sqlite")
+    store = PubMedStore(path)
+    store.apply([article("1"), article("2")], lambda _: None)
+    store.close()
+
+    store = PubMedStore(path)
+    changes = store.apply([article("1"), article("2", title="Changed"), article("3")], lambda _: None)
+    store.close()
+    assert ops(changes) == [("2", "update"), ("3", "insert")]
+    assert changes[0]["version"] == 2
@@ -0,0 +1,82 @@
+from datetime import date
+from itertools import count
+from types import SimpleNamespace
+
+import pytest
+
+import common.response_cache as response_cache
+from common.response_cache import ResponseCache, date_bucket, documents_key
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    # A clock that ticks on every call, so LRU order never depends on timer resolution
+    ticks = count()
+    monkeypatch.setattr(response_cache, "time", SimpleNamespace(time=lambda: float(next(ticks))))
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), similarity=0.95, max_entries=3)
+    yield cache
+    cache.close()
+
+
+def test_date_buckets():
+    day = date(2024, 5, 16)  # a Thursday
+    assert date_bucket(day, "day") == "2024-05-16"
+    assert date_bucket(day, "week") == "2024-05-13"
+    assert date_bucket(day, "month") == "2024-05-01"
+    with pytest.raises(ValueError):
+        date_bucket(day, "year")
+
+
+def test_documents_key_changes_with_documents_bucket_and_model():
+    key = documents_key(["a", "b"], "2024-05-16", "gpt")
+    assert documents_key(["b", "a"], "2024-05-16", "gpt") == key
+    assert documents_key(["a", "c"], "2024-05-16", "gpt") != key
+    assert documents_key(["a"], "2024-05-16", "gpt") != key
+    assert documents_key(["a", "b"], "2024-05-17", "gpt") != key
+    assert documents_key(["a", "b"], "2024-05-16", "other") != key
+
+
+def test_exact_hits_need_the_same_documents(cache):
+    key = documents_key(["doc"], "2024-05-16")
+    cache.put("What is  Aspirin?", key, "An NSAID.")
+    assert cache.get("what is aspirin?", key) == ("An NSAID.", "exact")
+    # New documents, or a new date bucket, make the answer unreachable
+    assert cache.get("what is aspirin?", documents_key(["doc", "new doc"], "2024-05-16")) == (None, None)
+    assert cache.get("what is aspirin?", documents_key(["doc"], "2024-05-17")) == (None, None)
+
+
+def test_answers_live_as_long_as_their_date_bucket():
+    monday, friday, next_monday = date(2024, 5, 13), date(2024, 5, 17), date(2024, 5, 20)
+    key = documents_key(["doc"], date_bucket(monday, "week"))
+    assert documents_key(["doc"], date_bucket(friday, "week")) == key
+    assert documents_key(["doc"], date_bucket(next_monday, "week")) != key
+    assert documents_key(["doc"], date_bucket(friday, "day")) != documents_key(["doc"], date_bucket(monday, "day"))
+
+
+def test_semantic_hits_need_similar_queries(cache):
+    key = documents_key(["doc"], "2024-05-16")
+    cache.put("aspirin dose", key, "100 mg.", vector=[1.0, 0.0, 0.0])
+    assert cache.get("dose of aspirin", key, vector=[0.99, 0.1, 0.0]) == ("100 mg.", "semantic")
+    assert cache.get("aspirin risks", key, vector=[0.5, 0.8, 0.0]) == (None, None)
+    assert cache.get("dose of aspirin", documents_key(["other"], "2024-05-16"), vector=[1.0, 0.0, 0.0]) == (None, None)
+
+
+def test_least_recently_used_answers_are_evicted(cache):
+    key = documents_key(["doc"], "2024-05-16")
+    for query in ("a", "b", "c"):
+        cache.put(query, key, query.upper())
+    assert cache.get("a", key) == ("A", "exact")
+    cache.put("d", key, "D")
+    # "b" was used least recently: "a" was read after it was stored
+    assert cache.get("b", key) == (None, None)
+    assert [cache.get(query, key)[0] for query in ("a", "c", "d")] == ["A", "C", "D"]
+
+
+def test_stats(cache):
+    key = documents_key(["doc"], "2024-05-16")
+    cache.put("q", key, "answer", vector=[1.0, 0.0])
+    cache.get("q", key)
+    cache.get("similar q", key, vector=[1.0, 0.01])
+    cache.get("other", key)
+    cache.get("unrelated", key, vector=[0.0, 1.0])
+    assert cache.stats() == {"exact_hits": 1, "semantic_hits": 1, "misses": 2, "hit_rate": 0.5}